@@ -0,0 +1,156 @@
+"""Benchmark PlantUML extraction on recorded responses and on large outputs.
+
+Checks that `extract_plantuml_code` finds the same diagram as the previous
+two-regex extractor on a set of response shapes, compares the two on a
+corpus of real responses (every `*_RESPONSE.txt` below `--corpus`), then
+checks that extraction time grows linearly with the response size
+on multi-megabyte complete, truncated and multi-diagram responses.
+
+Usage:
+    python benchmarks/bench_extraction.py
+    python benchmarks/bench_extraction.py --corpus archive/test_runs --sizes 1 4 16
+
+Exits with 1 if a diagram found by the previous extractor is not found
+the same way, or if the time per megabyte of the largest size is more than
+`LINEARITY_TOLERANCE` times that of the smallest.
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from core.plantUML_renderer import extract_plantuml_blocks, extract_plantuml_code  # noqa: E402
+
+DEFAULT_SIZES_MB = [0.5, 1, 2, 4]
+LINEARITY_TOLERANCE = 2.0
+
+DIAGRAM_LINES = "class Dokument {\n  -titel: String\n  +drucken(): void\n}\nDokument <|-- Textdokument\n"
+
+# Response shapes the previous extractor handled, each must give the same diagram
+EQUIVALENCE_CASES = {
+    "plantuml fence": f"Here is the diagram:\n\n```plantuml\n@startuml\n{DIAGRAM_LINES}@enduml\n```\n",
+    "bare startuml": f"@startuml\n{DIAGRAM_LINES}@enduml\n",
+    "startuml after text": f"Here is the diagram: @startuml\n{DIAGRAM_LINES}@enduml\nDone.",
+    "startuml after bullet": f"- @startuml\n{DIAGRAM_LINES}@enduml\n",
+    "startuml in other fence": f"```\n@startuml\n{DIAGRAM_LINES}@enduml\n```\n",
+    "inline mention first": f"Start with `@startuml`:\n@startuml\n{DIAGRAM_LINES}@enduml\n",
+    "two diagrams": f"@startuml\nclass A\n@enduml\n\n```plantuml\n{DIAGRAM_LINES}```\n",
+}
+
+
+def legacy_extract_plantuml_code(text: str) -> str:
+    """The extractor before the single-pass scanner."""
+    match = re.search(r'```plantuml\n(.*?)\n```', text, re.DOTALL)
+    if match:
+        return match.group(1).strip()
+
+    match = re.search(r'@startuml\n(.*?)\n@enduml', text, re.DOTALL)
+    if match:
+        return match.group(1).strip()
+
+    return ""
+
+
+def load_corpus(corpus_dir: Path) -> list[str]:
+    return [path.read_text(encoding="utf-8") for path in sorted(corpus_dir.rglob("*_RESPONSE.txt"))]
+
+
+def build_response(kind: str, size_bytes: int) -> str:
+    """Synthesize a response of roughly `size_bytes` characters."""
+    if kind == "multi":
+        block = f"Diagram:\n```plantuml\n@startuml\n{DIAGRAM_LINES}@enduml\n```\n"
+        return block * max(1, size_bytes // len(block))
+
+    body = DIAGRAM_LINES * max(1, size_bytes // len(DIAGRAM_LINES))
+    if kind == "complete":
+        # CRLF line endings, as returned by some providers
+        return f"```plantuml\n@startuml\n{body}@enduml\n```\n".replace("\n", "\r\n")
+    # Cut off by max_tokens before @enduml
+    return f"Here is the diagram:\n\n```plantuml\n@startuml\n{body}"
+
+
+def time_call(func, text: str, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def check_equivalence() -> list[str]:
+    """Return the name of every case whose diagram differs from the previous extractor's."""
+    failures = []
+    for name, text in EQUIVALENCE_CASES.items():
+        expected = legacy_extract_plantuml_code(text)
+        if expected and extract_plantuml_code(text) != expected:
+            failures.append(name)
+    print(f"[🔍] Equivalence with the previous extractor: {len(EQUIVALENCE_CASES) - len(failures)} of {len(EQUIVALENCE_CASES)} cases")
+    return failures
+
+
+def bench_corpus(responses: list[str]):
+    total_mb = sum(len(text) for text in responses) / 1e6
+    legacy = sum(time_call(legacy_extract_plantuml_code, text, 1) for text in responses)
+    current = sum(time_call(extract_plantuml_code, text, 1) for text in responses)
+
+    blocks = [extract_plantuml_blocks(text) for text in responses]
+    multiple = sum(len(b) > 1 for b in blocks)
+    truncated = sum(any(block["truncated"] for block in b) for b in blocks)
+    recovered = sum(1 for text in responses if extract_plantuml_code(text) and not legacy_extract_plantuml_code(text))
+
+    print(f"[📚] Corpus: {len(responses)} responses, {total_mb:.1f} MB")
+    print(f"  legacy  {legacy * 1000:9.1f} ms")
+    print(f"  current {current * 1000:9.1f} ms")
+    print(f"  {multiple} responses with several diagrams, {truncated} with a truncated diagram, "
+          f"{recovered} diagrams found that the legacy extractor missed")
+
+
+def bench_scaling(sizes_mb: list[float]) -> list[str]:
+    """Return a description of every response kind whose extraction is not linear."""
+    failures = []
+    for kind in ("complete", "truncated", "multi"):
+        print(f"\n[📈] {kind} responses:")
+        print(f"  {'MB':>6} {'legacy ms':>10} {'current ms':>11} {'ms/MB':>8}")
+        per_mb = []
+        for size_mb in sizes_mb:
+            text = build_response(kind, int(size_mb * 1e6))
+            legacy = time_call(legacy_extract_plantuml_code, text)
+            current = time_call(extract_plantuml_blocks, text)
+            per_mb.append(current * 1000 / size_mb)
+            print(f"  {size_mb:>6} {legacy * 1000:>10.2f} {current * 1000:>11.2f} {per_mb[-1]:>8.2f}")
+
+        if per_mb[-1] > LINEARITY_TOLERANCE * per_mb[0]:
+            failures.append(f"{kind}: {per_mb[-1]:.2f} ms/MB at {sizes_mb[-1]} MB vs {per_mb[0]:.2f} ms/MB at {sizes_mb[0]} MB")
+    return failures
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark PlantUML extraction.")
+    parser.add_argument("--corpus", type=Path, default=REPO_ROOT / "test_runs", help="Directory with recorded *_RESPONSE.txt files")
+    parser.add_argument("--sizes", type=float, nargs="+", default=DEFAULT_SIZES_MB, help="Synthetic response sizes in MB")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    mismatches = check_equivalence()
+    for name in mismatches:
+        print(f"[❌] Different diagram than the previous extractor: {name}")
+
+    responses = load_corpus(args.corpus) if args.corpus.exists() else []
+    if responses:
+        bench_corpus(responses)
+    else:
+        print(f"[⚠️] No recorded responses in {args.corpus}, skipping the corpus benchmark")
+
+    failures = bench_scaling(sorted(args.sizes))
+    for failure in failures:
+        print(f"[❌] Not linear: {failure}")
+    sys.exit(1 if failures or mismatches else 0)
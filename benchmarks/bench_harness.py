@@ -0,0 +1,323 @@
+"""Benchmark the overhead of the run pipeline itself.
+
+Runs the full harness offline against a zero-latency stub client and a
+stub PlantUML HTTP server, so everything measured is time spent in
+`core/`: config loading, prompt loading, job construction, run directory
+allocation, file writes, ledger updates and rendering. Each matrix size
+runs in a fresh subprocess inside a temporary directory so peak RSS is
+measured per size. Every size runs `--repeat` times and the run with the
+median throughput is reported and compared.
+
+Usage:
+    python benchmarks/bench_harness.py                        # 10 .. 10k jobs
+    python benchmarks/bench_harness.py --sizes 10 1000 100000 --repeat 5
+    python benchmarks/bench_harness.py --engine async --save-baseline
+
+Results are compared against `benchmarks/baseline.json` when it exists.
+"""
+
+import argparse
+import contextlib
+import http.server
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+DEFAULT_REPEAT = 3
+PROMPT_COUNT = 5
+MODEL_COUNT = 2
+
+# Relative slowdown against the baseline that counts as a regression
+REGRESSION_THRESHOLD = 0.2
+# Smaller sizes are dominated by fixed startup time and only reported, not gated
+MIN_GATED_JOBS = 1000
+
+# Smallest valid PNG (1x1 transparent pixel) served by the stub PlantUML server
+STUB_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c63000100000500010d0a2db40000000049454e44ae426082"
+)
+
+
+class StubPlantUMLHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(STUB_PNG)))
+        self.end_headers()
+        self.wfile.write(STUB_PNG)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_plantuml_server() -> http.server.ThreadingHTTPServer:
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubPlantUMLHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class StageTimer:
+    """Collect wall-clock samples per pipeline stage by wrapping functions."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self.lock:
+            self.samples[stage].append(seconds)
+
+    def wrap(self, stage: str, func):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return wrapper
+
+    def wrap_async(self, stage: str, func):
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return wrapper
+
+    def summary(self) -> dict:
+        stages = {}
+        for stage, samples in self.samples.items():
+            ordered = sorted(samples)
+            stages[stage] = {
+                "count": len(ordered),
+                "total_s": sum(ordered),
+                "p50_ms": percentile(ordered, 50) * 1000,
+                "p95_ms": percentile(ordered, 95) * 1000,
+                "p99_ms": percentile(ordered, 99) * 1000,
+            }
+        return stages
+
+
+def percentile(ordered: list[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def write_benchmark_workspace(workdir: Path, size: int, server_port: int) -> Path:
+    """Create prompts and a config that expand to `size` jobs."""
+    prompt_dir = workdir / "prompts"
+    prompt_dir.mkdir()
+    source_prompt = (REPO_ROOT / "prompts" / "SOMO_B4_A1.txt").read_text(encoding="utf-8")
+    for i in range(PROMPT_COUNT):
+        (prompt_dir / f"BENCH_{i:02d}.txt").write_text(f"{source_prompt}\n\nVariante {i}", encoding="utf-8")
+
+    cells = PROMPT_COUNT * MODEL_COUNT
+    repeat = max(1, size // cells)
+    config = {
+        "models": [
+            {"name": f"mock-bench-{i}", "temperature": 0.1, "max_tokens": 2000, "repeat": repeat, "mock": {"seed": i}}
+            for i in range(MODEL_COUNT)
+        ],
+        "rate_limits": {},
+        "cache": {"mode": "bypass"},
+        "rendering": {
+            "backend": "http",
+            "workers": 4,
+            "server_url": f"http://127.0.0.1:{server_port}/img/",
+            "fallback_url": None,
+        },
+    }
+    config_path = workdir / "bench_config.yaml"
+    config_path.write_text(json.dumps(config), encoding="utf-8")  # JSON is valid YAML
+    return config_path
+
+
+def run_single(size: int, engine: str, concurrency: int) -> dict:
+    """Run one matrix size in the current process and return its measurements."""
+    sys.path.insert(0, str(REPO_ROOT))
+    server = start_stub_plantuml_server()
+
+    with tempfile.TemporaryDirectory(prefix="llm_uml_bench_") as tmp:
+        workdir = Path(tmp)
+        config_path = write_benchmark_workspace(workdir, size, server.server_port)
+        os.chdir(workdir)
+
+        import main
+        import core.prompt_runner as prompt_runner
+        import core.async_runner as async_runner
+        from core.job_ledger import JobLedger
+        from core.plantUML_renderer import RenderQueue
+        from core.rate_limiter import RateLimitScheduler
+
+        timer = StageTimer()
+        for name, stage in [
+            # Prompts and template variants are loaded lazily while the jobs are built
+            ("build_jobs", "build_jobs"),
+            ("build_run_directory", "build_run_directory"),
+            ("save_text", "save_text"),
+            ("save_json", "save_json"),
+            ("save_plantuml", "save_plantuml"),
+            ("extract_plantuml_code", "extract_plantuml"),
+        ]:
+            setattr(prompt_runner, name, timer.wrap(stage, getattr(prompt_runner, name)))
+        prompt_runner.save_run_result = timer.wrap("save_run_result", prompt_runner.save_run_result)
+
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+
+            stage_start = time.perf_counter()
+            config = main.load_config(config_path)
+            timer.record("load_config", time.perf_counter() - stage_start)
+
+            models = []
+            for model_cfg in config["models"]:
+                client = main.get_client(model_cfg["name"], model_cfg)
+                client.send_prompt = timer.wrap("api_call", client.send_prompt)
+                client.send_prompt_async = timer.wrap_async("api_call", client.send_prompt_async)
+                model_cfg["client"] = client
+                models.append(model_cfg)
+
+            ledger = JobLedger.from_config(config)
+            ledger.mark = timer.wrap("ledger_mark", ledger.mark)
+            render_queue = RenderQueue.from_config(config)
+            render_queue.renderer.render = timer.wrap("render", render_queue.renderer.render)
+
+            run_options = dict(
+                models=models,
+                scheduler=RateLimitScheduler.from_config(config),
+                ledger=ledger,
+                render_queue=render_queue,
+            )
+            if engine == "async":
+                async_runner.run_prompts_async(**run_options, concurrency=concurrency)
+            else:
+                prompt_runner.run_prompts(**run_options)
+
+            render_queue.close()
+            ledger.close()
+            elapsed = time.perf_counter() - start
+
+        jobs = len(ledger.entries)
+
+    server.shutdown()
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = peak_rss / (1024 * 1024) if sys.platform == "darwin" else peak_rss / 1024
+
+    return {
+        "size": size,
+        "jobs": jobs,
+        "engine": engine,
+        "wall_s": elapsed,
+        "jobs_per_s": jobs / elapsed if elapsed else 0.0,
+        "peak_rss_mb": peak_rss_mb,
+        "stages": timer.summary(),
+    }
+
+
+def run_isolated(size: int, engine: str, concurrency: int) -> dict:
+    """Run one matrix size in a fresh interpreter so peak RSS is not shared."""
+    completed = subprocess.run(
+        [sys.executable, __file__, "--single", str(size), "--engine", engine, "--concurrency", str(concurrency)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def run_repeated(size: int, engine: str, concurrency: int, repeat: int) -> dict:
+    """Run one matrix size `repeat` times and return the run with the median throughput."""
+    runs = sorted((run_isolated(size, engine, concurrency) for _ in range(repeat)), key=lambda run: run["jobs_per_s"])
+    result = runs[len(runs) // 2]
+    result["jobs_per_s_runs"] = [run["jobs_per_s"] for run in runs]
+    return result
+
+
+def print_report(results: list[dict]):
+    print(f"\n{'jobs':>8} {'wall s':>9} {'jobs/s':>10} {'min..max jobs/s':>17} {'peak RSS MB':>12}")
+    for result in results:
+        runs = result.get("jobs_per_s_runs") or [result["jobs_per_s"]]
+        spread = f"{runs[0]:.0f}..{runs[-1]:.0f}"
+        print(f"{result['jobs']:>8} {result['wall_s']:>9.2f} {result['jobs_per_s']:>10.1f} {spread:>17} {result['peak_rss_mb']:>12.1f}")
+
+    for result in results:
+        print(f"\nStage latencies for {result['jobs']} jobs ({result['engine']}):")
+        print(f"  {'stage':<22} {'count':>8} {'total s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for stage, stats in sorted(result["stages"].items(), key=lambda item: -item[1]["total_s"]):
+            print(f"  {stage:<22} {stats['count']:>8} {stats['total_s']:>9.3f} {stats['p50_ms']:>9.3f} {stats['p95_ms']:>9.3f} {stats['p99_ms']:>9.3f}")
+
+
+def compare_with_baseline(results: list[dict], baseline: dict) -> list[str]:
+    """Return a description of every gated size whose median run got slower than the baseline."""
+    regressions = []
+    baseline_by_key = {(r["engine"], r["size"]): r for r in baseline.get("results", [])}
+    for result in results:
+        previous = baseline_by_key.get((result["engine"], result["size"]))
+        if not previous:
+            continue
+        change = previous["jobs_per_s"] / result["jobs_per_s"] - 1 if result["jobs_per_s"] else float("inf")
+        gated = result["size"] >= MIN_GATED_JOBS
+        print(f"[📊] {result['engine']} {result['size']:>7} jobs: {result['jobs_per_s']:.1f} jobs/s (baseline {previous['jobs_per_s']:.1f}, {-change:+.0%}){'' if gated else ', not gated'}")
+        if gated and change > REGRESSION_THRESHOLD:
+            regressions.append(f"{result['engine']} {result['size']} jobs is {change:.0%} slower than the baseline")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark harness overhead with a stub client and stub PlantUML server.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Matrix sizes (number of jobs) to run")
+    parser.add_argument("--engine", choices=["sequential", "async"], default="sequential", help="Execution engine to benchmark")
+    parser.add_argument("--concurrency", type=int, default=64, help="Concurrency for the async engine")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Runs per size, the median run is reported")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Store the results as {BASELINE_PATH.name}")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.single is not None:
+        print(json.dumps(run_single(args.single, args.engine, args.concurrency)))
+        sys.exit(0)
+
+    results = []
+    for size in args.sizes:
+        print(f"[⏱️] Benchmarking {size} jobs ({args.engine}, {args.repeat} runs)...")
+        results.append(run_repeated(size, args.engine, args.concurrency, args.repeat))
+
+    print_report(results)
+
+    regressions = []
+    if BASELINE_PATH.exists():
+        regressions = compare_with_baseline(results, json.loads(BASELINE_PATH.read_text(encoding="utf-8")))
+
+    if args.save_baseline:
+        baseline = json.loads(BASELINE_PATH.read_text(encoding="utf-8")) if BASELINE_PATH.exists() else {"results": []}
+        measured = {(r["engine"], r["size"]) for r in results}
+        baseline["results"] = [r for r in baseline["results"] if (r["engine"], r["size"]) not in measured] + results
+        BASELINE_PATH.write_text(json.dumps(baseline, indent=2), encoding="utf-8")
+        print(f"[💾] Saved baseline to {BASELINE_PATH}")
+
+    for regression in regressions:
+        print(f"[❌] Regression: {regression}")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,168 @@
+"""Benchmark CLI cold-start time and peak memory.
+
+Starts `python main.py --help`, the import of every provider client and a
+single-model offline run in fresh interpreters, and reports the median
+and best wall time, the peak RSS and which provider SDKs were imported.
+Provider SDKs should only be loaded by the runs whose models need them.
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 20 --save-baseline
+
+Results are compared against the `startup` entry of
+`benchmarks/baseline.json` when it exists. Peak RSS is measured with
+`os.wait4`, which is not available on Windows.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+
+sys.path.insert(0, str(REPO_ROOT))
+
+from llm_clients.registry import CLIENTS  # noqa: E402
+
+# Relative slowdown against the baseline that counts as a regression
+REGRESSION_THRESHOLD = 0.2
+
+PROVIDER_SDKS = ("openai", "anthropic", "google.genai")
+
+SINGLE_MODEL_CONFIG = """\
+models:
+  - name: mock-startup
+    temperature: 0.1
+    max_tokens: 500
+    repeat: 1
+    mock:
+      time_to_first_token: 0
+      tokens_per_second: 1000000
+rendering:
+  server_url: http://127.0.0.1:9/img/
+  fallback_url: null
+  cache:
+    enabled: false
+"""
+
+
+def build_cases(workdir: Path) -> dict[str, list[str]]:
+    config_path = workdir / "startup_config.yaml"
+    config_path.write_text(SINGLE_MODEL_CONFIG, encoding="utf-8")
+    shutil.copytree(REPO_ROOT / "prompts", workdir / "prompts")
+
+    main = str(REPO_ROOT / "main.py")
+    cases = {
+        "main.py --help": [sys.executable, main, "--help"],
+        "single-model run": [sys.executable, main, "--config", str(config_path), "--prompt_name", "SOMO_B4_A1"],
+    }
+    for prefix in CLIENTS:
+        cases[f"import {prefix} client"] = [
+            sys.executable, "-c", f"from llm_clients.registry import get_client_class; get_client_class({prefix!r})"
+        ]
+    return cases
+
+
+def run_once(command: list[str], workdir: Path) -> tuple[float, float | None]:
+    """Return the wall time and peak RSS in MB of one run of `command`."""
+    env = {**os.environ, "PYTHONPATH": str(REPO_ROOT)}
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if hasattr(os, "wait4"):
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        # ru_maxrss is reported in kilobytes on Linux and bytes on macOS
+        peak_rss = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    else:
+        process.wait()
+        peak_rss = None
+    wall = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} exited with {process.returncode}")
+    return wall, peak_rss
+
+
+def get_imported_sdks(command: list[str], workdir: Path) -> list[str]:
+    """Return the provider SDKs a command imports, from `-X importtime`."""
+    env = {**os.environ, "PYTHONPATH": str(REPO_ROOT)}
+    result = subprocess.run([command[0], "-X", "importtime", *command[1:]], cwd=workdir, env=env, capture_output=True, text=True)
+    imported = {line.rsplit("|", 1)[-1].strip() for line in result.stderr.splitlines() if line.startswith("import time:")}
+    return [sdk for sdk in PROVIDER_SDKS if sdk in imported]
+
+
+def bench_case(name: str, command: list[str], workdir: Path, repeat: int) -> dict:
+    # One warm-up run so the measured runs start with compiled bytecode and a warm disk cache
+    run_once(command, workdir)
+    walls, rss = [], []
+    for _ in range(repeat):
+        wall, peak_rss = run_once(command, workdir)
+        walls.append(wall)
+        if peak_rss is not None:
+            rss.append(peak_rss)
+    return {
+        "case": name,
+        "median_ms": statistics.median(walls) * 1000,
+        "best_ms": min(walls) * 1000,
+        "peak_rss_mb": max(rss) if rss else None,
+        "sdks": get_imported_sdks(command, workdir),
+    }
+
+
+def print_report(results: list[dict]):
+    print(f"  {'case':<24} {'median ms':>10} {'best ms':>9} {'peak RSS MB':>12}  SDKs imported")
+    for result in results:
+        rss = f"{result['peak_rss_mb']:.1f}" if result["peak_rss_mb"] is not None else "n/a"
+        print(f"  {result['case']:<24} {result['median_ms']:>10.1f} {result['best_ms']:>9.1f} {rss:>12}  {', '.join(result['sdks']) or '-'}")
+
+
+def compare_with_baseline(results: list[dict], baseline: list[dict]) -> list[str]:
+    """Return a description of every case that starts slower than the baseline."""
+    regressions = []
+    baseline_by_case = {r["case"]: r for r in baseline}
+    for result in results:
+        previous = baseline_by_case.get(result["case"])
+        if not previous:
+            continue
+        change = result["median_ms"] / previous["median_ms"] - 1
+        print(f"[📊] {result['case']}: {result['median_ms']:.1f} ms (baseline {previous['median_ms']:.1f}, {change:+.0%})")
+        if change > REGRESSION_THRESHOLD:
+            regressions.append(f"{result['case']} is {change:.0%} slower than the baseline")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark CLI cold-start time and peak RSS.")
+    parser.add_argument("--repeat", type=int, default=10, help="Measured runs per case")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Store the results in {BASELINE_PATH.name}")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        results = [bench_case(name, command, workdir, args.repeat) for name, command in build_cases(workdir).items()]
+
+    print("[🚀] Cold start:")
+    print_report(results)
+
+    baseline = json.loads(BASELINE_PATH.read_text(encoding="utf-8")) if BASELINE_PATH.exists() else {"results": []}
+    regressions = compare_with_baseline(results, baseline.get("startup", []))
+    for regression in regressions:
+        print(f"[❌] Regression: {regression}")
+
+    if args.save_baseline:
+        baseline["startup"] = results
+        BASELINE_PATH.write_text(json.dumps(baseline, indent=2), encoding="utf-8")
+        print(f"[💾] Saved baseline to {BASELINE_PATH}")
+
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,178 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from core.prompt_runner import build_jobs, get_job_parameters, get_stream_watcher, extract_response_metadata, complete_job
+from core.tracing import span
+
+# Default number of requests that may be in flight at the same time
+DEFAULT_CONCURRENCY = 8
+
+
+async def send_job_async(job: dict, scheduler=None, cache=None, stream=False, render_queue=None) -> dict:
+    """Send a job's prompt with the async client, through the rate limit scheduler if given.
+
+    With a response cache, a stored response for the same prompt hash,
+    model, sampling parameters and repeat index is returned instead. In
+    streaming mode the diagram is queued for rendering as soon as its end
+    has been received.
+    """
+    if cache:
+        with span("cache_lookup"):
+            cached = cache.get(job)
+        if cached:
+            print("[💾] Using cached response")
+            return cached
+
+    parameters = get_job_parameters(job)
+    watcher = get_stream_watcher(stream, render_queue)
+    on_text = watcher.on_text if watcher else None
+    on_retry = watcher.reset if watcher else None
+    with span("api_call", provider=job["client"].provider, model=job["model_name"], stream=stream) as call:
+        if scheduler:
+            result = await scheduler.send_async(job["client"], job["prompt_text"], parameters, stream=stream, on_text=on_text, on_retry=on_retry)
+        elif stream:
+            result = await job["client"].stream_prompt_async(job["prompt_text"], parameters, on_text)
+        else:
+            result = await job["client"].send_prompt_async(job["prompt_text"], parameters)
+        call.set(status=result.get("status", "ok"), status_code=result.get("status_code"), attempts=result.get("attempts", 1))
+
+    with span("extract_metadata"):
+        result["response_metadata"] = extract_response_metadata(job["client"], result.get("raw_response"))
+    if cache:
+        cache.put(job, result)
+    return result
+
+
+async def _worker(queue: asyncio.Queue, writer: ThreadPoolExecutor, scheduler=None, cache=None, ledger=None, render_queue=None, stream=False, results_store=None, convergence=None, costs=None):
+    """Take jobs from the queue, send them and hand the result to the writer."""
+    loop = asyncio.get_running_loop()
+
+    while True:
+        job = await queue.get()
+        try:
+            if convergence and convergence.is_stopped(job):
+                convergence.skip(job, ledger)
+                continue
+            # Jobs held back by a budget stay pending in the ledger
+            if costs and not await costs.admit_async(job):
+                continue
+
+            print(f"\n🔁 {job['prompt_name']} | {job['model_name']} | temp={job['temperature']} | run={job['repeat_index']}")
+
+            with span("job", prompt=job["prompt_name"], model=job["model_name"], temperature=job["temperature"], run=job["repeat_index"]):
+                if ledger:
+                    ledger.mark(job, "in_flight")
+
+                result = await send_job_async(job, scheduler, cache, stream, render_queue)
+                if costs:
+                    result["cost"] = costs.record(job, result)
+                if convergence:
+                    result["stop_reason"] = convergence.observe(job, result)
+
+                # Save on the writer thread so the event loop keeps dispatching requests,
+                # in a copy of the task's context so its spans nest under the job
+                context = contextvars.copy_context()
+                await loop.run_in_executor(writer, context.run, complete_job, job, result, ledger, render_queue, results_store)
+        except Exception as e:
+            print(f"[❌] Job {job['prompt_name']} | {job['model_name']} | run={job['repeat_index']} failed: {type(e).__name__}: {e}")
+            if ledger:
+                ledger.mark(job, "failed", error=f"{type(e).__name__}: {e}")
+            if costs:
+                costs.release(job)
+        finally:
+            queue.task_done()
+
+
+async def run_jobs_async(jobs: list[dict], concurrency: int = DEFAULT_CONCURRENCY, scheduler=None, cache=None, ledger=None, render_queue=None, stream=False, results_store=None, convergence=None, costs=None, http_pools=None):
+    """Run a list of jobs with at most `concurrency` requests in flight.
+
+    The async connection pools of `http_pools` are closed at the end, on
+    the event loop their connections belong to.
+    """
+    queue = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+
+    # A dedicated writer thread keeps file writes off the event loop
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="result-writer") as writer:
+        workers = [
+            asyncio.create_task(_worker(queue, writer, scheduler, cache, ledger, render_queue, stream, results_store, convergence, costs))
+            for _ in range(max(1, min(concurrency, len(jobs))))
+        ]
+        await queue.join()
+
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    if http_pools:
+        await http_pools.aclose()
+
+
+def run_prompts_async(models, prompt_filter=None, model_filter=None, temperature_override=None, max_tokens_override=None, repeat_override=None, concurrency=DEFAULT_CONCURRENCY, scheduler=None, cache=None, ledger=None, resume=False, render_queue=None, stream=False, results_store=None, convergence=None, costs=None, http_pools=None):
+    """Run all prompts against all configured models concurrently.
+
+    Builds the full prompt × model × repeat job matrix up front and runs it
+    on an asyncio event loop. Results are written to disk as soon as each
+    job finishes.
+
+    Parameters
+    ----------
+    models : list[dict]
+        Configuration for each model including name, client instance,
+        default temperature, repeat count and max tokens.
+    prompt_filter : str | None
+        If provided, only the prompt with this name will be executed.
+    model_filter : str | None
+        If provided, only the model with this name will be executed.
+    temperature_override : float | None
+        Override the model's default temperature.
+    max_tokens_override : int | None
+        Override the model's default max token value.
+    repeat_override : int | None
+        Override how many times each test should be repeated.
+    concurrency : int
+        Maximum number of requests in flight across all models.
+    scheduler : RateLimitScheduler | None
+        Enforces per-provider rate limits and retries throttled calls.
+    cache : ResponseCache | None
+        Returns stored responses instead of calling the API.
+    ledger : JobLedger | None
+        Records the state of every job so an interrupted sweep can be resumed.
+    resume : bool
+        Only run jobs that the ledger does not record as done.
+    render_queue : RenderQueue | None
+        Renders diagrams in the background instead of inline.
+    stream : bool
+        Stream responses to record time-to-first-token and throughput.
+    results_store : ResultsStore | None
+        Appends every run to the results database.
+    convergence : ConvergenceTracker | None
+        Stops repeating a cell once its outputs have converged. On `resume`
+        its cells continue from the runs that are already done.
+    costs : CostTracker | None
+        Counts tokens and cost and stops dispatching once a budget is reached.
+    http_pools : HTTPPools | None
+        Shared connection pools whose async clients are closed before the
+        event loop ends.
+    """
+
+    jobs = build_jobs(
+        models,
+        prompt_filter=prompt_filter,
+        model_filter=model_filter,
+        temperature_override=temperature_override,
+        max_tokens_override=max_tokens_override,
+        repeat_override=repeat_override,
+    )
+
+    if costs:
+        costs.start(jobs, ledger if resume else None)
+    sweep = jobs
+    if ledger:
+        jobs = ledger.start(jobs, resume=resume)
+    if convergence:
+        jobs = convergence.start(jobs, sweep, ledger, results_store)
+
+    print(f"[⚡] Running {len(jobs)} jobs with concurrency={concurrency}")
+    asyncio.run(run_jobs_async(jobs, concurrency, scheduler, cache, ledger, render_queue, stream, results_store, convergence, costs, http_pools))
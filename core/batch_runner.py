@@ -0,0 +1,206 @@
+import hashlib
+import json
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from core.file_manager import get_timestamp
+from core.job_ledger import get_job_key
+from core.prompt_runner import OUTPUT_BASE, build_jobs, get_job_parameters, extract_response_metadata, send_job, complete_job
+from core.tracing import span
+
+# Seconds between status checks of submitted batches
+DEFAULT_POLL_INTERVAL = 60.0
+
+BATCH_DIR = OUTPUT_BASE / "batches"
+
+
+def get_custom_id(job: dict) -> str:
+    """Stable request id of a job, valid for every provider's batch API."""
+    return hashlib.sha256(get_job_key(job).encode("utf-8")).hexdigest()[:32]
+
+
+def save_batch_requests(path: Path, jobs: list[dict], requests: list[dict]):
+    """Keep a JSONL copy of a submitted batch next to the runs."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for job, request in zip(jobs, requests):
+            f.write(json.dumps({
+                "custom_id": request["custom_id"],
+                "prompt_name": job["prompt_name"],
+                "prompt_hash": job["prompt_hash"],
+                "repeat_index": job["repeat_index"],
+                "parameters": request["parameters"],
+            }, ensure_ascii=False) + "\n")
+
+
+def submit_batches(client, jobs: list[dict], ledger=None) -> dict[str, list[dict]]:
+    """Submit jobs in batches of at most `client.max_batch_size` and return them by batch id."""
+    batches = {}
+    for start in range(0, len(jobs), client.max_batch_size):
+        chunk = jobs[start:start + client.max_batch_size]
+        requests = [
+            {"custom_id": get_custom_id(job), "prompt": job["prompt_text"], "parameters": get_job_parameters(job)}
+            for job in chunk
+        ]
+        with span("batch_submit", provider=client.provider, requests=len(requests)):
+            batch_id = client.submit_batch(requests)
+        save_batch_requests(BATCH_DIR / f"{get_timestamp()}_{batch_id}.jsonl", chunk, requests)
+        if ledger:
+            ledger.mark_many(chunk, "in_flight", batch_id=batch_id)
+        print(f"[📦] Submitted batch {batch_id} with {len(chunk)} requests for {chunk[0]['model_name']}")
+        batches[batch_id] = chunk
+    return batches
+
+
+def complete_batch(client, batch_id: str, jobs: list[dict], cache=None, ledger=None, render_queue=None, results_store=None, costs=None):
+    """Fetch a finished batch and store every run like a direct API call."""
+    with span("batch_fetch", provider=client.provider, batch_id=batch_id):
+        results = client.fetch_batch(batch_id)
+    failed = 0
+    for job in jobs:
+        result = results.get(get_custom_id(job)) or {
+            "text": "ERROR: Request missing from batch results",
+            "latency": None,
+            "status": "error",
+            "status_code": None,
+            "raw_response": None
+        }
+        result["batch_id"] = batch_id
+        result["response_metadata"] = extract_response_metadata(job["client"], result.get("raw_response"))
+        if cache:
+            cache.put(job, result)
+        if costs:
+            result["cost"] = costs.record(job, result)
+        complete_job(job, result, ledger, render_queue, results_store)
+        failed += result.get("status") == "error"
+    print(f"[📦] Batch {batch_id} finished: {len(jobs) - failed} succeeded, {failed} failed")
+
+
+def run_prompts_batch(models, prompt_filter=None, model_filter=None, temperature_override=None, max_tokens_override=None, repeat_override=None, scheduler=None, cache=None, ledger=None, resume=False, render_queue=None, stream=False, results_store=None, convergence=None, costs=None, poll_interval=DEFAULT_POLL_INTERVAL):
+    """Run all prompts through the providers' batch APIs.
+
+    Jobs of clients that support batches are submitted as batches, polled
+    until they finish and stored like direct calls, with the batch id in
+    each run's metadata. Jobs of other clients are sent one by one while
+    the batches are processed. Batch ids are recorded in the job ledger,
+    so `resume` picks up batches that are still running instead of
+    submitting them again.
+
+    Parameters
+    ----------
+    models : list[dict]
+        Configuration for each model including name, client instance,
+        default temperature, repeat count and max tokens.
+    prompt_filter, model_filter, temperature_override, max_tokens_override, repeat_override
+        See `run_prompts`.
+    scheduler : RateLimitScheduler | None
+        Rate limits the direct calls of clients without batch support.
+    cache : ResponseCache | None
+        Returns stored responses instead of submitting them.
+    ledger : JobLedger | None
+        Records the state and batch of every job so the sweep can be resumed.
+    resume : bool
+        Only run jobs that the ledger does not record as done.
+    render_queue : RenderQueue | None
+        Renders diagrams in the background instead of inline.
+    stream : bool
+        Stream the direct calls of clients without batch support.
+    results_store : ResultsStore | None
+        Appends every run to the results database.
+    convergence : ConvergenceTracker | None
+        Not supported, all repeats of a batch are submitted at once.
+    costs : CostTracker | None
+        Counts tokens and cost at the batch price. Budgets are checked when
+        jobs are submitted, batches already submitted always complete.
+    poll_interval : float
+        Seconds between status checks of submitted batches.
+    """
+    if convergence:
+        print("[⚠️] Adaptive repeats are not supported by the batch engine, submitting every repeat.")
+
+    jobs = build_jobs(
+        models,
+        prompt_filter=prompt_filter,
+        model_filter=model_filter,
+        temperature_override=temperature_override,
+        max_tokens_override=max_tokens_override,
+        repeat_override=repeat_override,
+    )
+
+    if costs:
+        costs.start(jobs, ledger if resume else None)
+    if ledger:
+        jobs = ledger.start(jobs, resume=resume)
+
+    # Group jobs by client, keeping those of batches submitted by an earlier run apart
+    to_submit = defaultdict(list)
+    pending = defaultdict(list)
+    clients = {}
+    direct = []
+    for job in jobs:
+        if cache:
+            cached = cache.get(job)
+            if cached:
+                if costs:
+                    cached["cost"] = costs.record(job, cached)
+                complete_job(job, cached, ledger, render_queue, results_store)
+                continue
+
+        client = job["client"]
+        if not client.supports_batch:
+            direct.append(job)
+            continue
+
+        batch_id = ledger.get_batch_id(job) if ledger else None
+        # Jobs held back by a budget stay pending in the ledger
+        if costs and not batch_id and not costs.admit(job, batch=True, wait=False):
+            continue
+
+        if batch_id:
+            pending[batch_id].append(job)
+            clients[batch_id] = client
+        else:
+            to_submit[id(client)].append(job)
+
+    if pending:
+        print(f"[⏯️] Waiting for {len(pending)} batches submitted by an earlier run")
+
+    for client_jobs in to_submit.values():
+        client = client_jobs[0]["client"]
+        for batch_id, batch_jobs in submit_batches(client, client_jobs, ledger).items():
+            pending[batch_id] = batch_jobs
+            clients[batch_id] = client
+
+    # Direct calls run on their own thread while the batches are being processed
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="direct-jobs") as executor:
+        direct_future = executor.submit(run_direct_jobs, direct, scheduler, cache, ledger, render_queue, stream, results_store, costs)
+        wait_for_batches(pending, clients, poll_interval, cache, ledger, render_queue, results_store, costs)
+        direct_future.result()
+
+
+def run_direct_jobs(jobs: list[dict], scheduler=None, cache=None, ledger=None, render_queue=None, stream=False, results_store=None, costs=None):
+    """Send the jobs of clients without batch support one by one."""
+    for job in jobs:
+        # Jobs held back by a budget stay pending in the ledger
+        if costs and not costs.admit(job):
+            continue
+
+        print(f"\n🔁 {job['prompt_name']} | {job['model_name']} | temp={job['temperature']} | run={job['repeat_index']} (no batch support)")
+        if ledger:
+            ledger.mark(job, "in_flight")
+        result = send_job(job, scheduler, cache, stream, render_queue)
+        if costs:
+            result["cost"] = costs.record(job, result)
+        complete_job(job, result, ledger, render_queue, results_store)
+
+
+def wait_for_batches(pending: dict[str, list[dict]], clients: dict, poll_interval: float, cache=None, ledger=None, render_queue=None, results_store=None, costs=None):
+    """Poll submitted batches and store the runs of every batch that has finished."""
+    while pending:
+        for batch_id in list(pending):
+            if clients[batch_id].poll_batch(batch_id):
+                complete_batch(clients[batch_id], batch_id, pending.pop(batch_id), cache, ledger, render_queue, results_store, costs)
+        if pending:
+            print(f"[⏳] {len(pending)} batches in progress, checking again in {poll_interval:g}s")
+            time.sleep(poll_interval)
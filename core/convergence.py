@@ -0,0 +1,176 @@
+import math
+import statistics
+from collections import Counter, defaultdict
+from pathlib import Path
+from core.plantUML_renderer import extract_plantuml_code
+from core.render_cache import get_render_hash
+
+# What decides that a cell has seen enough repeats
+#   hash  - share of runs that produced a diagram seen only once
+#   score - confidence interval of the evaluation F1 against the reference
+CONVERGENCE_CRITERIA = ("hash", "score")
+
+DEFAULT_MIN_REPEATS = 3
+DEFAULT_MAX_UNSEEN = 0.1
+DEFAULT_MAX_CI_WIDTH = 0.1
+DEFAULT_CONFIDENCE = 0.95
+
+
+def get_cell_key(job: dict) -> tuple:
+    """Identify a prompt × model × sampling parameters cell, across its repeats."""
+    return (job["prompt_name"], job["prompt_hash"], job["model_name"], job["temperature"], job["max_tokens"])
+
+
+class ConvergenceTracker:
+    """Stop repeating a cell once more runs would not change its statistics.
+
+    `repeat` becomes the maximum number of runs per cell. With the `hash`
+    criterion, each run's diagram is reduced to its normalized PlantUML
+    hash. A cell stops when the Good-Turing estimate of the chance that
+    the next run produces a diagram not seen before (the share of hashes
+    seen exactly once) drops to `max_unseen`. With the `score` criterion
+    it stops when the `confidence` interval of the mean F1 against the
+    prompt's reference diagram is at most `max_ci_width` wide. Every cell
+    runs at least `min_repeats` times.
+    """
+
+    def __init__(self, criterion: str = "hash", min_repeats: int = DEFAULT_MIN_REPEATS, max_unseen: float = DEFAULT_MAX_UNSEEN, max_ci_width: float = DEFAULT_MAX_CI_WIDTH, confidence: float = DEFAULT_CONFIDENCE, prompt_dir: Path = Path("prompts")):
+        if criterion not in CONVERGENCE_CRITERIA:
+            raise ValueError(f"Unknown convergence criterion: {criterion}")
+        self.criterion = criterion
+        self.min_repeats = min_repeats
+        self.max_unseen = max_unseen
+        self.max_ci_width = max_ci_width
+        self.z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+
+        self.references = {}
+        if criterion == "score":
+            from core.evaluation import load_references
+            self.references = load_references(prompt_dir)
+
+        self.planned = Counter()
+        self.hashes = defaultdict(Counter)
+        self.scores = defaultdict(list)
+        self.stopped = {}
+        self.skipped = 0
+
+    @classmethod
+    def from_config(cls, config: dict, enabled: bool | None = None, prompt_dir: Path = Path("prompts")) -> "ConvergenceTracker | None":
+        """Create the tracker from the `adaptive` config section, or None when disabled."""
+        adaptive_config = config.get("adaptive") or {}
+        if not (enabled or adaptive_config.get("enabled", False)):
+            return None
+        return cls(
+            criterion=adaptive_config.get("criterion", "hash"),
+            min_repeats=adaptive_config.get("min_repeats", DEFAULT_MIN_REPEATS),
+            max_unseen=adaptive_config.get("max_unseen", DEFAULT_MAX_UNSEEN),
+            max_ci_width=adaptive_config.get("max_ci_width", DEFAULT_MAX_CI_WIDTH),
+            confidence=adaptive_config.get("confidence", DEFAULT_CONFIDENCE),
+            prompt_dir=prompt_dir,
+        )
+
+    def start(self, jobs: list[dict], sweep: list[dict] | None = None, ledger=None, results_store=None) -> list[dict]:
+        """Register the planned repeats and order the jobs repeat by repeat.
+
+        Running the first repeat of every cell before the second one keeps
+        the concurrent engine from dispatching all repeats of a cell before
+        any of them could show that the cell has converged.
+
+        When a sweep is resumed, `jobs` are the jobs left to run and `sweep`
+        all of its jobs. The runs the ledger records as done are added to
+        their cells first, so a cell keeps counting where it stopped and may
+        already have converged before any job is dispatched.
+        """
+        sweep = sweep if sweep is not None else jobs
+        for job in sweep:
+            self.planned[get_cell_key(job)] += 1
+
+        if ledger and len(sweep) > len(jobs):
+            self._seed(sweep, ledger, results_store)
+        return sorted(jobs, key=lambda job: job["repeat_index"])
+
+    def _seed(self, sweep: list[dict], ledger, results_store=None):
+        """Observe the runs of an earlier, interrupted run of the sweep."""
+        seeded = 0
+        for job in sorted(sweep, key=lambda job: job["repeat_index"]):
+            if ledger.get_state(job) != "done":
+                continue
+            text = self._load_response(job, ledger, results_store)
+            if text is None:
+                continue
+            self.observe(job, {"text": text})
+            seeded += 1
+        if seeded:
+            print(f"[🛑] Adaptive repeats continue from {seeded} runs of the resumed sweep")
+
+    def _load_response(self, job: dict, ledger, results_store=None) -> str | None:
+        run_dir = ledger.get_run_dir(job)
+        if run_dir:
+            response_path = run_dir / f"{job['prompt_name']}_{job['prompt_hash']}_RESPONSE.txt"
+            if response_path.exists():
+                return response_path.read_text(encoding="utf-8")
+        if results_store:
+            return results_store.get_response(job)
+        return None
+
+    def is_stopped(self, job: dict) -> bool:
+        return get_cell_key(job) in self.stopped
+
+    def get_stop_reason(self, job: dict) -> str | None:
+        return self.stopped.get(get_cell_key(job))
+
+    def skip(self, job: dict, ledger=None):
+        """Record a repeat that is not run because its cell has converged."""
+        self.skipped += 1
+        if ledger:
+            ledger.mark(job, "skipped", stop_reason=self.get_stop_reason(job))
+
+    def observe(self, job: dict, result: dict) -> str | None:
+        """Add a finished run to its cell and return why the cell stops, if it does."""
+        key = get_cell_key(job)
+        if key in self.stopped or result.get("status") == "error":
+            return None
+
+        uml_code = extract_plantuml_code(result["text"])
+        if self.criterion == "score" and job["prompt_name"] in self.references:
+            self.scores[key].append(self._score(job["prompt_name"], uml_code))
+        self.hashes[key][get_render_hash(uml_code)] += 1
+
+        runs = sum(self.hashes[key].values())
+        if runs >= self.planned[key]:
+            return self._stop(job, "max_repeats", runs)
+        if runs >= self.min_repeats and self._converged(key, runs):
+            return self._stop(job, "converged", runs)
+        return None
+
+    def _score(self, prompt_name: str, uml_code: str) -> float:
+        from core.evaluation import score_diagrams, precision_recall_f1
+        from core.uml_parser import parse_class_diagram
+        counts = score_diagrams(self.references[prompt_name], [parse_class_diagram(uml_code)])
+        return float(precision_recall_f1(counts)["f1"][0])
+
+    def _converged(self, key: tuple, runs: int) -> bool:
+        scores = self.scores.get(key)
+        if scores:
+            if len(scores) < 2:
+                return False
+            # Half the width of the confidence interval of the mean F1
+            half_width = self.z * statistics.stdev(scores) / math.sqrt(len(scores))
+            return 2 * half_width <= self.max_ci_width
+
+        # Good-Turing: the share of singletons estimates the chance of an unseen diagram
+        singletons = sum(1 for count in self.hashes[key].values() if count == 1)
+        return singletons / runs <= self.max_unseen
+
+    def _stop(self, job: dict, reason: str, runs: int) -> str:
+        self.stopped[get_cell_key(job)] = reason
+        if reason == "converged":
+            print(f"[🛑] {job['prompt_name']} | {job['model_name']} | temp={job['temperature']} converged after {runs} of {self.planned[get_cell_key(job)]} runs")
+        return reason
+
+    def summary(self) -> dict:
+        return {
+            "cells": len(self.planned),
+            "converged": sum(1 for reason in self.stopped.values() if reason == "converged"),
+            "skipped": self.skipped,
+        }
@@ -0,0 +1,249 @@
+import asyncio
+import threading
+import time
+from collections import Counter, defaultdict
+from core.job_ledger import get_job_key
+
+# Prompt characters per token while a prompt's token count has not been
+# reported yet. Low on purpose, so the estimate errs on the expensive side.
+CHARS_PER_TOKEN = 3
+# Share of the direct price that batch API requests cost
+DEFAULT_BATCH_DISCOUNT = 0.5
+# Seconds between live progress lines
+DEFAULT_REPORT_INTERVAL = 10.0
+# Seconds between admission checks of async jobs waiting for requests in flight
+ADMIT_POLL_INTERVAL = 0.05
+
+
+def get_price(prices: dict, model_name: str) -> dict | None:
+    """Return the price of a model, preferring the longest matching model name prefix."""
+    for name in sorted(prices, key=len, reverse=True):
+        if model_name.startswith(name):
+            return prices[name]
+    return None
+
+
+class CostTracker:
+    """Running token and cost totals of a sweep, with budget caps.
+
+    Prices are USD per million input and output tokens, configured per
+    model name or name prefix. Before a job is dispatched `admit` reserves
+    its worst-case cost: the prompt's tokens (estimated from its length
+    until a response of the same prompt reports them) plus `max_tokens` of
+    output. A job is only admitted while the spent and reserved cost of its
+    model stays within the model's budget and that of the whole sweep
+    within `max_cost`; if it only fits once requests in flight have
+    finished, it waits for them. Once even that is not enough the budget is
+    reached and no further job of the model (or of the sweep) is
+    dispatched. Those jobs stay pending in the ledger,
+    so the sweep can be resumed with a higher budget. `record` replaces the
+    reservation with the cost of the response's actual usage.
+    """
+
+    def __init__(self, prices: dict | None = None, budgets: dict | None = None, max_cost: float | None = None, batch_discount: float = DEFAULT_BATCH_DISCOUNT, report_interval: float = DEFAULT_REPORT_INTERVAL):
+        self.prices = prices or {}
+        self.budgets = budgets or {}
+        self.max_cost = max_cost
+        self.batch_discount = batch_discount
+        self.report_interval = report_interval
+        self.condition = threading.Condition()
+
+        self.requests = Counter()
+        self.prompt_tokens = Counter()
+        self.completion_tokens = Counter()
+        self.cost = defaultdict(float)
+        self.reserved = defaultdict(float)
+        self.reservations = {}
+        # Prompt tokens reported per model and prompt hash, for better estimates
+        self.prompt_sizes = {}
+        self.exhausted = set()
+        self.stopped = False
+        self.held_back = Counter()
+        self.unpriced = set()
+        self.resumed_cost = 0.0
+
+        self.started = time.time()
+        self.last_report = (self.started, 0)
+
+        for model_name in self.budgets:
+            if get_price(self.prices, model_name) is None:
+                print(f"[⚠️] No price configured for {model_name}, its budget cannot be enforced")
+
+    @classmethod
+    def from_config(cls, config: dict, max_cost: float | None = None) -> "CostTracker | None":
+        """Create the tracker from the `costs` config section, or None when disabled.
+
+        Per-model budgets are the `max_cost` of each entry under `models`.
+        A budget, per model or per sweep (from the CLI or `costs.max_cost`),
+        always enables the tracker.
+        """
+        costs_config = config.get("costs") or {}
+        budgets = {model["name"]: model["max_cost"] for model in config.get("models") or [] if model.get("max_cost") is not None}
+        if max_cost is None:
+            max_cost = costs_config.get("max_cost")
+        if not (max_cost is not None or budgets or costs_config.get("enabled", False)):
+            return None
+        return cls(
+            prices=costs_config.get("prices"),
+            budgets=budgets,
+            max_cost=max_cost,
+            batch_discount=costs_config.get("batch_discount", DEFAULT_BATCH_DISCOUNT),
+            report_interval=costs_config.get("report_interval", DEFAULT_REPORT_INTERVAL),
+        )
+
+    def start(self, jobs: list[dict], ledger=None):
+        """Count the cost the ledger recorded for `jobs` in an earlier, resumed run."""
+        if not ledger:
+            return
+        for job in jobs:
+            self.cost[job["model_name"]] += ledger.get_cost(job)
+        self.resumed_cost = sum(self.cost.values())
+        if self.resumed_cost:
+            print(f"[💰] Resuming a sweep that has cost ${self.resumed_cost:.2f} so far")
+
+    def _get_cost(self, model_name: str, prompt_tokens: int, completion_tokens: int, batch: bool = False) -> float | None:
+        price = get_price(self.prices, model_name)
+        if price is None:
+            if model_name not in self.unpriced:
+                self.unpriced.add(model_name)
+                print(f"[⚠️] No price configured for {model_name}, its cost is not counted")
+            return None
+        cost = (prompt_tokens * price.get("input", 0) + completion_tokens * price.get("output", 0)) / 1_000_000
+        return cost * self.batch_discount if batch else cost
+
+    def is_exhausted(self, model_name: str) -> bool:
+        """Return True once no further job of the model may be dispatched."""
+        return self.stopped or model_name in self.exhausted
+
+    def _try_admit(self, job: dict, batch: bool = False, wait: bool = True) -> bool | None:
+        """Reserve the worst-case cost of a job. Returns None if it has to wait for requests in flight."""
+        model_name = job["model_name"]
+        if self.stopped or model_name in self.exhausted:
+            self.held_back[model_name] += 1
+            return False
+
+        prompt_tokens = self.prompt_sizes.get((model_name, job["prompt_hash"])) or len(job["prompt_text"]) // CHARS_PER_TOKEN + 1
+        estimate = self._get_cost(model_name, prompt_tokens, job["max_tokens"], batch) or 0.0
+
+        spent = sum(self.cost.values())
+        reserved = sum(self.reserved.values())
+        budget = self.budgets.get(model_name)
+        if self.max_cost is not None and spent + reserved + estimate > self.max_cost:
+            if wait and reserved and spent + estimate <= self.max_cost:
+                return None
+            self.stopped = True
+            print(f"[💸] Sweep budget of ${self.max_cost:.2f} reached (${spent:.2f} spent), no further jobs are dispatched")
+        elif budget is not None and self.cost[model_name] + self.reserved[model_name] + estimate > budget:
+            if wait and self.reserved[model_name] and self.cost[model_name] + estimate <= budget:
+                return None
+            self.exhausted.add(model_name)
+            print(f"[💸] Budget of ${budget:.2f} for {model_name} reached (${self.cost[model_name]:.2f} spent), no further jobs of it are dispatched")
+        else:
+            self.reserved[model_name] += estimate
+            self.reservations[get_job_key(job)] = estimate
+            return True
+
+        self.held_back[model_name] += 1
+        return False
+
+    def admit(self, job: dict, batch: bool = False, wait: bool = True) -> bool:
+        """Reserve the worst-case cost of a job, or return False once a budget does not allow it.
+
+        If the job only fits once requests in flight have finished, waits
+        for them. Without `wait` (e.g. for jobs submitted in one batch) the
+        budget counts as reached instead.
+        """
+        with self.condition:
+            while (admitted := self._try_admit(job, batch, wait)) is None:
+                self.condition.wait()
+            return admitted
+
+    async def admit_async(self, job: dict) -> bool:
+        """Like `admit`, waiting on the event loop for requests in flight."""
+        while True:
+            with self.condition:
+                admitted = self._try_admit(job)
+            if admitted is not None:
+                return admitted
+            await asyncio.sleep(ADMIT_POLL_INTERVAL)
+
+    def release(self, job: dict):
+        """Drop the reservation of a job that ended without a response."""
+        with self.condition:
+            self.reserved[job["model_name"]] -= self.reservations.pop(get_job_key(job), 0.0)
+            self.condition.notify_all()
+
+    def record(self, job: dict, result: dict) -> float | None:
+        """Add the usage of a finished job and return its cost, None if the model has no price."""
+        if result.get("cached"):
+            self.release(job)
+            return 0.0
+
+        model_name = job["model_name"]
+        usage = result.get("response_metadata") or {}
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        completion_tokens = usage.get("completion_tokens") or 0
+        with self.condition:
+            self.requests[model_name] += 1
+            self.prompt_tokens[model_name] += prompt_tokens
+            self.completion_tokens[model_name] += completion_tokens
+            if prompt_tokens:
+                self.prompt_sizes[(model_name, job["prompt_hash"])] = prompt_tokens
+            cost = self._get_cost(model_name, prompt_tokens, completion_tokens, batch=bool(result.get("batch_id")))
+            if cost is not None:
+                self.cost[model_name] += cost
+            # The actual cost replaces the reservation in one step, so waiting jobs never see neither
+            self.reserved[model_name] -= self.reservations.pop(get_job_key(job), 0.0)
+            self.condition.notify_all()
+
+            now = time.time()
+            report = now - self.last_report[0] >= self.report_interval
+            if report:
+                output_tokens = sum(self.completion_tokens.values())
+                interval_time, interval_tokens = self.last_report
+                rate = (output_tokens - interval_tokens) / (now - interval_time)
+                self.last_report = (now, output_tokens)
+
+        if report:
+            self.print_progress(rate)
+        return cost
+
+    def print_progress(self, rate: float):
+        spent = sum(self.cost.values())
+        tokens = sum(self.prompt_tokens.values()) + sum(self.completion_tokens.values())
+        budget = f" of ${self.max_cost:.2f}" if self.max_cost is not None else ""
+        print(f"[💰] {sum(self.requests.values())} requests, {tokens:,} tokens, {rate:,.0f} output tokens/s, ${spent:.2f} spent{budget}")
+
+    def summary(self) -> dict:
+        models = sorted(set(self.requests) | set(self.cost))
+        return {
+            "models": {
+                model_name: {
+                    "requests": self.requests[model_name],
+                    "prompt_tokens": self.prompt_tokens[model_name],
+                    "completion_tokens": self.completion_tokens[model_name],
+                    "cost": self.cost[model_name],
+                    "budget": self.budgets.get(model_name),
+                    "held_back": self.held_back[model_name],
+                }
+                for model_name in models
+            },
+            "cost": sum(self.cost.values()),
+            "held_back": sum(self.held_back.values()),
+            "elapsed": time.time() - self.started,
+        }
+
+    def print_summary(self):
+        summary = self.summary()
+        print("[💰] Token usage and cost:")
+        print(f"  {'model':<32} {'requests':>8} {'prompt tok':>11} {'output tok':>11} {'cost $':>9} {'budget $':>9}")
+        for model_name, stats in summary["models"].items():
+            budget = f"{stats['budget']:.2f}" if stats["budget"] is not None else "-"
+            cost = f"{stats['cost']:.4f}" if model_name not in self.unpriced else "n/a"
+            print(f"  {model_name:<32} {stats['requests']:>8} {stats['prompt_tokens']:>11,} {stats['completion_tokens']:>11,} {cost:>9} {budget:>9}")
+        budget = f" of ${self.max_cost:.2f}" if self.max_cost is not None else ""
+        print(f"  Total ${summary['cost']:.4f}{budget}, {sum(self.completion_tokens.values()) / summary['elapsed']:,.0f} output tokens/s")
+        if self.resumed_cost:
+            print(f"  Costs include ${self.resumed_cost:.4f} spent by earlier runs of the sweep")
+        if summary["held_back"]:
+            print(f"[💸] {summary['held_back']} jobs were held back by budgets, run them with --resume after raising the budget")
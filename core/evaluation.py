@@ -0,0 +1,328 @@
+import argparse
+import csv
+import re
+import zlib
+from collections import defaultdict
+from pathlib import Path
+import numpy as np
+from core.uml_parser import parse_class_diagram
+
+# Reference solutions live next to the prompts: prompts/<name>.reference.puml
+REFERENCE_SUFFIX = ".reference.puml"
+
+ELEMENT_TYPES = ("classes", "attributes", "methods", "associations", "multiplicities", "inheritance")
+
+# Minimum trigram cosine similarity for two names to count as the same element
+DEFAULT_THRESHOLD = 0.8
+EMBEDDING_DIMS = 2048
+
+UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+NON_ALPHANUMERIC = re.compile(r"[^0-9a-z]+")
+MULTIPLICITY_ALIASES = {"0..*": "*", "n": "*", "0..n": "*", "1..1": "1", "many": "*", "": ""}
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase a name and drop separators, so `last_name` and `LastName` compare equal."""
+    return NON_ALPHANUMERIC.sub("", name.casefold().translate(UMLAUTS))
+
+
+def normalize_multiplicity(multiplicity: str) -> str:
+    multiplicity = multiplicity.replace(" ", "").lower()
+    return MULTIPLICITY_ALIASES.get(multiplicity, multiplicity)
+
+
+def load_references(prompt_dir: Path) -> dict[str, dict]:
+    """Parse the reference diagram of every prompt that has one."""
+    return {
+        path.name[:-len(REFERENCE_SUFFIX)]: parse_class_diagram(path.read_text(encoding="utf-8"))
+        for path in sorted(prompt_dir.glob(f"*{REFERENCE_SUFFIX}"))
+    }
+
+
+def embed_names(names: list[str], dims: int = EMBEDDING_DIMS) -> np.ndarray:
+    """Embed names as L2-normalized vectors of hashed character trigrams."""
+    rows, cols = [], []
+    for row, name in enumerate(names):
+        padded = f"#{name}#"
+        for i in range(len(padded) - 2):
+            rows.append(row)
+            cols.append(zlib.crc32(padded[i:i + 3].encode("utf-8")) % dims)
+
+    vectors = np.zeros((len(names), dims), dtype=np.float32)
+    np.add.at(vectors, (np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp)), 1.0)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class _NameIndex:
+    """Assigns each distinct normalized name a row in the embedding matrix."""
+
+    def __init__(self):
+        self.rows = {}
+        self.raw = {}
+
+    def __call__(self, name: str) -> int:
+        row = self.raw.get(name)
+        if row is None:
+            row = self.raw[name] = self.rows.setdefault(normalize_name(name), len(self.rows))
+        return row
+
+    def names(self) -> list[str]:
+        return list(self.rows)
+
+
+def _element_table(diagrams: list[dict], element_type: str, index: _NameIndex) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Flatten one element type of many diagrams into index arrays.
+
+    Returns the name indices (one column per name of the element), the
+    multiplicities (associations only) and the diagram each element belongs to.
+    """
+    names, multiplicities, owners = [], [], []
+    for diagram_id, diagram in enumerate(diagrams):
+        seen = set()
+        for element in diagram[element_type if element_type != "multiplicities" else "associations"]:
+            if element_type == "classes":
+                key = (index(element),)
+                mult = ("", "")
+            elif element_type in ("attributes", "methods", "inheritance"):
+                key = (index(element[0]), index(element[1]))
+                mult = ("", "")
+            else:
+                key = (index(element[0]), index(element[1]))
+                mult = (normalize_multiplicity(element[2]), normalize_multiplicity(element[3]))
+                if element_type == "multiplicities" and not any(mult):
+                    continue
+            if (key, mult) in seen:
+                continue
+            seen.add((key, mult))
+            names.append(key)
+            multiplicities.append(mult)
+            owners.append(diagram_id)
+
+    width = 1 if element_type == "classes" else 2
+    return (
+        np.array(names, dtype=np.intp).reshape(-1, width),
+        np.array(multiplicities, dtype=object).reshape(-1, 2),
+        np.array(owners, dtype=np.intp),
+    )
+
+
+def _element_similarity(element_type: str, name_similarity: np.ndarray, generated: tuple, reference: tuple) -> np.ndarray:
+    """Similarity of every generated element to every reference element."""
+    gen_names, gen_mult, _ = generated
+    ref_names, ref_mult, _ = reference
+
+    if element_type == "classes":
+        return name_similarity[np.ix_(gen_names[:, 0], ref_names[:, 0])]
+
+    forward = np.minimum(
+        name_similarity[np.ix_(gen_names[:, 0], ref_names[:, 0])],
+        name_similarity[np.ix_(gen_names[:, 1], ref_names[:, 1])],
+    )
+    if element_type in ("attributes", "methods", "inheritance"):
+        return forward
+
+    # Associations are undirected, compare both orientations
+    backward = np.minimum(
+        name_similarity[np.ix_(gen_names[:, 0], ref_names[:, 1])],
+        name_similarity[np.ix_(gen_names[:, 1], ref_names[:, 0])],
+    )
+    if element_type == "associations":
+        return np.maximum(forward, backward)
+
+    forward_mult = (gen_mult[:, 0:1] == ref_mult[:, 0]) & (gen_mult[:, 1:2] == ref_mult[:, 1])
+    backward_mult = (gen_mult[:, 0:1] == ref_mult[:, 1]) & (gen_mult[:, 1:2] == ref_mult[:, 0])
+    return np.maximum(forward * forward_mult, backward * backward_mult)
+
+
+def score_diagrams(reference: dict, diagrams: list[dict], threshold: float = DEFAULT_THRESHOLD) -> dict[str, np.ndarray]:
+    """Score parsed diagrams against one reference diagram.
+
+    All names are embedded once and compared in one matrix product,
+    so a whole sweep of one prompt is scored with a handful of NumPy
+    operations. Returns arrays with one entry per diagram: matched and
+    total element counts per element type (`<type>_generated_hits`,
+    `<type>_generated`, `<type>_reference_hits`, `<type>_reference`).
+    """
+    index = _NameIndex()
+    generated = {t: _element_table(diagrams, t, index) for t in ELEMENT_TYPES}
+    references = {t: _element_table([reference], t, index) for t in ELEMENT_TYPES}
+
+    # Only compare against reference names: (all names x reference names)
+    reference_rows = np.unique(np.concatenate([table[0].ravel() for table in references.values()]))
+    column = np.zeros(len(index.rows), dtype=np.intp)
+    column[reference_rows] = np.arange(len(reference_rows))
+    references = {t: (column[names], mult, owners) for t, (names, mult, owners) in references.items()}
+
+    embeddings = embed_names(index.names())
+    name_similarity = embeddings @ embeddings[reference_rows].T
+
+    counts = {}
+    for element_type in ELEMENT_TYPES:
+        gen_table, ref_table = generated[element_type], references[element_type]
+        owners = gen_table[2]
+        ref_total = len(ref_table[0])
+
+        generated_total = np.bincount(owners, minlength=len(diagrams))
+        generated_hits = np.zeros(len(diagrams), dtype=np.intp)
+        reference_hits = np.zeros(len(diagrams), dtype=np.intp)
+
+        if len(owners) and ref_total:
+            similarity = _element_similarity(element_type, name_similarity, gen_table, ref_table) >= threshold
+            generated_hits = np.bincount(owners, weights=similarity.any(axis=1), minlength=len(diagrams)).astype(np.intp)
+
+            # Elements are grouped by diagram, so each diagram is one contiguous segment
+            present = np.flatnonzero(generated_total)
+            starts = np.concatenate(([0], np.cumsum(generated_total[present])[:-1]))
+            found = np.logical_or.reduceat(similarity, starts, axis=0)
+            reference_hits[present] = found.sum(axis=1)
+
+        counts[f"{element_type}_generated_hits"] = generated_hits
+        counts[f"{element_type}_generated"] = generated_total
+        counts[f"{element_type}_reference_hits"] = reference_hits
+        counts[f"{element_type}_reference"] = np.full(len(diagrams), ref_total, dtype=np.intp)
+
+    return counts
+
+
+def precision_recall_f1(counts: dict[str, np.ndarray], element_types=ELEMENT_TYPES) -> dict[str, np.ndarray]:
+    """Turn match counts into precision, recall and F1, micro-averaged over `element_types`."""
+    generated_hits = sum(counts[f"{t}_generated_hits"] for t in element_types)
+    generated = sum(counts[f"{t}_generated"] for t in element_types)
+    reference_hits = sum(counts[f"{t}_reference_hits"] for t in element_types)
+    reference = sum(counts[f"{t}_reference"] for t in element_types)
+
+    # Leaving out an element type the reference does not have either is correct
+    nothing_expected = (generated == 0) & (reference == 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(generated > 0, generated_hits / generated, nothing_expected.astype(float))
+        recall = np.where(reference > 0, reference_hits / reference, nothing_expected.astype(float))
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    return {"precision": precision, "recall": recall, "f1": f1}
+
+
+def iter_run_diagrams(base_dir: Path):
+    """Yield the PlantUML code of every run stored in the `test_runs/` layout."""
+    for run_dir in sorted(base_dir.glob("*/*/temp_*/run_*")):
+        prompt_name, model, temp_folder = run_dir.parts[-4:-1]
+        puml_files = list(run_dir.glob("*_PUML.puml"))
+        if puml_files:
+            plantuml_code = puml_files[0].read_text(encoding="utf-8")
+        else:
+            response_files = list(run_dir.glob("*_RESPONSE.txt"))
+            # Failed API calls say nothing about the model's diagram quality
+            if not response_files or response_files[0].read_text(encoding="utf-8").startswith("ERROR:"):
+                continue
+            plantuml_code = ""
+        yield {
+            "prompt_name": prompt_name,
+            "model": model,
+            "temperature": temp_folder[len("temp_"):].replace("_", "."),
+            "run": str(run_dir),
+            "plantuml": plantuml_code,
+        }
+
+
+def iter_store_diagrams(results_store):
+    """Yield the PlantUML code of every successful run in a results store."""
+    for run in results_store.iter_runs():
+        if run["status"] == "error":
+            continue
+        yield {
+            "prompt_name": run["prompt_name"],
+            "model": run["model"],
+            "temperature": str(run["temperature"]),
+            "run": str(run["id"]),
+            "plantuml": run["plantuml"] or "",
+        }
+
+
+def evaluate(runs, references: dict[str, dict], threshold: float = DEFAULT_THRESHOLD) -> list[dict]:
+    """Score runs against the reference of their prompt and return one row per run."""
+    by_prompt = defaultdict(list)
+    for run in runs:
+        if run["prompt_name"] in references:
+            by_prompt[run["prompt_name"]].append(run)
+
+    rows = []
+    for prompt_name, prompt_runs in by_prompt.items():
+        # Low temperature sweeps repeat the same diagram many times, parse each once
+        parsed = {}
+        diagrams = []
+        for run in prompt_runs:
+            diagram = parsed.get(run["plantuml"])
+            if diagram is None:
+                diagram = parsed[run["plantuml"]] = parse_class_diagram(run["plantuml"])
+            diagrams.append(diagram)
+        counts = score_diagrams(references[prompt_name], diagrams, threshold)
+
+        scores = {}
+        for element_type in ELEMENT_TYPES:
+            for metric, values in precision_recall_f1(counts, (element_type,)).items():
+                scores[f"{element_type}_{metric}"] = values
+        for metric, values in precision_recall_f1(counts).items():
+            scores[metric] = values
+
+        for i, run in enumerate(prompt_runs):
+            row = {key: run[key] for key in ("prompt_name", "model", "temperature", "run")}
+            row.update({key: round(float(values[i]), 4) for key, values in scores.items()})
+            rows.append(row)
+    return rows
+
+
+def summarize(rows: list[dict]) -> list[dict]:
+    """Average precision, recall and F1 per prompt, model and temperature."""
+    cells = defaultdict(list)
+    for row in rows:
+        cells[(row["prompt_name"], row["model"], row["temperature"])].append(row)
+
+    summary = []
+    for (prompt_name, model, temperature), cell_rows in sorted(cells.items()):
+        summary.append({
+            "prompt_name": prompt_name,
+            "model": model,
+            "temperature": temperature,
+            "runs": len(cell_rows),
+            **{metric: float(np.mean([row[metric] for row in cell_rows])) for metric in ("precision", "recall", "f1")},
+        })
+    return summary
+
+
+def save_csv(path: Path, rows: list[dict]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else [])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Score generated class diagrams against the reference solutions in prompts/.")
+    parser.add_argument("--runs", type=Path, default=Path("test_runs"), help="Directory with the run folders")
+    parser.add_argument("--db", type=Path, help="Read runs from this results database instead of the run folders")
+    parser.add_argument("--prompts", type=Path, default=Path("prompts"), help=f"Directory with the *{REFERENCE_SUFFIX} reference diagrams")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Minimum name similarity for a match")
+    parser.add_argument("--out", type=Path, default=Path("test_runs/evaluation.csv"), help="CSV file for the per-run scores")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    references = load_references(args.prompts)
+    if not references:
+        raise SystemExit(f"[❌] No *{REFERENCE_SUFFIX} reference diagrams found in {args.prompts}")
+
+    if args.db:
+        from core.results_store import ResultsStore
+        store = ResultsStore(args.db)
+        rows = evaluate(iter_store_diagrams(store), references, args.threshold)
+        store.close()
+    else:
+        rows = evaluate(iter_run_diagrams(args.runs), references, args.threshold)
+
+    save_csv(args.out, rows)
+    for cell in summarize(rows):
+        print(f"[📐] {cell['prompt_name']} | {cell['model']} | temp={cell['temperature']}: "
+              f"P={cell['precision']:.2f} R={cell['recall']:.2f} F1={cell['f1']:.2f} ({cell['runs']} runs)")
+    print(f"✅ Scored {len(rows)} runs, saved to {args.out}")
@@ -2,6 +2,19 @@ from pathlib import Path
 from datetime import datetime
 import hashlib
 import json
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Per-cell file holding the last allocated run number
+RUN_COUNTER_FILE = ".run_counter"
+
+_counter_lock = threading.Lock()
 
 
 def get_prompt_hash(prompt: str) -> str:
@@ -22,7 +35,18 @@ def build_run_directory(base_dir: Path, prompt_name: str, model_name: str, tempe
     model_dir = base_dir / prompt_name / model_name / temp_folder
     model_dir.mkdir(parents=True, exist_ok=True)
 
-    # Find next available run number by checking existing run directories
+    while True:
+        run_dir = model_dir / f"run_{allocate_run_number(model_dir):02d}"
+        try:
+            run_dir.mkdir()
+            return run_dir
+        except FileExistsError:
+            # Created outside the counter (e.g. copied in by hand), take the next number
+            continue
+
+
+def _scan_run_numbers(model_dir: Path) -> int:
+    """Return the highest existing run number by listing the directory."""
     existing_numbers = []
     for p in model_dir.iterdir():
         if p.is_dir() and p.name.startswith("run_"):
@@ -30,11 +54,52 @@ def build_run_directory(base_dir: Path, prompt_name: str, model_name: str, tempe
                 existing_numbers.append(int(p.name.split("_")[1]))
             except (IndexError, ValueError):
                 continue
+    return max(existing_numbers) if existing_numbers else 0
+
+
+def _lock_file(fd: int):
+    if fcntl:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+
+
+def _unlock_file(fd: int):
+    if fcntl:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
 
-    next_run_number = (max(existing_numbers) if existing_numbers else 0) + 1
-    run_dir = model_dir / f"run_{next_run_number:02d}"
-    run_dir.mkdir()
-    return run_dir
+def allocate_run_number(model_dir: Path) -> int:
+    """Atomically increment and return the run counter of a directory.
+
+    The counter lives in a small file guarded by an exclusive file lock,
+    so allocation is constant-time and safe across threads and processes.
+    The directory is only listed once, when the counter file is created
+    or unreadable.
+    """
+    counter_path = model_dir / RUN_COUNTER_FILE
+    with _counter_lock:
+        fd = os.open(counter_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            _lock_file(fd)
+            try:
+                os.lseek(fd, 0, os.SEEK_SET)
+                content = os.read(fd, 32).decode("ascii", errors="ignore").strip()
+                last_run_number = int(content) if content.isdigit() else _scan_run_numbers(model_dir)
+
+                # Fixed-width overwrite in place; truncating first is much slower on ext4
+                next_run_number = last_run_number + 1
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.write(fd, f"{next_run_number:012d}".encode("ascii"))
+                return next_run_number
+            finally:
+                _unlock_file(fd)
+        finally:
+            os.close(fd)
 
 def ensure_directory(path: Path) -> None:
      """Ensure that a directory exists, creating it if necessary."""
@@ -50,13 +115,15 @@ def save_json(file_path: Path, data: dict):
     """Save a dictionary as JSON to a file."""
     file_path.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
     
-def save_plantuml(file_path: Path, plantuml_code: str):
-    """Save PlantUML code to a .puml file."""
+def format_plantuml(plantuml_code: str) -> str:
+    """Return the contents of the .puml file for the given PlantUML code."""
     code = plantuml_code.strip()
     
     if "@startuml" in code and "@enduml" in code:
-        content = code
-    else:
-        content = f"@startuml\n{code}\n@enduml"
-    
-    file_path.write_text(content, encoding="utf-8")
\ No newline at end of file
+        return code
+    return f"@startuml\n{code}\n@enduml"
+
+
+def save_plantuml(file_path: Path, plantuml_code: str):
+    """Save PlantUML code to a .puml file."""
+    file_path.write_text(format_plantuml(plantuml_code), encoding="utf-8")
\ No newline at end of file
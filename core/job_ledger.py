@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+# Lifecycle of a job in the ledger. "skipped" jobs were not needed because
+# their cell converged early in adaptive mode.
+JOB_STATES = ("pending", "in_flight", "done", "failed", "skipped")
+FINISHED_STATES = ("done", "skipped")
+
+DEFAULT_LEDGER_PATH = Path("test_runs/job_ledger.jsonl")
+
+
+def get_job_key(job: dict) -> str:
+    """Identify a cell of the prompt × model × temperature × repeat grid."""
+    return "|".join(str(part) for part in (
+        job["prompt_name"],
+        job["prompt_hash"],
+        job["model_name"],
+        job["temperature"],
+        job["max_tokens"],
+        job["repeat_index"],
+    ))
+
+
+class JobLedger:
+    """Persistent record of the state of every job in a sweep.
+
+    The ledger is an append-only JSON-lines journal. Each state transition
+    is written as one line with a single `write` call and fsynced, so a
+    crash can at most lose a torn final line, which is ignored on load.
+    The last record per job wins. On open the journal is compacted into
+    one line per job and atomically swapped in with `os.replace`.
+    """
+
+    def __init__(self, path: Path = DEFAULT_LEDGER_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.entries = self._load()
+        self._compact()
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    @classmethod
+    def from_config(cls, config: dict) -> "JobLedger":
+        ledger_config = config.get("ledger") or {}
+        return cls(Path(ledger_config.get("path", DEFAULT_LEDGER_PATH)))
+
+    def _load(self) -> dict:
+        entries = {}
+        if not self.path.exists():
+            return entries
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn write from an interrupted run
+                    continue
+                entries[record["key"]] = record
+        return entries
+
+    def _compact(self):
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in self.entries.values():
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def reset(self):
+        """Forget all recorded jobs and start a new sweep."""
+        with self.lock:
+            self.entries = {}
+            os.close(self.fd)
+            self._compact()
+            self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def mark(self, job: dict, state: str, **fields):
+        """Record that a job moved to `state`."""
+        if state not in JOB_STATES:
+            raise ValueError(f"Unknown job state: {state}")
+
+        key = get_job_key(job)
+        with self.lock:
+            record = dict(self.entries.get(key, {}))
+            record.update(fields)
+            record.update({"key": key, "state": state, "updated": time.time()})
+            os.write(self.fd, (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+            os.fsync(self.fd)
+            self.entries[key] = record
+
+    def mark_many(self, jobs: list[dict], state: str, **fields):
+        """Record that many jobs moved to `state` with a single write and fsync."""
+        if state not in JOB_STATES:
+            raise ValueError(f"Unknown job state: {state}")
+
+        with self.lock:
+            lines = []
+            now = time.time()
+            for job in jobs:
+                key = get_job_key(job)
+                record = dict(self.entries.get(key, {}))
+                record.update(fields)
+                record.update({"key": key, "state": state, "updated": now})
+                lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+                self.entries[key] = record
+            os.write(self.fd, "".join(lines).encode("utf-8"))
+            os.fsync(self.fd)
+
+    def get_state(self, job: dict) -> str | None:
+        record = self.entries.get(get_job_key(job))
+        return record["state"] if record else None
+
+    def get_run_dir(self, job: dict) -> Path | None:
+        """Return the run directory of a previous attempt, if one was recorded."""
+        record = self.entries.get(get_job_key(job))
+        if record and record.get("run_dir"):
+            return Path(record["run_dir"])
+        return None
+
+    def get_cost(self, job: dict) -> float:
+        """Return the cost recorded for a job's last response, 0 if none was."""
+        record = self.entries.get(get_job_key(job))
+        return (record or {}).get("cost") or 0.0
+
+    def get_batch_id(self, job: dict) -> str | None:
+        """Return the provider batch a job was submitted in, if it is still in flight."""
+        record = self.entries.get(get_job_key(job))
+        if record and record["state"] == "in_flight":
+            return record.get("batch_id")
+        return None
+
+    def start(self, jobs: list[dict], resume: bool = False) -> list[dict]:
+        """Register a sweep and return the jobs that still have to run.
+
+        Without `resume` the ledger is reset and every job runs. With
+        `resume` only jobs that are not recorded as done (or skipped) are
+        returned.
+        """
+        if not resume:
+            self.reset()
+
+        remaining = [job for job in jobs if self.get_state(job) not in FINISHED_STATES]
+        new_jobs = [job for job in remaining if self.get_state(job) is None]
+        if new_jobs:
+            self.mark_many(new_jobs, "pending")
+
+        if resume:
+            # Variants are identified by their prompt hash, so only new or edited ones have runs left
+            variants = {job["prompt_hash"] for job in jobs}
+            open_variants = {job["prompt_hash"] for job in remaining}
+            print(f"[⏯️] Resuming: {len(jobs) - len(remaining)} of {len(jobs)} jobs already finished, "
+                  f"{len(variants) - len(open_variants)} of {len(variants)} prompt variants complete")
+        return remaining
+
+    def summary(self) -> dict:
+        counts = {state: 0 for state in JOB_STATES}
+        for record in self.entries.values():
+            counts[record["state"]] += 1
+        return counts
+
+    def close(self):
+        with self.lock:
+            os.close(self.fd)
@@ -1,52 +1,503 @@
+import queue
 import re
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
 from pathlib import Path
-from tempfile import NamedTemporaryFile
-from plantuml import PlantUML
+import httpx
+from core.render_cache import RenderCache, get_render_hash, link_or_copy, write_image
+from core.tracing import span
 
 # Try local server first
-local_plantuml = PlantUML(url="http://localhost:8080/img/")
-fallback_plantuml = PlantUML(url="http://www.plantuml.com/plantuml/img/")
+LOCAL_PLANTUML_URL = "http://localhost:8080/img/"
+FALLBACK_PLANTUML_URL = "http://www.plantuml.com/plantuml/img/"
+
+DEFAULT_RENDER_WORKERS = 4
+# Prefetched images held without a render cache until their diagram is submitted
+MAX_PREFETCHED = 64
+
+# Printed by `plantuml.jar -pipe` after each rendered diagram
+PIPE_DELIMITER = "___PLANTUML_DIAGRAM_END___"
+
+
+# Fence languages whose content is taken as PlantUML code
+PLANTUML_FENCE_LANGUAGES = {"plantuml", "puml", "uml"}
+
+# Text that opens or closes a diagram when it starts a line. @startuml also
+# opens one at the end of a line, e.g. "Here is the diagram: @startuml".
+DIAGRAM_MARKERS = ("```", "~~~", "@startuml", "@enduml")
+FENCE_INFO = re.compile(r"(?:`{3,}|~{3,})[ \t]*([\w+-]*)")
+
+
+def _iter_diagram_markers(text: str):
+    """Yield (marker, fence language, line start, next line start) for every marker line.
+
+    Each marker string is searched with `str.find`, which only moves
+    forward, so the text is scanned a fixed number of times no matter how
+    long it is or how many blocks it has.
+    """
+    positions = {marker: text.find(marker) for marker in DIAGRAM_MARKERS}
+    while True:
+        pos, marker = min(((pos, marker) for marker, pos in positions.items() if pos != -1), default=(-1, None))
+        if marker is None:
+            return
+
+        line_start = pos
+        while line_start > 0 and text[line_start - 1] in " \t":
+            line_start -= 1
+        if line_start == 0 or text[line_start - 1] == "\n":
+            line_end = text.find("\n", pos)
+            line_end = len(text) if line_end == -1 else line_end + 1
+            lang = FENCE_INFO.match(text, pos).group(1) if marker[0] in "`~" else ""
+            yield marker, lang, line_start, line_end
+            resume_at = line_end
+        else:
+            line_end = text.find("\n", pos)
+            line_end = len(text) if line_end == -1 else line_end + 1
+            if marker == "@startuml" and not text[pos + len(marker):line_end].strip():
+                yield marker, "", pos, line_end
+                resume_at = line_end
+            else:
+                # Marker in the middle of a line, e.g. inline code
+                resume_at = pos + len(marker)
+
+        for other, other_pos in positions.items():
+            if other_pos != -1 and other_pos < resume_at:
+                positions[other] = text.find(other, resume_at)
+
+
+def _block(text: str, start: int, end: int, kind: str, truncated: bool) -> dict:
+    code = text[start:end].replace("\r\n", "\n").strip()
+    return {"code": code, "start": start, "end": end, "kind": kind, "truncated": truncated}
+
+
+def iter_plantuml_blocks(text: str):
+    """Yield every PlantUML diagram in a response in a single pass.
+
+    Diagrams are ```plantuml / ```puml fences or @startuml ... @enduml
+    blocks, with LF or CRLF line endings. Each block is a dict with the
+    code, its `start`/`end` offsets in `text`, its `kind` ("fence" or
+    "startuml") and whether it is `truncated`, i.e. the response ended
+    (usually at max_tokens) before the diagram was closed.
+    """
+    fence = None       # (line start, content start) of an open fence
+    fence_is_plantuml = False
+    startuml = None    # (line start, content start) of an open @startuml outside a PlantUML fence
+
+    for marker, lang, line_start, next_line in _iter_diagram_markers(text):
+        if marker in ("```", "~~~"):
+            if fence is None:
+                fence = (line_start, next_line)
+                fence_is_plantuml = lang.lower() in PLANTUML_FENCE_LANGUAGES
+            elif not lang:
+                if fence_is_plantuml:
+                    yield _block(text, fence[1], line_start, "fence", False)
+                elif startuml is not None and startuml[0] > fence[0]:
+                    # @startuml inside another fence that closed before @enduml
+                    yield _block(text, startuml[1], line_start, "startuml", True)
+                    startuml = None
+                fence = None
+        elif fence is not None and fence_is_plantuml:
+            # @startuml/@enduml are part of the fenced code
+            continue
+        elif marker == "@startuml":
+            if startuml is None:
+                startuml = (line_start, next_line)
+        elif startuml is not None:
+            yield _block(text, startuml[1], line_start, "startuml", False)
+            startuml = None
+
+    if fence is not None and fence_is_plantuml:
+        block = _block(text, fence[1], len(text), "fence", True)
+        # A diagram that is complete apart from the closing fence is still usable
+        block["truncated"] = "@enduml" not in block["code"]
+        yield block
+    elif startuml is not None:
+        yield _block(text, startuml[1], len(text), "startuml", True)
+
+
+def extract_plantuml_blocks(text: str) -> list[dict]:
+    """Return every PlantUML diagram in a response, see `iter_plantuml_blocks`."""
+    return list(iter_plantuml_blocks(text))
+
 
 def extract_plantuml_code(text: str) -> str:
-    """Extract PlantUML code from a response."""
-    match = re.search(r'```plantuml\n(.*?)\n```', text, re.DOTALL)
-    if match:
-        return match.group(1).strip()
+    """Extract PlantUML code from a response.
 
-    match = re.search(r'@startuml\n(.*?)\n@enduml', text, re.DOTALL)
-    if match:
-        return match.group(1).strip()
+    As before the scanner, a complete PlantUML fence is preferred over a
+    bare @startuml block that comes earlier.
+    """
+    bare_code = ""
+    # Stop at the first complete fence instead of scanning the whole response
+    for block in iter_plantuml_blocks(text):
+        if block["truncated"] or not block["code"]:
+            continue
+        if block["kind"] == "fence":
+            return block["code"]
+        bare_code = bare_code or block["code"]
+    return bare_code
 
-    return ""
 
+def wrap_plantuml(plantuml_code: str) -> str:
+    """Return the code as a complete @startuml/@enduml document."""
+    return f"@startuml\n{plantuml_code}\n@enduml\n"
 
-def create_plantuml_image(plantuml_code: str, output_image_path: Path):
-    """Create a PlantUML image from the provided code and save it to the specified path."""
-    with NamedTemporaryFile("w+", suffix=".puml", delete=False, encoding="utf-8") as tmp_file:
-        tmp_file.write(f"@startuml\n{plantuml_code}\n@enduml\n")
-        tmp_file_path = Path(tmp_file.name)
 
-    output_image_path.parent.mkdir(parents=True, exist_ok=True)
+class HTTPRenderer:
+    """Render diagrams through a PlantUML server over keep-alive connections.
+
+    One `httpx.Client` with a bounded connection pool is shared by all
+    render workers. If the local server fails, the public server is tried.
+    """
+
+    def __init__(self, server_url: str = LOCAL_PLANTUML_URL, fallback_url: str | None = FALLBACK_PLANTUML_URL, workers: int = DEFAULT_RENDER_WORKERS, timeout: float = 30.0):
+        self.server_url = server_url
+        self.fallback_url = fallback_url
+        # The public server redirects http to https, httplib2 followed that on its own
+        self.http = httpx.Client(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=workers, max_keepalive_connections=workers),
+            follow_redirects=True,
+        )
+
+    def _request(self, url: str, encoded: str) -> bytes:
+        response = self.http.get(url + encoded)
+        response.raise_for_status()
+        return response.content
+
+    def render(self, plantuml_code: str) -> bytes | None:
+        """Return the PNG bytes of a diagram, or None if it could not be rendered."""
+        # The plantuml package pulls in httplib2, only load it once a diagram is rendered
+        from plantuml import deflate_and_encode
+        encoded = deflate_and_encode(wrap_plantuml(plantuml_code))
+
+        try:
+            with span("render_local"):
+                return self._request(self.server_url, encoded)
+        except httpx.HTTPStatusError as e:
+            if e.response.headers.get("X-PlantUML-Diagram-Error"):
+                # The diagram itself is invalid, another server will not do better
+                print(f"[❌] PlantUML syntax error: {e.response.headers['X-PlantUML-Diagram-Error']}")
+                return None
+            error = e
+        except Exception as e:
+            error = e
+
+        print(f"[⚠️] Local PlantUML failed: {type(error).__name__}: {error}")
+        if not self.fallback_url:
+            return None
 
-    try:
-        local_plantuml.processes_file(str(tmp_file_path))
-    except Exception as e:
-        print(f"[⚠️] Local PlantUML failed: {type(e).__name__}: {e}")
         print("[↪️] Retrying with public server...")
         try:
-            fallback_plantuml.processes_file(str(tmp_file_path))
+            # A full round trip to the public server on top of the failed local attempt
+            with span("render_fallback"):
+                return self._request(self.fallback_url, encoded)
         except Exception as e2:
             print(f"[❌] Public PlantUML also failed: {type(e2).__name__}: {e2}")
+            return None
+
+    def close(self):
+        self.http.close()
+
+
+class _PipeProcess:
+    """A long-lived `plantuml.jar -pipe` process rendering one diagram at a time."""
+
+    def __init__(self, command: list[str]):
+        self.command = command
+        self.buffer = b""
+        self.process = self._start()
+
+    def _start(self) -> subprocess.Popen:
+        self.buffer = b""
+        return subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def render(self, plantuml_code: str) -> bytes:
+        if self.process.poll() is not None:
+            self.process = self._start()
+
+        self.process.stdin.write(wrap_plantuml(plantuml_code).encode("utf-8"))
+        self.process.stdin.flush()
+
+        # Read until the delimiter that follows the image
+        delimiter = PIPE_DELIMITER.encode("utf-8")
+        while delimiter not in self.buffer:
+            chunk = self.process.stdout.read1(65536)
+            if not chunk:
+                raise RuntimeError("plantuml.jar exited while rendering")
+            self.buffer += chunk
+
+        # The delimiter directly follows the image bytes and ends with a newline
+        image, _, rest = self.buffer.partition(delimiter)
+        self.buffer = rest.lstrip(b"\r\n")
+        return image
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.wait(timeout=10)
+
+
+class JarRenderer:
+    """Render diagrams with a pool of local `plantuml.jar -pipe` processes.
+
+    Each process stays alive for the whole run, so the JVM starts once per
+    worker instead of once per diagram.
+    """
+
+    def __init__(self, jar_path: str = "plantuml.jar", workers: int = DEFAULT_RENDER_WORKERS, java: str = "java"):
+        command = [java, "-Djava.awt.headless=true", "-jar", jar_path, "-pipe", "-tpng", "-pipedelimitor", PIPE_DELIMITER]
+        self.processes = [_PipeProcess(command) for _ in range(workers)]
+        self.available = queue.Queue()
+        for process in self.processes:
+            self.available.put(process)
+
+    def render(self, plantuml_code: str) -> bytes | None:
+        """Return the PNG bytes of a diagram, or None if it could not be rendered."""
+        process = self.available.get()
+        try:
+            with span("render_jar"):
+                return process.render(plantuml_code)
+        except Exception as e:
+            print(f"[❌] plantuml.jar failed: {type(e).__name__}: {e}")
+            process.process.kill()
+            return None
+        finally:
+            self.available.put(process)
+
+    def close(self):
+        for process in self.processes:
+            process.close()
+
+
+def create_renderer(config: dict):
+    """Create the renderer selected in the `rendering` config section."""
+    render_config = config.get("rendering") or {}
+    backend = render_config.get("backend", "http")
+    workers = render_config.get("workers", DEFAULT_RENDER_WORKERS)
+
+    if backend == "jar":
+        return JarRenderer(
+            jar_path=render_config.get("jar_path", "plantuml.jar"),
+            workers=workers,
+            java=render_config.get("java", "java"),
+        )
+    if backend == "http":
+        return HTTPRenderer(
+            server_url=render_config.get("server_url", LOCAL_PLANTUML_URL),
+            fallback_url=render_config.get("fallback_url", FALLBACK_PLANTUML_URL),
+            workers=workers,
+            timeout=render_config.get("timeout", 30.0),
+        )
+    raise ValueError(f"Unknown rendering backend: {backend}")
+
+
+class RenderQueue:
+    """Pipeline stage that renders queued diagrams on a pool of worker threads.
+
+    Runners submit diagrams and carry on with the next API call while the
+    images are rendered and written in the background. With a render cache,
+    diagrams whose normalized source was rendered before are linked from
+    the cache. Without one, only identical diagrams in flight at the same
+    time are rendered once. Diagrams prefetched while a response is still
+    streaming are reused. Rendered, failed, hit and miss counts are kept
+    once per submitted diagram.
+    """
+
+    def __init__(self, renderer, workers: int = DEFAULT_RENDER_WORKERS, cache: RenderCache | None = None):
+        self.renderer = renderer
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="plantuml-render")
+        self.rendered = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.prefetched = {}
+        # Diagrams a prefetch rendered into the cache that were not submitted yet, oldest first
+        self.prefetched_to_cache = {}
+
+    @classmethod
+    def from_config(cls, config: dict) -> "RenderQueue":
+        render_config = config.get("rendering") or {}
+        return cls(
+            create_renderer(config),
+            workers=render_config.get("workers", DEFAULT_RENDER_WORKERS),
+            cache=RenderCache.from_config(config),
+        )
+
+    def _claim(self, render_hash: str) -> dict | None:
+        """Mark a diagram as being rendered, or return the claim of the worker already on it."""
+        with self.lock:
+            claim = self.in_flight.get(render_hash)
+            if claim is None:
+                self.in_flight[render_hash] = {"done": threading.Event(), "path": None}
+            return claim
+
+    def _release(self, render_hash: str, output_image_path: Path | None = None):
+        """Hand the written image (None if there is none) to the workers waiting for it."""
+        with self.lock:
+            claim = self.in_flight.pop(render_hash)
+        claim["path"] = output_image_path
+        claim["done"].set()
+
+    def _count(self, rendered: bool) -> bool:
+        with self.lock:
+            if rendered:
+                self.rendered += 1
+            else:
+                self.failed += 1
+        return rendered
+
+    def _render(self, plantuml_code: str, output_image_path: Path) -> bool:
+        render_hash = get_render_hash(plantuml_code)
+        while True:
+            with self.lock:
+                image = self.prefetched.pop(render_hash, None)
+            if image is not None:
+                write_image(output_image_path, image)
+                return self._count(True)
+
+            if self.cache and self.cache.lookup(render_hash, output_image_path):
+                with self.lock:
+                    rendered_by_prefetch = self.prefetched_to_cache.pop(render_hash, False)
+                # A diagram prefetched for this submit was rendered, not found in the cache
+                if rendered_by_prefetch:
+                    self.cache.record_miss()
+                else:
+                    self.cache.record_hit()
+                return self._count(True)
+
+            claim = self._claim(render_hash)
+            if claim is None:
+                break
+            # Another worker is rendering the same diagram, wait for its result
+            claim["done"].wait()
+            if not self.cache and claim["path"] is not None:
+                link_or_copy(claim["path"], output_image_path)
+                return self._count(True)
+
+        if self.cache:
+            self.cache.record_miss()
+
+        written = None
+        try:
+            image = self.renderer.render(plantuml_code)
+            if image is None:
+                return self._count(False)
+            # The path may be a hardlink to a cached image of another diagram
+            write_image(output_image_path, image)
+            written = output_image_path
+            if self.cache:
+                self.cache.store(render_hash, image)
+            return self._count(True)
+        finally:
+            self._release(render_hash, written)
+
+    def _prefetch(self, plantuml_code: str):
+        render_hash = get_render_hash(plantuml_code)
+        if self.cache and self.cache.contains(render_hash):
+            return
+        if self._claim(render_hash) is not None:
             return
 
-    generated_img = tmp_file_path.with_suffix(".png")
-    if generated_img.exists():
-        generated_img.rename(output_image_path)
+        try:
+            # Counted by the submit that uses the image, a failed prefetch is retried there
+            image = self.renderer.render(plantuml_code)
+            if image is None:
+                return
+            if self.cache:
+                self.cache.store(render_hash, image)
+                with self.lock:
+                    if len(self.prefetched_to_cache) >= MAX_PREFETCHED:
+                        self.prefetched_to_cache.pop(next(iter(self.prefetched_to_cache)))
+                    self.prefetched_to_cache[render_hash] = True
+            else:
+                with self.lock:
+                    # A streamed diagram may never be submitted, drop the oldest image instead of piling them up
+                    if len(self.prefetched) >= MAX_PREFETCHED:
+                        self.prefetched.pop(next(iter(self.prefetched)))
+                    self.prefetched[render_hash] = image
+        finally:
+            self._release(render_hash)
+
+    def submit(self, plantuml_code: str, output_image_path: Path) -> Future:
+        """Queue a diagram for rendering into `output_image_path`."""
+        return self.executor.submit(self._render, plantuml_code, output_image_path)
+
+    def prefetch(self, plantuml_code: str) -> Future:
+        """Start rendering a diagram before its output path is known.
+
+        A later `submit` of the same diagram waits for this render and
+        reuses its image instead of rendering again.
+        """
+        return self.executor.submit(self._prefetch, plantuml_code)
+
+    def close(self):
+        """Wait for all queued diagrams and release the renderer."""
+        self.executor.shutdown(wait=True)
+        self.renderer.close()
+        print(f"[🖼️] Wrote {self.rendered} diagrams ({self.failed} failed)")
+        if self.cache:
+            stats = self.cache.stats()
+            print(f"[🖼️] Render cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")
+
+
+class StreamingDiagramWatcher:
+    """Prefetch a diagram as soon as its end has been streamed.
+
+    Pass `on_text` to `LLMClient.stream_prompt`. Once the streamed text
+    contains a complete PlantUML block it is handed to the render queue
+    while the rest of the response is still arriving. Call `reset` before
+    a failed stream is retried, so its text is not mixed into the retry.
+    """
+
+    END_MARKERS = ("@enduml", "```")
+
+    def __init__(self, render_queue: RenderQueue):
+        self.render_queue = render_queue
+        self.text = ""
+        self.submitted = False
+
+    def reset(self):
+        self.text = ""
+        self.submitted = False
 
-    tmp_file_path.unlink(missing_ok=True)
+    def on_text(self, delta: str):
+        if self.submitted:
+            return
+
+        # Only look at the newly streamed text (plus a marker split across chunks)
+        tail_start = max(0, len(self.text) - len("@enduml"))
+        self.text += delta
+        tail = self.text[tail_start:]
+        if not any(marker in tail for marker in self.END_MARKERS):
+            return
+
+        plantuml_code = extract_plantuml_code(self.text)
+        if plantuml_code:
+            self.render_queue.prefetch(plantuml_code)
+            self.submitted = True
+
+
+# Shared renderer for one-off calls to create_plantuml_image
+_default_renderer = None
+_default_renderer_lock = threading.Lock()
+
+
+def create_plantuml_image(plantuml_code: str, output_image_path: Path):
+    """Create a PlantUML image from the provided code and save it to the specified path."""
+    global _default_renderer
+    with _default_renderer_lock:
+        if _default_renderer is None:
+            _default_renderer = HTTPRenderer()
 
-    generated_img = tmp_file_path.with_suffix(".png")
-    if generated_img.exists():
-        generated_img.rename(output_image_path)
+    image = _default_renderer.render(plantuml_code)
+    if image is None:
+        return
 
-    tmp_file_path.unlink(missing_ok=True)
+    write_image(output_image_path, image)
@@ -1,15 +1,67 @@
+import itertools
 from pathlib import Path
+from string import Template
+import yaml
+
+# Prompt templates next to the plain *.txt prompts
+TEMPLATE_SUFFIX = ".yaml"
+
 
 def load_prompts(prompt_dir: Path) -> list[dict]:
     """Load prompts from a directory."""
+    return list(iter_prompts(prompt_dir))
 
-    prompt_data = []
 
+def iter_prompts(prompt_dir: Path):
+    """Yield every plain prompt, then every variant of every prompt template."""
     for file in sorted(prompt_dir.glob("*.txt")):
-        prompt_data.append({
+        yield {
             "name": file.stem,
             "path": file,
             "text": file.read_text(encoding="utf-8").strip()
-        })
+        }
+
+    for file in sorted(prompt_dir.glob(f"*{TEMPLATE_SUFFIX}")):
+        with open(file, "r", encoding="utf-8") as f:
+            yield from expand_template(yaml.safe_load(f), file)
+
+
+def expand_template(template: dict, path: Path):
+    """Yield one prompt per combination of the template's parameter values.
+
+    A template file has a `template` text with `$axis` (or `${axis}`)
+    placeholders and a `parameters` grid mapping each axis to named
+    values. Variants are produced lazily, so large grids are never held in
+    memory as a whole. `variant_name` names each variant from the value
+    names, by default `<name>__<value>__<value>...`. A literal `$` in the
+    template is written as `$$`.
+    """
+    template_name = template.get("name", path.stem)
+    text = Template(template["template"])
+    axes = template.get("parameters") or {}
+    for axis, values in axes.items():
+        if not values:
+            raise ValueError(f"{path.name}: parameter {axis} has no values")
+    variant_name = Template(template.get("variant_name") or "__".join([template_name, *(f"${{{axis}}}" for axis in axes)]))
+
+    seen = set()
+    for combination in itertools.product(*(values.items() for values in axes.values())):
+        variant = {axis: str(key) for axis, (key, _) in zip(axes, combination)}
+        values = {axis: "" if value is None else str(value).strip() for axis, (_, value) in zip(axes, combination)}
+        try:
+            prompt_text = text.substitute(values).strip()
+            name = variant_name.substitute(variant)
+        except KeyError as e:
+            raise ValueError(f"{path.name}: ${e.args[0]} is not a parameter of the template") from e
+
+        if name in seen:
+            raise ValueError(f"{path.name}: several variants are named {name}, add the missing axes to variant_name")
+        seen.add(name)
 
-    return prompt_data
+        yield {
+            "name": name,
+            "path": path,
+            "text": prompt_text,
+            "template": template_name,
+            "variant": variant,
+        }
@@ -1,6 +1,5 @@
 from pathlib import Path
-from dotenv import load_dotenv
-from core.prompt_loader import load_prompts
+from core.prompt_loader import iter_prompts
 from core.file_manager import (
     get_prompt_hash,
     build_run_directory,
@@ -8,162 +7,332 @@ from core.file_manager import (
     save_json,
     save_plantuml
 )
-from core.plantUML_renderer import extract_plantuml_code, create_plantuml_image
-from datetime import datetime
-
-# Load API key from .env file
-load_dotenv()
+from core.plantUML_renderer import extract_plantuml_code, extract_plantuml_blocks, create_plantuml_image, StreamingDiagramWatcher
+from core.tracing import span
+from llm_clients.base_client import build_response_metadata
 
 # Directory paths
 PROMPT_DIR = Path("prompts")
 OUTPUT_BASE = Path("test_runs")
 
-def run_prompts(models, prompt_filter=None, model_filter=None, temperature_override=None, max_tokens_override=None, repeat_override=None):
-    """Run all prompts against all configured models.
 
-    Parameters
-    ----------
-    models : list[dict]
-        Configuration for each model including name, client instance,
-        default temperature, and repeat count.
-        default temperature, repeat count and max tokens.
-    prompt_filter : str | None
-        If provided, only the prompt with this name will be executed.
-    model_filter : str | None
-        If provided, only the model with this name will be executed.
-    temperature_override : float | None
-        Override the model's default temperature.
-    max_tokens_override : int | None
-        Override the model's default max token value.
-    repeat_override : int | None
-        Override how many times each test should be repeated.
+def build_jobs(models, prompt_filter=None, model_filter=None, temperature_override=None, max_tokens_override=None, repeat_override=None) -> list[dict]:
+    """Expand prompts × models × repeats into a flat list of jobs.
+
+    Each job is a dictionary holding everything needed to send one prompt
+    to one model and store the result. Prompt templates are expanded into
+    their variants while the jobs are built. The prompt text is saved next
+    to the run folders the first time it is seen.
     """
-    
-    prompts = load_prompts(PROMPT_DIR)
-    
-    # Ensure the prompt directory exists and contains prompts
-    for prompt in prompts:
+    jobs = []
+
+    for prompt in iter_prompts(PROMPT_DIR):
         prompt_name = prompt["name"]
-        
-        # Skip prompts that do not match the prompt_filter, if a filter is set
-        if prompt_filter and prompt_name != prompt_filter:
+
+        # Skip prompts that do not match the prompt_filter, if a filter is set.
+        # A template name selects all of its variants.
+        if prompt_filter and prompt_filter not in (prompt_name, prompt.get("template")):
             continue
-        
+
         prompt_text = prompt["text"]
         prompt_hash = get_prompt_hash(prompt_text)
         prompt_folder = OUTPUT_BASE / prompt_name
         prompt_folder.mkdir(parents=True, exist_ok=True)
-        
+
         prompt_txt_path = prompt_folder / f"{prompt_name}_{prompt_hash}.txt"
         if not prompt_txt_path.exists():
             save_text(prompt_txt_path, prompt_text)
-            
+
         for model_config in models:
             model_name = model_config["name"]
-            
-             # Skip models that do not match the model_filter, if a filter is set
+
+            # Skip models that do not match the model_filter, if a filter is set
             if model_filter and model_name != model_filter:
                 continue
-            
-            client = model_config["client"]
+
             temperature = temperature_override if temperature_override is not None else model_config["temperature"]
             max_tokens = max_tokens_override if max_tokens_override is not None else model_config.get("max_tokens", 1000)
             repeat = repeat_override if repeat_override is not None else model_config["repeat"]
-            
+
             for i in range(1, repeat + 1):
-                print(f"\n🔁 {prompt_name} | {model_name} | temp={temperature} | run={i}")
-                
-                parameters = {
-                    "model": model_name,
-                    "temperature": temperature,
-                    "max_tokens": max_tokens,
-                }
-                
-                # Build the run directory for this prompt,model and temperature
-                run_dir = build_run_directory(
-                    base_dir=OUTPUT_BASE,
-                    prompt_name=prompt_name,
-                    model_name=model_name,
-                    temperature=temperature,
-                )
-                
-                # Send the prompt to the LLM client
-                result = client.send_prompt(prompt_text, parameters)
-                
-                # Access the ID directly from the result dictionary (as added in GeminiClient)
-                completion_id = result.get("id", "N/A") 
-                raw_response_obj = result.get("raw_response") # Get the raw API response object
-
-                model_version = "N/A"
-                created_timestamp = "N/A"
-                system_fingerprint = "N/A"
-                prompt_tokens = 0
-                completion_tokens = 0
-                total_tokens = 0
-
-                # Logic to extract metadata based on the type of raw_response_obj
-                if model_name.startswith("gpt") or model_name.startswith("deepseek"):
-                    # GPT specific attributes
-                    if raw_response_obj:
-                        model_version = getattr(raw_response_obj, "model", "N/A")
-                        created_timestamp = datetime.fromtimestamp(getattr(raw_response_obj, "created", 0)).strftime('%Y-%m-%d %H:%M:%S') if getattr(raw_response_obj, "created", 0) else "N/A"
-                        system_fingerprint = getattr(raw_response_obj, "system_fingerprint", "N/A")
-                        if hasattr(raw_response_obj, "usage") and raw_response_obj.usage:
-                            usage = raw_response_obj.usage
-                            prompt_tokens = getattr(usage, "prompt_tokens", 0)
-                            completion_tokens = getattr(usage, "completion_tokens", 0)
-                            total_tokens = getattr(usage, "total_tokens", 0)
-                elif model_name.startswith("gemini"):
-                    # Gemini specific attributes
-                    if raw_response_obj:
-                        model_version = getattr(raw_response_obj, "model_version", "N/A")
-                        created_timestamp = getattr(raw_response_obj, "createTime", datetime.now().strftime('%Y-%m-%d %H:%M:%S')) 
-                        system_fingerprint = "N/A" 
-                        if hasattr(raw_response_obj, "usage_metadata") and raw_response_obj.usage_metadata:
-                            usage_metadata = raw_response_obj.usage_metadata
-                            prompt_tokens = getattr(usage_metadata, "prompt_token_count", 0)
-                            completion_tokens = getattr(usage_metadata, "candidates_token_count", 0)
-                            total_tokens = getattr(usage_metadata, "total_token_count", 0)
-                elif model_name.startswith("claude"):
-                    # Claude specific attributes
-                        if raw_response_obj:
-                            model_version = getattr(raw_response_obj, "model", "N/A")
-                            created_timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                            system_fingerprint = "N/A"
-                            if hasattr(raw_response_obj, "usage"):
-                                prompt_tokens = getattr(raw_response_obj.usage, "input_tokens", 0)
-                                completion_tokens = getattr(raw_response_obj.usage, "output_tokens", 0)
-                                total_tokens = prompt_tokens + completion_tokens
-                
-                # Save response text
-                save_text(run_dir / f"{prompt_name}_{prompt_hash}_RESPONSE.txt", result["text"])
-                
-                # Create .plum file and PlantUML diagram
-                uml_code = extract_plantuml_code(result["text"])
-                if uml_code:
-                    plum_path = run_dir / f"{prompt_name}_{prompt_hash}_PUML.puml"
-                    save_plantuml(plum_path, uml_code)
-                    image_path = run_dir / f"{prompt_name}_{prompt_hash}_DIAGRAM.png"
-                    create_plantuml_image(uml_code, image_path)
-                else:
-                    print("[⚠️] No PlantUML code found in response from {model_name}, skipping diagram generation.")
-                
-                # Save metadata json
-                save_json(run_dir / f"{prompt_name}_{prompt_hash}_METADATA.json", {
+                jobs.append({
                     "prompt_name": prompt_name,
-                    "model": model_name,
-                    "model_version": model_version,
-                    "temperature": temperature,
+                    "prompt_text": prompt_text,
                     "prompt_hash": prompt_hash,
-                    "completion_id": completion_id,
-                    "system_fingerprint": system_fingerprint,
-                    "timestamp": created_timestamp,
-                    "prompt_tokens": prompt_tokens,
-                    "completion_tokens": completion_tokens,
-                    "total_tokens": total_tokens,
-                    "latency": result.get("latency"),
-                    "status": result.get("status")
+                    "model_name": model_name,
+                    "client": model_config.get("client"),
+                    "temperature": temperature,
+                    "max_tokens": max_tokens,
+                    "repeat_index": i,
+                    "prompt_variant": prompt.get("variant"),
                 })
-                
-                print(f"✅ Saved to: {run_dir}")
 
+    return jobs
+
+
+def get_job_parameters(job: dict) -> dict:
+    """Return the sampling parameters passed to the LLM client for a job."""
+    return {
+        "model": job["model_name"],
+        "temperature": job["temperature"],
+        "max_tokens": job["max_tokens"],
+    }
+
+
+def get_stream_watcher(stream: bool, render_queue=None) -> StreamingDiagramWatcher | None:
+    """Return the watcher that starts rendering while a response streams."""
+    if stream and render_queue:
+        return StreamingDiagramWatcher(render_queue)
+    return None
+
+
+def send_job(job: dict, scheduler=None, cache=None, stream=False, render_queue=None) -> dict:
+    """Send a job's prompt to its client, through the rate limit scheduler if given.
+
+    With a response cache, a stored response for the same prompt hash,
+    model, sampling parameters and repeat index is returned instead. In
+    streaming mode the diagram is queued for rendering as soon as its end
+    has been received.
+    """
+    if cache:
+        with span("cache_lookup"):
+            cached = cache.get(job)
+        if cached:
+            print("[💾] Using cached response")
+            return cached
+
+    parameters = get_job_parameters(job)
+    watcher = get_stream_watcher(stream, render_queue)
+    on_text = watcher.on_text if watcher else None
+    on_retry = watcher.reset if watcher else None
+    with span("api_call", provider=job["client"].provider, model=job["model_name"], stream=stream) as call:
+        if scheduler:
+            result = scheduler.send(job["client"], job["prompt_text"], parameters, stream=stream, on_text=on_text, on_retry=on_retry)
+        elif stream:
+            result = job["client"].stream_prompt(job["prompt_text"], parameters, on_text)
+        else:
+            result = job["client"].send_prompt(job["prompt_text"], parameters)
+        call.set(status=result.get("status", "ok"), status_code=result.get("status_code"), attempts=result.get("attempts", 1))
+
+    with span("extract_metadata"):
+        result["response_metadata"] = extract_response_metadata(job["client"], result.get("raw_response"))
+    if cache:
+        cache.put(job, result)
+    return result
+
+
+def extract_response_metadata(client, raw_response_obj) -> dict:
+    """Extract version, timestamp and token usage from a raw API response."""
+    if client is None:
+        return build_response_metadata()
+    return client.extract_metadata(raw_response_obj)
+
+
+def save_run_result(job: dict, result: dict, run_dir: Path | None = None, render_queue=None) -> Path:
+    """Store the response, PlantUML diagram and metadata of a finished job.
+
+    If `run_dir` is given (e.g. the folder of a failed attempt that is being
+    resumed) it is reused instead of allocating a new run folder. With a
+    render queue the diagram is rendered in the background instead of inline.
+    """
+    prompt_name = job["prompt_name"]
+    prompt_hash = job["prompt_hash"]
+    model_name = job["model_name"]
+
+    if run_dir is not None:
+        run_dir.mkdir(parents=True, exist_ok=True)
+        # Remove the diagram of the previous attempt so it cannot outlive its response
+        for suffix in ("_PUML.puml", "_DIAGRAM.png"):
+            (run_dir / f"{prompt_name}_{prompt_hash}{suffix}").unlink(missing_ok=True)
+    else:
+        # Build the run directory for this prompt,model and temperature
+        run_dir = build_run_directory(
+            base_dir=OUTPUT_BASE,
+            prompt_name=prompt_name,
+            model_name=model_name,
+            temperature=job["temperature"],
+        )
+
+    # Save response text
+    with span("write_files"):
+        save_text(run_dir / f"{prompt_name}_{prompt_hash}_RESPONSE.txt", result["text"])
+
+    # Create .plum file and PlantUML diagram
+    with span("extract_plantuml"):
+        uml_code = extract_plantuml_code(result["text"])
+    if uml_code:
+        plum_path = run_dir / f"{prompt_name}_{prompt_hash}_PUML.puml"
+        with span("write_files"):
+            save_plantuml(plum_path, uml_code)
+        image_path = run_dir / f"{prompt_name}_{prompt_hash}_DIAGRAM.png"
+        if render_queue:
+            render_queue.submit(uml_code, image_path)
+        else:
+            create_plantuml_image(uml_code, image_path)
+    elif any(block["truncated"] for block in extract_plantuml_blocks(result["text"])):
+        print(f"[✂️] PlantUML diagram from {model_name} was cut off before its end, skipping diagram generation.")
+    else:
+        print(f"[⚠️] No PlantUML code found in response from {model_name}, skipping diagram generation.")
+
+    # Save metadata json
+    with span("write_files"):
+        save_json(run_dir / f"{prompt_name}_{prompt_hash}_METADATA.json", build_run_metadata(job, result))
+
+    print(f"✅ Saved to: {run_dir}")
+    return run_dir
+
+
+def build_run_metadata(job: dict, result: dict) -> dict:
+    """Collect the metadata stored alongside a run's response."""
+    # Access the ID directly from the result dictionary (as added in GeminiClient)
+    completion_id = result.get("id") or "N/A"
+    response_metadata = result.get("response_metadata") or extract_response_metadata(job.get("client"), result.get("raw_response"))
+
+    stream_metrics = result.get("stream_metrics") or {}
+
+    return {
+        "prompt_name": job["prompt_name"],
+        "model": job["model_name"],
+        "model_version": response_metadata["model_version"],
+        "temperature": job["temperature"],
+        "prompt_hash": job["prompt_hash"],
+        "prompt_variant": job.get("prompt_variant"),
+        "completion_id": completion_id,
+        "system_fingerprint": response_metadata["system_fingerprint"],
+        "timestamp": response_metadata["timestamp"],
+        "prompt_tokens": response_metadata["prompt_tokens"],
+        "completion_tokens": response_metadata["completion_tokens"],
+        "total_tokens": response_metadata["total_tokens"],
+        "latency": result.get("latency"),
+        "status": result.get("status"),
+        "attempts": result.get("attempts", 1),
+        "cached": result.get("cached", False),
+        "time_to_first_token": stream_metrics.get("time_to_first_token"),
+        "inter_token_latency": stream_metrics.get("inter_token_latency"),
+        "tokens_per_second": stream_metrics.get("tokens_per_second"),
+        "stop_reason": result.get("stop_reason"),
+        "batch_id": result.get("batch_id"),
+        "cost": result.get("cost")
+    }
+
+
+def complete_job(job: dict, result: dict, ledger=None, render_queue=None, results_store=None) -> Path | None:
+    """Save a finished job and record its outcome in the ledger.
+
+    With a results store the run is also appended to the database. If the
+    store replaces the run folders, the job is only marked in the ledger
+    once its batch is committed, and with a render cache the diagram is
+    rendered into it so a later export can link it. The cost of the response
+    is recorded in the ledger, so a resumed sweep counts it.
+    """
+    with span("save", model=job["model_name"]):
+        state = "failed" if result.get("status") == "error" else "done"
+        fields = {"cost": result["cost"]} if result.get("cost") is not None else {}
+
+        run_dir = None
+        if results_store is None or results_store.write_files:
+            run_dir = save_run_result(
+                job,
+                result,
+                run_dir=ledger.get_run_dir(job) if ledger else None,
+                render_queue=render_queue,
+            )
+
+        if results_store is None:
+            if ledger:
+                ledger.mark(job, state, run_dir=str(run_dir), **fields)
+            return run_dir
+
+        uml_code = extract_plantuml_code(result["text"])
+        # Without run folders the image is only kept if it can go into the render cache
+        if run_dir is None and uml_code and render_queue and render_queue.cache:
+            render_queue.prefetch(uml_code)
+
+        on_commit = None
+        if ledger:
+            def on_commit():
+                ledger.mark(job, state, **fields, **({"run_dir": str(run_dir)} if run_dir else {}))
+
+        results_store.append(job, build_run_metadata(job, result), result["text"], uml_code, run_dir=run_dir, on_commit=on_commit)
+        return run_dir
+
+
+def run_prompts(models, prompt_filter=None, model_filter=None, temperature_override=None, max_tokens_override=None, repeat_override=None, scheduler=None, cache=None, ledger=None, resume=False, render_queue=None, stream=False, results_store=None, convergence=None, costs=None):
+    """Run all prompts against all configured models.
+
+    Parameters
+    ----------
+    models : list[dict]
+        Configuration for each model including name, client instance,
+        default temperature, and repeat count.
+        default temperature, repeat count and max tokens.
+    prompt_filter : str | None
+        If provided, only the prompt with this name will be executed.
+    model_filter : str | None
+        If provided, only the model with this name will be executed.
+    temperature_override : float | None
+        Override the model's default temperature.
+    max_tokens_override : int | None
+        Override the model's default max token value.
+    repeat_override : int | None
+        Override how many times each test should be repeated.
+    scheduler : RateLimitScheduler | None
+        Enforces per-provider rate limits and retries throttled calls.
+    cache : ResponseCache | None
+        Returns stored responses instead of calling the API.
+    ledger : JobLedger | None
+        Records the state of every job so an interrupted sweep can be resumed.
+    resume : bool
+        Only run jobs that the ledger does not record as done.
+    render_queue : RenderQueue | None
+        Renders diagrams in the background instead of inline.
+    stream : bool
+        Stream responses to record time-to-first-token and throughput.
+    results_store : ResultsStore | None
+        Appends every run to the results database.
+    convergence : ConvergenceTracker | None
+        Stops repeating a cell once its outputs have converged. On `resume`
+        its cells continue from the runs that are already done.
+    costs : CostTracker | None
+        Counts tokens and cost and stops dispatching once a budget is reached.
+    """
+
+    jobs = build_jobs(
+        models,
+        prompt_filter=prompt_filter,
+        model_filter=model_filter,
+        temperature_override=temperature_override,
+        max_tokens_override=max_tokens_override,
+        repeat_override=repeat_override,
+    )
+
+    if costs:
+        costs.start(jobs, ledger if resume else None)
+    sweep = jobs
+    if ledger:
+        jobs = ledger.start(jobs, resume=resume)
+    if convergence:
+        jobs = convergence.start(jobs, sweep, ledger, results_store)
+
+    for job in jobs:
+        if convergence and convergence.is_stopped(job):
+            convergence.skip(job, ledger)
+            continue
+        # Jobs held back by a budget stay pending in the ledger
+        if costs and not costs.admit(job):
+            continue
+
+        print(f"\n🔁 {job['prompt_name']} | {job['model_name']} | temp={job['temperature']} | run={job['repeat_index']}")
+
+        with span("job", prompt=job["prompt_name"], model=job["model_name"], temperature=job["temperature"], run=job["repeat_index"]):
+            if ledger:
+                ledger.mark(job, "in_flight")
+
+            # Send the prompt to the LLM client
+            result = send_job(job, scheduler, cache, stream, render_queue)
+            if costs:
+                result["cost"] = costs.record(job, result)
+            if convergence:
+                result["stop_reason"] = convergence.observe(job, result)
+
+            complete_job(job, result, ledger, render_queue, results_store)
@@ -0,0 +1,166 @@
+import asyncio
+import random
+import threading
+import time
+from core.tracing import span
+
+# HTTP status codes that mean "try again later" rather than "this request is invalid"
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504, 529}
+
+# Rough characters-per-token ratio used to estimate prompt size before dispatch
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(prompt: str, max_tokens: int) -> int:
+    """Estimate the tokens a request counts against a TPM limit.
+
+    Providers reserve `max_tokens` for the completion up front, so the
+    estimate is the approximate prompt size plus the completion budget.
+    """
+    return len(prompt) // CHARS_PER_TOKEN + 1 + max_tokens
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at a per-minute rate.
+
+    `reserve` always succeeds and returns how long the caller has to wait
+    before the reserved amount is actually available. Letting the balance
+    go negative keeps callers in first-come-first-served order.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        # A single request larger than the whole bucket would never fit
+        amount = min(amount, self.capacity)
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class ProviderLimiter:
+    """Requests-per-minute and tokens-per-minute limits of one provider."""
+
+    def __init__(self, rpm: float | None = None, tpm: float | None = None):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+
+    def reserve(self, estimated_tokens: int) -> float:
+        """Reserve one request and its tokens, returning the delay in seconds."""
+        delay = 0.0
+        if self.requests:
+            delay = max(delay, self.requests.reserve(1))
+        if self.tokens:
+            delay = max(delay, self.tokens.reserve(estimated_tokens))
+        return delay
+
+
+class RateLimitScheduler:
+    """Dispatch prompts within per-provider limits and retry throttled calls.
+
+    Sits between the runners and `LLMClient.send_prompt`. Every attempt
+    first reserves capacity in the provider's buckets and waits if needed.
+    Responses with a retryable status code are retried with exponential
+    backoff and full jitter.
+    """
+
+    def __init__(self, limits: dict | None = None, max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.limiters = {
+            provider: ProviderLimiter(rpm=values.get("rpm"), tpm=values.get("tpm"))
+            for provider, values in (limits or {}).items()
+        }
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_config(cls, config: dict) -> "RateLimitScheduler":
+        """Create a scheduler from the `rate_limits` and `retry` config sections."""
+        retry = config.get("retry") or {}
+        return cls(
+            limits=config.get("rate_limits"),
+            max_retries=retry.get("max_retries", 5),
+            base_delay=retry.get("base_delay", 1.0),
+            max_delay=retry.get("max_delay", 60.0),
+        )
+
+    def _reserve(self, client, prompt: str, parameters: dict) -> float:
+        limiter = self.limiters.get(getattr(client, "provider", "default"))
+        if not limiter:
+            return 0.0
+        return limiter.reserve(estimate_tokens(prompt, parameters.get("max_tokens", 1000)))
+
+    def _should_retry(self, result: dict, attempt: int) -> bool:
+        return (
+            result.get("status") == "error"
+            and result.get("status_code") in RETRYABLE_STATUS_CODES
+            and attempt < self.max_retries
+        )
+
+    def _backoff(self, client, result: dict, attempt: int) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        provider = getattr(client, "provider", "default")
+        print(f"[⏳] {provider} returned {result.get('status_code')}, retrying in {delay:.1f}s (retry {attempt + 1}/{self.max_retries})")
+        return delay
+
+    def send(self, client, prompt: str, parameters: dict, stream: bool = False, on_text=None, on_retry=None) -> dict:
+        """Send a prompt, blocking while the provider is at its limit.
+
+        `on_retry` is called before every retry, e.g. to discard the text a
+        failed stream already passed to `on_text`.
+        """
+        attempt = 0
+        while True:
+            delay = self._reserve(client, prompt, parameters)
+            if delay > 0:
+                with span("rate_limit_wait", provider=getattr(client, "provider", "default")):
+                    time.sleep(delay)
+
+            if stream:
+                result = client.stream_prompt(prompt, parameters, on_text)
+            else:
+                result = client.send_prompt(prompt, parameters)
+            if not self._should_retry(result, attempt):
+                result["attempts"] = attempt + 1
+                return result
+
+            with span("retry_backoff", provider=getattr(client, "provider", "default"), status_code=result.get("status_code")):
+                time.sleep(self._backoff(client, result, attempt))
+            if on_retry:
+                on_retry()
+            attempt += 1
+
+    async def send_async(self, client, prompt: str, parameters: dict, stream: bool = False, on_text=None, on_retry=None) -> dict:
+        """Send a prompt from the event loop, yielding while the provider is at its limit."""
+        attempt = 0
+        while True:
+            delay = self._reserve(client, prompt, parameters)
+            if delay > 0:
+                with span("rate_limit_wait", provider=getattr(client, "provider", "default")):
+                    await asyncio.sleep(delay)
+
+            if stream:
+                result = await client.stream_prompt_async(prompt, parameters, on_text)
+            else:
+                result = await client.send_prompt_async(prompt, parameters)
+            if not self._should_retry(result, attempt):
+                result["attempts"] = attempt + 1
+                return result
+
+            with span("retry_backoff", provider=getattr(client, "provider", "default"), status_code=result.get("status_code")):
+                await asyncio.sleep(self._backoff(client, result, attempt))
+            if on_retry:
+                on_retry()
+            attempt += 1
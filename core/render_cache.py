@@ -0,0 +1,138 @@
+import hashlib
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+DEFAULT_RENDER_CACHE_DIR = Path("test_runs/.cache/diagrams")
+DEFAULT_MAX_ENTRIES = 10000
+
+BLOCK_COMMENT = re.compile(r"/'.*?'/", re.DOTALL)
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_plantuml(plantuml_code: str) -> str:
+    """Reduce PlantUML source to the parts that affect the rendered image.
+
+    Removes comments, the @startuml/@enduml wrapper, blank lines and
+    differences in whitespace.
+    """
+    code = BLOCK_COMMENT.sub("", plantuml_code)
+    lines = []
+    for line in code.splitlines():
+        line = WHITESPACE.sub(" ", line).strip()
+        if not line or line.startswith("'"):
+            continue
+        if line.startswith("@startuml") or line.startswith("@enduml"):
+            continue
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def get_render_hash(plantuml_code: str) -> str:
+    return hashlib.sha256(normalize_plantuml(plantuml_code).encode("utf-8")).hexdigest()
+
+
+def link_or_copy(source: Path, target: Path):
+    """Hardlink `source` to `target`, copying when links are not supported."""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.unlink(missing_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def write_image(path: Path, image: bytes):
+    """Write an image through a temporary file, so a hardlink at `path` is replaced, not overwritten."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+    tmp_path.write_bytes(image)
+    os.replace(tmp_path, path)
+
+
+class RenderCache:
+    """Directory of rendered diagrams keyed on the normalized source hash.
+
+    Entries are evicted least recently used first once `max_entries` is
+    exceeded. Output images are hardlinked to the cached file, so evicting
+    an entry never removes an image from a run folder.
+    """
+
+    def __init__(self, directory: Path = DEFAULT_RENDER_CACHE_DIR, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        # Rebuild the LRU order from the modification times of cached files
+        cached = sorted(self.directory.glob("*.png"), key=lambda p: p.stat().st_mtime)
+        self.entries = OrderedDict((p.stem, p) for p in cached)
+
+    @classmethod
+    def from_config(cls, config: dict) -> "RenderCache | None":
+        """Create the cache from `rendering.cache`, or None when disabled."""
+        cache_config = (config.get("rendering") or {}).get("cache") or {}
+        if not cache_config.get("enabled", True):
+            return None
+        return cls(
+            directory=Path(cache_config.get("path", DEFAULT_RENDER_CACHE_DIR)),
+            max_entries=cache_config.get("max_entries", DEFAULT_MAX_ENTRIES),
+        )
+
+    def lookup(self, render_hash: str, output_image_path: Path) -> bool:
+        """Place the cached image at `output_image_path` if there is one.
+
+        Hits are counted by the caller with `record_hit`, which knows
+        whether the entry was rendered for this very request.
+        """
+        with self.lock:
+            cached_path = self.entries.get(render_hash)
+            if cached_path is None:
+                return False
+
+            # Link under the lock so a concurrent eviction cannot remove the file first
+            link_or_copy(cached_path, output_image_path)
+            os.utime(cached_path)
+            self.entries.move_to_end(render_hash)
+        return True
+
+    def contains(self, render_hash: str) -> bool:
+        with self.lock:
+            return render_hash in self.entries
+
+    def record_hit(self):
+        """Count a diagram that was linked from an earlier render."""
+        with self.lock:
+            self.hits += 1
+
+    def record_miss(self):
+        """Count a diagram that had to be rendered because it was not cached."""
+        with self.lock:
+            self.misses += 1
+
+    def store(self, render_hash: str, image: bytes) -> Path:
+        """Add a rendered image to the cache and return its cached path."""
+        cached_path = self.directory / f"{render_hash}.png"
+        write_image(cached_path, image)
+
+        with self.lock:
+            self.entries[render_hash] = cached_path
+            self.entries.move_to_end(render_hash)
+            while len(self.entries) > self.max_entries:
+                _, evicted = self.entries.popitem(last=False)
+                evicted.unlink(missing_ok=True)
+        return cached_path
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self.entries),
+        }
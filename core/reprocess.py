@@ -0,0 +1,197 @@
+import hashlib
+import inspect
+import json
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from core import evaluation, uml_parser
+from core.file_manager import format_plantuml, save_json, save_plantuml
+from core import plantUML_renderer
+from core.plantUML_renderer import extract_plantuml_code
+
+RESPONSE_SUFFIX = "_RESPONSE.txt"
+MANIFEST_NAME = ".reprocess_manifest.json"
+
+DEFAULT_CHUNK_SIZE = 500
+
+# Worker processes load the references once instead of receiving them with every chunk
+_references = {}
+
+
+def get_pipeline_fingerprint(prompt_dir: Path) -> str:
+    """Hash the extraction and scoring code plus the reference diagrams.
+
+    Changing any of them invalidates every entry of the manifest, so the
+    next reprocess run picks up the new extraction or metrics.
+    """
+    digest = hashlib.sha256()
+    for function in (plantUML_renderer._iter_diagram_markers, plantUML_renderer.iter_plantuml_blocks, extract_plantuml_code):
+        digest.update(inspect.getsource(function).encode("utf-8"))
+    for module in (uml_parser, evaluation):
+        digest.update(inspect.getsource(module).encode("utf-8"))
+    for path in sorted(prompt_dir.glob(f"*{evaluation.REFERENCE_SUFFIX}")):
+        digest.update(path.name.encode("utf-8"))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def load_manifest(path: Path, fingerprint: str) -> dict[str, str]:
+    """Return the content hashes recorded for the current pipeline fingerprint."""
+    if not path.exists():
+        return {}
+    manifest = json.loads(path.read_text(encoding="utf-8"))
+    if manifest.get("fingerprint") != fingerprint:
+        print("[♻️] Extraction or scoring changed since the last run, reprocessing everything")
+        return {}
+    return manifest["entries"]
+
+
+def save_manifest(path: Path, fingerprint: str, entries: dict[str, str]):
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps({"fingerprint": fingerprint, "entries": entries}), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def iter_responses(base_dir: Path):
+    """Yield every stored response file below `base_dir` without listing them all first."""
+    for root, dirs, files in os.walk(base_dir):
+        # Skip the response and render caches
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(files):
+            if name.endswith(RESPONSE_SUFFIX):
+                yield os.path.join(root, name)
+
+
+def iter_chunks(items, size: int):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _init_worker(prompt_dir: str):
+    global _references
+    _references = evaluation.load_references(Path(prompt_dir))
+
+
+def reprocess_chunk(chunk: list[tuple[str, str | None]]) -> list[dict]:
+    """Re-extract and re-score a chunk of responses in a worker process.
+
+    Each item is a response path and the content hash it had when it was
+    last processed. Unchanged responses are skipped.
+    """
+    outcomes = []
+    runs = []
+    for response_path, previous_hash in chunk:
+        path = Path(response_path)
+        data = path.read_bytes()
+        content_hash = hashlib.sha256(data).hexdigest()
+        outcome = {"path": response_path, "hash": content_hash, "skipped": content_hash == previous_hash, "changed": False, "plantuml": None}
+        outcomes.append(outcome)
+        if outcome["skipped"]:
+            continue
+
+        text = data.decode("utf-8")
+        if text.startswith("ERROR:"):
+            continue
+
+        prefix = path.name[:-len(RESPONSE_SUFFIX)]
+        puml_path = path.with_name(f"{prefix}_PUML.puml")
+        uml_code = extract_plantuml_code(text)
+        previous_content = puml_path.read_text(encoding="utf-8") if puml_path.exists() else None
+        if (format_plantuml(uml_code) if uml_code else None) != previous_content:
+            outcome["changed"] = True
+            if uml_code:
+                save_plantuml(puml_path, uml_code)
+                outcome["plantuml"] = uml_code
+            else:
+                puml_path.unlink(missing_ok=True)
+                path.with_name(f"{prefix}_DIAGRAM.png").unlink(missing_ok=True)
+
+        prompt_name, model, temp_folder = path.parts[-5:-2]
+        runs.append({
+            "prompt_name": prompt_name,
+            "model": model,
+            "temperature": temp_folder[len("temp_"):].replace("_", "."),
+            "run": str(path.parent),
+            "plantuml": uml_code,
+            "evaluation_path": path.with_name(f"{prefix}_EVALUATION.json"),
+        })
+
+    # Score the whole chunk at once, grouped by prompt inside `evaluate`
+    evaluation_paths = {run["run"]: run.pop("evaluation_path") for run in runs}
+    scores = {}
+    for row in evaluation.evaluate(runs, _references):
+        save_json(evaluation_paths[row["run"]], row)
+        scores[row["run"]] = row
+
+    for outcome in outcomes:
+        row = scores.get(str(Path(outcome["path"]).parent))
+        if row:
+            outcome["score"] = {key: row[key] for key in ("prompt_name", "model", "temperature", "f1")}
+    return outcomes
+
+
+def reprocess_archive(base_dir: Path, prompt_dir: Path = Path("prompts"), workers: int | None = None, chunk_size: int = DEFAULT_CHUNK_SIZE, force: bool = False, render_queue=None) -> dict:
+    """Re-extract PlantUML code and re-score every stored response.
+
+    Response files are streamed from disk and handed to a process pool in
+    chunks. At most two chunks per worker are in flight, so memory stays
+    bounded no matter how large the archive is. Responses whose content
+    hash is unchanged since the last run are skipped, unless the
+    extraction or scoring code changed or `force` is set. Scores are
+    written to `_EVALUATION.json` next to each response; diagrams whose
+    code changed are re-rendered if a render queue is given.
+    """
+    workers = workers or os.cpu_count() or 1
+    manifest_path = base_dir / MANIFEST_NAME
+    fingerprint = get_pipeline_fingerprint(prompt_dir)
+    entries = {} if force else load_manifest(manifest_path, fingerprint)
+
+    stats = {"responses": 0, "skipped": 0, "changed": 0}
+    # Running F1 sum and count per cell
+    cell_scores = defaultdict(lambda: [0.0, 0])
+
+    def collect(outcomes: list[dict]):
+        for outcome in outcomes:
+            stats["responses"] += 1
+            stats["skipped"] += outcome["skipped"]
+            stats["changed"] += outcome["changed"]
+            entries[outcome["path"]] = outcome["hash"]
+            if outcome["plantuml"] and render_queue:
+                path = Path(outcome["path"])
+                prefix = path.name[:-len(RESPONSE_SUFFIX)]
+                render_queue.submit(outcome["plantuml"], path.with_name(f"{prefix}_DIAGRAM.png"))
+            if "score" in outcome:
+                score = outcome["score"]
+                cell = cell_scores[(score["prompt_name"], score["model"], score["temperature"])]
+                cell[0] += score["f1"]
+                cell[1] += 1
+
+    chunks = iter_chunks(((path, entries.get(path)) for path in iter_responses(base_dir)), chunk_size)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(str(prompt_dir),)) as pool:
+            in_flight = set()
+            for chunk in chunks:
+                if len(in_flight) >= 2 * workers:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(future.result())
+                in_flight.add(pool.submit(reprocess_chunk, chunk))
+
+            for future in in_flight:
+                collect(future.result())
+    finally:
+        # Keep the progress of an interrupted run, only finished chunks are recorded
+        save_manifest(manifest_path, fingerprint, entries)
+
+    for (prompt_name, model, temperature), (f1_sum, count) in sorted(cell_scores.items()):
+        print(f"[📐] {prompt_name} | {model} | temp={temperature}: F1={f1_sum / count:.2f} ({count} rescored)")
+    print(f"✅ Reprocessed {stats['responses'] - stats['skipped']} of {stats['responses']} responses "
+          f"({stats['skipped']} unchanged, {stats['changed']} diagrams changed)")
+    return stats
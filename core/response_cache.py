@@ -0,0 +1,146 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+# Cache modes selectable from the CLI
+#   read    - return stored responses, call the API and store on a miss
+#   refresh - always call the API and overwrite the stored response
+#   bypass  - do not touch the cache at all
+CACHE_MODES = ("read", "refresh", "bypass")
+
+DEFAULT_CACHE_PATH = Path("test_runs/.cache/responses.sqlite3")
+DEFAULT_MAX_SIZE_MB = 512
+
+
+def get_cache_key(job: dict) -> str:
+    """Return the content address of a job's response."""
+    key_fields = [
+        job["prompt_hash"],
+        job["model_name"],
+        job["temperature"],
+        job["max_tokens"],
+        job["repeat_index"],
+    ]
+    return hashlib.sha256(json.dumps(key_fields).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed response store with a size cap and LRU eviction.
+
+    Only successful responses are stored. Each row keeps the response text
+    together with the metadata extracted from the raw API response, so a
+    cache hit can be written to disk exactly like a fresh response.
+    """
+
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH, max_size_mb: float = DEFAULT_MAX_SIZE_MB, mode: str = "read"):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode: {mode}")
+
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                prompt_hash TEXT,
+                model TEXT,
+                temperature REAL,
+                max_tokens INTEGER,
+                repeat_index INTEGER,
+                payload TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)")
+        self.conn.commit()
+        self.total_size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @classmethod
+    def from_config(cls, config: dict, mode: str | None = None) -> "ResponseCache | None":
+        """Create the cache from the `cache` config section, or None when bypassed."""
+        cache_config = config.get("cache") or {}
+        mode = mode or cache_config.get("mode", "bypass")
+        if mode == "bypass":
+            return None
+        return cls(
+            path=Path(cache_config.get("path", DEFAULT_CACHE_PATH)),
+            max_size_mb=cache_config.get("max_size_mb", DEFAULT_MAX_SIZE_MB),
+            mode=mode,
+        )
+
+    def get(self, job: dict) -> dict | None:
+        """Return the stored result for a job, or None on a miss or in refresh mode."""
+        if self.mode != "read":
+            return None
+
+        key = get_cache_key(job)
+        with self.lock:
+            row = self.conn.execute("SELECT payload FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            self.hits += 1
+
+        result = json.loads(row[0])
+        result["cached"] = True
+        return result
+
+    def put(self, job: dict, result: dict):
+        """Store a successful result and evict least recently used entries if needed."""
+        if result.get("status") == "error":
+            return
+
+        payload = json.dumps({
+            "text": result["text"],
+            "latency": result.get("latency"),
+            "status": result.get("status"),
+            "id": result.get("id"),
+            "response_metadata": result.get("response_metadata"),
+        }, ensure_ascii=False)
+        size = len(payload.encode("utf-8"))
+        now = time.time()
+        key = get_cache_key(job)
+
+        with self.lock:
+            previous = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, job["prompt_hash"], job["model_name"], job["temperature"], job["max_tokens"],
+                 job["repeat_index"], payload, size, now, now),
+            )
+            self.total_size += size - (previous[0] if previous else 0)
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """Delete least recently used entries until the cache fits its size cap."""
+        while self.total_size > self.max_size:
+            rows = self.conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access LIMIT 100"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self.total_size <= self.max_size:
+                    break
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.total_size -= size
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,232 @@
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from core.file_manager import build_run_directory, save_text, save_json, save_plantuml
+from core.tracing import span
+
+# Where finished runs are written
+#   files  - one folder per run under test_runs/ (default)
+#   sqlite - rows in a single SQLite database, no per-run folders
+#   both   - folders and database rows
+RESULTS_BACKENDS = ("files", "sqlite", "both")
+
+DEFAULT_RESULTS_PATH = Path("test_runs/results.sqlite3")
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_FLUSH_INTERVAL = 5.0
+
+
+class ResultsStore:
+    """Append-only SQLite store holding the response, diagram and metadata of every run.
+
+    Rows are buffered and committed in batches in WAL mode. Callbacks
+    passed to `append` run once the row is committed, so a job is only
+    marked done in the ledger after its result is durable.
+    """
+
+    def __init__(self, path: Path = DEFAULT_RESULTS_PATH, write_files: bool = False, batch_size: int = DEFAULT_BATCH_SIZE, flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.write_files = write_files
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = []
+        self.callbacks = []
+        self.known_prompts = set()
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS prompts (
+                prompt_hash TEXT PRIMARY KEY,
+                prompt_name TEXT NOT NULL,
+                text TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                prompt_name TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                temperature REAL,
+                max_tokens INTEGER,
+                repeat_index INTEGER,
+                status TEXT,
+                run_dir TEXT,
+                created REAL NOT NULL,
+                metadata TEXT NOT NULL,
+                response TEXT NOT NULL,
+                plantuml TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_runs_cell ON runs (prompt_name, model, temperature);
+        """)
+        self.conn.commit()
+
+    @classmethod
+    def from_config(cls, config: dict, backend: str | None = None) -> "ResultsStore | None":
+        """Create the store from the `results` config section, or None for plain files."""
+        results_config = config.get("results") or {}
+        backend = backend or results_config.get("backend", "files")
+        if backend not in RESULTS_BACKENDS:
+            raise ValueError(f"Unknown results backend: {backend}")
+        if backend == "files":
+            return None
+        return cls(
+            path=Path(results_config.get("path", DEFAULT_RESULTS_PATH)),
+            write_files=backend == "both",
+            batch_size=results_config.get("batch_size", DEFAULT_BATCH_SIZE),
+            flush_interval=results_config.get("flush_interval", DEFAULT_FLUSH_INTERVAL),
+        )
+
+    def append(self, job: dict, metadata: dict, response_text: str, plantuml_code: str | None, run_dir: Path | None = None, on_commit=None):
+        """Buffer one run and commit the batch when it is full or old enough."""
+        row = (
+            job["prompt_name"],
+            job["prompt_hash"],
+            job["model_name"],
+            job["temperature"],
+            job["max_tokens"],
+            job["repeat_index"],
+            metadata.get("status"),
+            str(run_dir) if run_dir else None,
+            time.time(),
+            json.dumps(metadata, ensure_ascii=False),
+            response_text,
+            plantuml_code or None,
+        )
+        with self.lock:
+            if job["prompt_hash"] not in self.known_prompts:
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO prompts VALUES (?, ?, ?)",
+                    (job["prompt_hash"], job["prompt_name"], job["prompt_text"]),
+                )
+                self.known_prompts.add(job["prompt_hash"])
+            self.pending.append(row)
+            if on_commit:
+                self.callbacks.append(on_commit)
+
+            if len(self.pending) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+                self._flush()
+
+    def _flush(self):
+        with span("store_commit", rows=len(self.pending)):
+            if self.pending:
+                self.conn.executemany(
+                    "INSERT INTO runs (prompt_name, prompt_hash, model, temperature, max_tokens, repeat_index, "
+                    "status, run_dir, created, metadata, response, plantuml) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    self.pending,
+                )
+            self.conn.commit()
+        self.pending = []
+        self.last_flush = time.monotonic()
+
+        callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            self.conn.close()
+
+    def iter_runs(self, prompt_name: str | None = None, model: str | None = None, temperature: float | None = None, include_text: bool = True):
+        """Yield stored runs, optionally filtered by prompt, model and temperature."""
+        columns = "id, prompt_name, prompt_hash, model, temperature, max_tokens, repeat_index, status, run_dir, created, metadata"
+        if include_text:
+            columns += ", response, plantuml"
+
+        conditions, values = [], []
+        for column, value in (("prompt_name", prompt_name), ("model", model), ("temperature", temperature)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                values.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        cursor = self.conn.execute(f"SELECT {columns} FROM runs {where} ORDER BY id", values)
+        names = [description[0] for description in cursor.description]
+        for row in cursor:
+            run = dict(zip(names, row))
+            run["metadata"] = json.loads(run["metadata"])
+            yield run
+
+    def load_runs(self, prompt_name: str | None = None, model: str | None = None, temperature: float | None = None, include_text: bool = True) -> list[dict]:
+        """Load all matching runs in a single query."""
+        with self.lock:
+            return list(self.iter_runs(prompt_name, model, temperature, include_text))
+
+    def get_response(self, job: dict) -> str | None:
+        """Return the response of the latest stored run of a job, if there is one."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT response FROM runs WHERE prompt_name = ? AND prompt_hash = ? AND model = ? AND temperature = ? "
+                "AND max_tokens = ? AND repeat_index = ? ORDER BY id DESC LIMIT 1",
+                (job["prompt_name"], job["prompt_hash"], job["model_name"], job["temperature"], job["max_tokens"], job["repeat_index"]),
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_prompt_text(self, prompt_hash: str) -> str | None:
+        row = self.conn.execute("SELECT text FROM prompts WHERE prompt_hash = ?", (prompt_hash,)).fetchone()
+        return row[0] if row else None
+
+    def export_to_directory(self, base_dir: Path, prompt_name: str | None = None, model: str | None = None, render_queue=None) -> int:
+        """Rebuild the `test_runs/<prompt>/<model>/<temp>/run_*` layout from the store.
+
+        Diagrams are rendered again only if a render queue is given; with a
+        render cache most of them are hardlinked from earlier renders.
+        """
+        self.flush()
+        exported = 0
+        for run in self.load_runs(prompt_name=prompt_name, model=model):
+            name, prompt_hash = run["prompt_name"], run["prompt_hash"]
+
+            prompt_txt_path = base_dir / name / f"{name}_{prompt_hash}.txt"
+            if not prompt_txt_path.exists():
+                prompt_text = self.get_prompt_text(prompt_hash)
+                if prompt_text is not None:
+                    prompt_txt_path.parent.mkdir(parents=True, exist_ok=True)
+                    save_text(prompt_txt_path, prompt_text)
+
+            run_dir = build_run_directory(base_dir, name, run["model"], run["temperature"])
+            save_text(run_dir / f"{name}_{prompt_hash}_RESPONSE.txt", run["response"])
+            if run["plantuml"]:
+                save_plantuml(run_dir / f"{name}_{prompt_hash}_PUML.puml", run["plantuml"])
+                if render_queue:
+                    render_queue.submit(run["plantuml"], run_dir / f"{name}_{prompt_hash}_DIAGRAM.png")
+            save_json(run_dir / f"{name}_{prompt_hash}_METADATA.json", run["metadata"])
+            exported += 1
+        return exported
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export runs from the results database into the test_runs/ layout.")
+    parser.add_argument("--db", type=Path, default=DEFAULT_RESULTS_PATH, help="Path to the results database")
+    parser.add_argument("--out", type=Path, default=Path("test_runs"), help="Directory to rebuild the run folders in")
+    parser.add_argument("--prompt_name", type=str, help="Only export runs of this prompt")
+    parser.add_argument("--model", type=str, help="Only export runs of this model")
+    parser.add_argument("--render", action="store_true", help="Render the diagrams of exported runs")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    store = ResultsStore(args.db)
+
+    render_queue = None
+    if args.render:
+        from core.plantUML_renderer import RenderQueue, HTTPRenderer
+        from core.render_cache import RenderCache
+        render_queue = RenderQueue(HTTPRenderer(), cache=RenderCache())
+
+    count = store.export_to_directory(args.out, prompt_name=args.prompt_name, model=args.model, render_queue=render_queue)
+    if render_queue:
+        render_queue.close()
+    store.close()
+    print(f"✅ Exported {count} runs to {args.out}")
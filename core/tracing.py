@@ -0,0 +1,165 @@
+import contextvars
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+DEFAULT_TRACE_PATH = Path("test_runs/trace.jsonl")
+
+# Spans written per flush of the trace file
+FLUSH_EVERY = 500
+
+# Tracer of the current run, None while tracing is disabled
+_tracer = None
+
+# Innermost open span of the current thread or asyncio task
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class _NullSpan:
+    """Stand-in returned while tracing is disabled, so a span costs one function call."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """One timed stage of the pipeline, nested under the span that was open when it started."""
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: dict):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.span_id = f"{random.getrandbits(64):016x}"
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        self.trace_id = self.parent.trace_id if self.parent else f"{random.getrandbits(128):032x}"
+        self.token = _current_span.set(self)
+        self.start_ns = time.time_ns()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        duration = time.perf_counter() - self.start
+        _current_span.reset(self.token)
+        if exc_type is not None:
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        self.tracer.record(self, duration, error=exc_type is not None)
+        return False
+
+    def set(self, **attributes):
+        """Add attributes that are only known once the stage has run."""
+        self.attributes.update(attributes)
+
+
+def span(name: str, **attributes):
+    """Time a stage of the pipeline: `with span("api_call", model=...) as s:`."""
+    if _tracer is None:
+        return _NULL_SPAN
+    return Span(_tracer, name, attributes)
+
+
+def enable_tracing(tracer: "Tracer | None"):
+    """Record the spans of this process with `tracer`, or stop tracing with None."""
+    global _tracer
+    _tracer = tracer
+
+
+class Tracer:
+    """Write spans to a JSON-lines trace file and keep per-stage timings.
+
+    Each line follows the field names of the OpenTelemetry span model
+    (trace_id, span_id, parent_span_id, start/end time in Unix nanoseconds,
+    attributes, status), so the file can be converted for any OTLP
+    backend. Spans are buffered and written in batches by whichever thread
+    ends them.
+    """
+
+    def __init__(self, path: Path = DEFAULT_TRACE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, "w", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.buffer = []
+        self.durations = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.started = time.perf_counter()
+
+    @classmethod
+    def from_config(cls, config: dict, path: Path | None = None) -> "Tracer | None":
+        """Create a tracer from the `tracing` config section, or None when disabled."""
+        tracing_config = config.get("tracing") or {}
+        if path is None and not tracing_config.get("enabled", False):
+            return None
+        return cls(path or tracing_config.get("path", DEFAULT_TRACE_PATH))
+
+    def record(self, span: Span, duration: float, error: bool = False):
+        line = json.dumps({
+            "name": span.name,
+            "trace_id": span.trace_id,
+            "span_id": span.span_id,
+            "parent_span_id": span.parent.span_id if span.parent else None,
+            "start_time_unix_nano": span.start_ns,
+            "end_time_unix_nano": span.start_ns + int(duration * 1e9),
+            "attributes": span.attributes,
+            "status": "error" if error else "ok",
+            "thread": threading.current_thread().name,
+        }, ensure_ascii=False, default=str)
+
+        with self.lock:
+            self.durations[span.name].append(duration)
+            self.errors[span.name] += error
+            self.buffer.append(line)
+            if len(self.buffer) >= FLUSH_EVERY:
+                self._flush()
+
+    def _flush(self):
+        if self.buffer:
+            self.file.write("\n".join(self.buffer) + "\n")
+            self.buffer = []
+
+    def summary(self) -> dict[str, dict]:
+        """Return count, latency percentiles and throughput of every stage."""
+        elapsed = time.perf_counter() - self.started
+        stages = {}
+        with self.lock:
+            for name, durations in self.durations.items():
+                ordered = sorted(durations)
+                stages[name] = {
+                    "count": len(ordered),
+                    "errors": self.errors[name],
+                    "total": sum(ordered),
+                    "mean_ms": sum(ordered) / len(ordered) * 1000,
+                    "p50_ms": ordered[len(ordered) // 2] * 1000,
+                    "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+                    "max_ms": ordered[-1] * 1000,
+                    "per_second": len(ordered) / elapsed if elapsed > 0 else 0.0,
+                }
+        return stages
+
+    def print_summary(self):
+        stages = self.summary()
+        if not stages:
+            return
+        print(f"[⏱️] Stage timings ({self.path}):")
+        print(f"  {'stage':<18} {'count':>7} {'errors':>6} {'total s':>9} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'per s':>8}")
+        for name, stats in sorted(stages.items(), key=lambda item: -item[1]["total"]):
+            print(f"  {name:<18} {stats['count']:>7} {stats['errors']:>6} {stats['total']:>9.2f} {stats['mean_ms']:>9.1f} "
+                  f"{stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['max_ms']:>9.1f} {stats['per_second']:>8.2f}")
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            self.file.close()
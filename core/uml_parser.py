@@ -0,0 +1,136 @@
+import re
+
+# class, abstract class, interface, enum ... optionally with alias, generics and stereotype
+CLASS_DECLARATION = re.compile(
+    r'^(?:abstract\s+class|abstract|class|interface|enum|entity|annotation)\s+'
+    r'(?:"(?P<display>[^"]+)"\s+as\s+(?P<alias>[\w.]+)|(?P<name>[\w.]+)(?:\s+as\s+(?P<alias2>[\w.]+))?)'
+    r'(?:\s*<[^>{]*>)?(?:\s*<<[^>]*>>)?[^{]*(?P<body>\{)?\s*$'
+)
+
+# A "1" -- "*" B : label, with every PlantUML arrow head and line style
+RELATIONSHIP = re.compile(
+    r'^(?P<left>[\w.]+|"[^"]+")\s*(?:"(?P<left_mult>[^"]*)")?\s*'
+    r'(?P<arrow>[<*o#x}+^|]*[-.]+(?:\[[^\]]*\]|left|right|up|down|le|ri|do|l|r|u|d)?[-.]*[>*o#x{+^|]*)\s*'
+    r'(?:"(?P<right_mult>[^"]*)")?\s*(?P<right>[\w.]+|"[^"]+")\s*(?::\s*(?P<label>.*))?$'
+)
+
+# Person : name : String
+MEMBER_DECLARATION = re.compile(r'^(?P<owner>[\w.]+)\s*:\s*(?P<member>.+)$')
+
+MODIFIERS = re.compile(r'\{(?:static|abstract|classifier|field|method)\}')
+SKIPPED_PREFIXES = ("@", "skinparam", "hide", "show", "title", "left to right", "top to bottom", "!", "legend", "header", "footer", "caption")
+
+
+def _unquote(name: str) -> str:
+    return name.strip().strip('"')
+
+
+def parse_member(line: str) -> tuple[str, str] | None:
+    """Split a class member into its kind ("attribute" or "method") and name."""
+    line = MODIFIERS.sub("", line).strip().lstrip("+-#~").strip()
+    if not line or line.startswith(("--", "..", "==", "__")):
+        return None
+
+    if "(" in line:
+        name = line.split("(", 1)[0].split()
+        return ("method", name[-1]) if name else None
+
+    # Either "name : Type" or "Type name"
+    if ":" in line:
+        name = line.split(":", 1)[0].split()
+    else:
+        name = line.split("=", 1)[0].split()
+    return ("attribute", name[-1].rstrip(";,")) if name else None
+
+
+def parse_class_diagram(plantuml_code: str) -> dict:
+    """Parse a PlantUML class diagram into classes, members and relationships.
+
+    Returns a dict with
+      classes        - class names, including classes only used in relationships
+      attributes     - (class, attribute) pairs
+      methods        - (class, method) pairs
+      associations   - (left, right, left multiplicity, right multiplicity, label)
+      inheritance    - (child, parent) pairs, including interface realization
+    """
+    classes = {}
+    attributes = []
+    methods = []
+    associations = []
+    inheritance = []
+
+    current_class = None
+    in_note = False
+
+    for raw_line in plantuml_code.splitlines():
+        line = raw_line.strip()
+        if not line or line.startswith("'"):
+            continue
+
+        if in_note:
+            in_note = not line.startswith(("end note", "endnote"))
+            continue
+        if line.startswith("note"):
+            # Multi-line notes have neither a colon after the target nor quoted text
+            in_note = ":" not in line and '"' not in line
+            continue
+        if line.startswith(SKIPPED_PREFIXES):
+            continue
+
+        if current_class is not None:
+            if line.startswith("}"):
+                current_class = None
+                continue
+            member = parse_member(line)
+            if member:
+                kind, name = member
+                (methods if kind == "method" else attributes).append((current_class, name))
+            continue
+
+        match = CLASS_DECLARATION.match(line)
+        if match:
+            name = match.group("alias") or match.group("alias2") or match.group("name")
+            classes.setdefault(name, match.group("display") or name)
+            if match.group("body") and not line.rstrip().endswith("}"):
+                current_class = name
+            continue
+
+        match = RELATIONSHIP.match(line)
+        if match:
+            left, right = _unquote(match.group("left")), _unquote(match.group("right"))
+            arrow = match.group("arrow")
+            classes.setdefault(left, left)
+            classes.setdefault(right, right)
+            if arrow.startswith("<|") or arrow.startswith("^"):
+                inheritance.append((right, left))
+            elif arrow.endswith("|>") or arrow.endswith("^"):
+                inheritance.append((left, right))
+            else:
+                associations.append((
+                    left,
+                    right,
+                    (match.group("left_mult") or "").strip(),
+                    (match.group("right_mult") or "").strip(),
+                    # Drop the reading direction markers of "label >"
+                    (match.group("label") or "").strip().strip("<>").strip(),
+                ))
+            continue
+
+        match = MEMBER_DECLARATION.match(line)
+        if match and match.group("owner") in classes:
+            member = parse_member(match.group("member"))
+            if member:
+                kind, name = member
+                (methods if kind == "method" else attributes).append((match.group("owner"), name))
+
+    # Report aliased classes under their display name
+    def display(name: str) -> str:
+        return classes.get(name, name)
+
+    return {
+        "classes": [display(name) for name in classes],
+        "attributes": [(display(owner), name) for owner, name in attributes],
+        "methods": [(display(owner), name) for owner, name in methods],
+        "associations": [(display(a), display(b), ma, mb, label) for a, b, ma, mb, label in associations],
+        "inheritance": [(display(child), display(parent)) for child, parent in inheritance],
+    }
@@ -0,0 +1,356 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from core.job_ledger import get_job_key
+from core.prompt_runner import build_jobs, send_job, complete_job
+
+DEFAULT_QUEUE_PATH = Path("test_runs/work_queue.sqlite3")
+# Seconds a worker may hold a job without renewing its lease
+DEFAULT_LEASE_TIMEOUT = 300.0
+# Leases a job may lose to dead workers before it is given up as failed
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_POLL_INTERVAL = 5.0
+
+# Job fields stored in the queue; the client is attached by each worker
+QUEUED_FIELDS = ("prompt_name", "prompt_hash", "model_name", "temperature", "max_tokens", "repeat_index")
+
+
+def get_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    """SQLite work queue shared by a coordinator and any number of workers.
+
+    The coordinator publishes the jobs of a sweep. Workers lease one job
+    at a time in an immediate transaction, so no two workers get the same
+    job. A lease expires after `lease_timeout` seconds unless the worker
+    renews it, and expired jobs are handed to the next worker, so the jobs
+    of a dead worker are not lost. A job that loses its lease
+    `max_attempts` times is marked failed.
+
+    Each worker opens the queue with its own `worker_id`. The queue then
+    takes the place of the job ledger in `complete_job`: `mark` stores the
+    outcome of a leased job. Leases are held, and renewed by `renew`, until
+    then, which with the results database is only once the run is committed.
+    """
+
+    def __init__(self, path: Path = DEFAULT_QUEUE_PATH, worker_id: str | None = None, lease_timeout: float = DEFAULT_LEASE_TIMEOUT, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.worker_id = worker_id or get_worker_id()
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.held = {}
+
+        # Autocommit mode, transactions are started explicitly with BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(str(self.path), timeout=30.0, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS prompts (
+                prompt_hash TEXT PRIMARY KEY,
+                text TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS jobs (
+                key TEXT PRIMARY KEY,
+                prompt_name TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                model_name TEXT NOT NULL,
+                temperature REAL,
+                max_tokens INTEGER,
+                repeat_index INTEGER,
+                prompt_variant TEXT,
+                state TEXT NOT NULL,
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                run_dir TEXT,
+                error TEXT,
+                cost REAL,
+                updated REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, model_name);
+        """)
+
+    @classmethod
+    def from_config(cls, config: dict, worker_id: str | None = None) -> "WorkQueue":
+        """Open the queue configured in the `distributed` config section."""
+        queue_config = config.get("distributed") or {}
+        return cls(
+            path=Path(queue_config.get("queue_path", DEFAULT_QUEUE_PATH)),
+            worker_id=worker_id,
+            lease_timeout=queue_config.get("lease_timeout", DEFAULT_LEASE_TIMEOUT),
+            max_attempts=queue_config.get("max_attempts", DEFAULT_MAX_ATTEMPTS),
+        )
+
+    def _transaction(self, statements):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(self.conn)
+                self.conn.execute("COMMIT")
+                return result
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def publish(self, jobs: list[dict], resume: bool = False) -> int:
+        """Add the jobs of a sweep and return how many were not queued yet.
+
+        Without `resume` the queue is emptied first. With `resume` finished
+        jobs are kept and failed ones are queued again.
+        """
+        now = time.time()
+
+        def statements(conn):
+            if not resume:
+                conn.execute("DELETE FROM jobs")
+            else:
+                conn.execute("UPDATE jobs SET state = 'pending', attempts = 0, worker = NULL, updated = ? WHERE state = 'failed'", (now,))
+            conn.executemany(
+                "INSERT OR IGNORE INTO prompts VALUES (?, ?)",
+                {(job["prompt_hash"], job["prompt_text"]) for job in jobs},
+            )
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO jobs (key, prompt_name, prompt_hash, model_name, temperature, max_tokens, repeat_index, "
+                "prompt_variant, state, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'pending', ?)",
+                [
+                    (get_job_key(job), *(job[field] for field in QUEUED_FIELDS), json.dumps(job.get("prompt_variant")), now)
+                    for job in jobs
+                ],
+            )
+            return conn.total_changes - before
+
+        return self._transaction(statements)
+
+    def lease(self, models: list[str]) -> dict | None:
+        """Lease the next pending or expired job of one of `models`, or return None."""
+        now = time.time()
+        placeholders = ", ".join("?" for _ in models)
+
+        def statements(conn):
+            # Give up on jobs whose workers keep dying
+            conn.execute(
+                "UPDATE jobs SET state = 'failed', error = 'lease expired too often', updated = ? "
+                "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            row = conn.execute(
+                "SELECT jobs.key, prompt_name, jobs.prompt_hash, model_name, temperature, max_tokens, repeat_index, prompt_variant, "
+                f"state, worker, prompts.text FROM jobs JOIN prompts ON prompts.prompt_hash = jobs.prompt_hash "
+                f"WHERE model_name IN ({placeholders}) AND (state = 'pending' OR (state = 'leased' AND lease_expires < ?)) "
+                "ORDER BY jobs.rowid LIMIT 1",
+                (*models, now),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET state = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1, updated = ? WHERE key = ?",
+                (self.worker_id, now + self.lease_timeout, now, row[0]),
+            )
+            return row
+
+        row = self._transaction(statements)
+        if row is None:
+            return None
+
+        key, *values, variant, state, previous_worker, prompt_text = row
+        if state == "leased":
+            print(f"[♻️] Lease of {previous_worker} on {key} expired, taking over")
+        job = dict(zip(QUEUED_FIELDS, values))
+        job["prompt_text"] = prompt_text
+        job["prompt_variant"] = json.loads(variant)
+        with self.lock:
+            self.held[key] = time.time()
+        return job
+
+    def renew(self):
+        """Extend the leases on all jobs this worker has not marked yet."""
+        now = time.time()
+        with self.lock:
+            keys = list(self.held)
+        if keys:
+            self._transaction(lambda conn: conn.executemany(
+                "UPDATE jobs SET lease_expires = ?, updated = ? WHERE key = ? AND worker = ? AND state = 'leased'",
+                [(now + self.lease_timeout, now, key, self.worker_id) for key in keys],
+            ))
+
+    def mark(self, job: dict, state: str, run_dir: str | None = None, error: str | None = None, cost: float | None = None):
+        """Record the outcome of a leased job, as `JobLedger.mark` does for local runs."""
+        if state not in ("done", "failed"):
+            return
+        key = get_job_key(job)
+        cursor = self._transaction(lambda conn: conn.execute(
+            "UPDATE jobs SET state = ?, run_dir = COALESCE(?, run_dir), error = ?, cost = ?, lease_expires = NULL, updated = ? "
+            "WHERE key = ? AND worker = ? AND state = 'leased'",
+            (state, run_dir, error, cost, time.time(), key, self.worker_id),
+        ))
+        with self.lock:
+            self.held.pop(key, None)
+        if cursor.rowcount == 0:
+            print(f"[⚠️] Lease on {key} was lost before its result was stored, it may run twice")
+
+    def get_run_dir(self, job: dict) -> Path | None:
+        """Return the folder of an earlier failed attempt, to be reused."""
+        with self.lock:
+            row = self.conn.execute("SELECT run_dir FROM jobs WHERE key = ?", (get_job_key(job),)).fetchone()
+        return Path(row[0]) if row and row[0] else None
+
+    def release(self, job: dict):
+        """Hand a leased job back to the queue without counting it as an attempt."""
+        key = get_job_key(job)
+        self._transaction(lambda conn: conn.execute(
+            "UPDATE jobs SET state = 'pending', worker = NULL, lease_expires = NULL, attempts = attempts - 1, updated = ? "
+            "WHERE key = ? AND worker = ? AND state = 'leased'",
+            (time.time(), key, self.worker_id),
+        ))
+        with self.lock:
+            self.held.pop(key, None)
+
+    def counts(self) -> dict:
+        now = time.time()
+        with self.lock:
+            counts = dict(self.conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+            workers, expired = self.conn.execute(
+                "SELECT COUNT(DISTINCT worker), COALESCE(SUM(lease_expires < ?), 0) FROM jobs WHERE state = 'leased'", (now,)
+            ).fetchone()
+            cost = self.conn.execute("SELECT COALESCE(SUM(cost), 0) FROM jobs").fetchone()[0]
+        return {
+            "pending": counts.get("pending", 0),
+            "leased": counts.get("leased", 0),
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "workers": workers,
+            "expired": expired,
+            "cost": cost,
+        }
+
+    def has_open_jobs(self, models: list[str]) -> bool:
+        """Return whether any job of `models` is pending or leased."""
+        placeholders = ", ".join("?" for _ in models)
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT 1 FROM jobs WHERE model_name IN ({placeholders}) AND state IN ('pending', 'leased') LIMIT 1", models
+            ).fetchone()
+        return row is not None
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def run_coordinator(models, queue: WorkQueue, prompt_filter=None, model_filter=None, temperature_override=None, max_tokens_override=None, repeat_override=None, resume=False, poll_interval=DEFAULT_POLL_INTERVAL):
+    """Publish the job matrix to the work queue and report progress until it is drained.
+
+    Parameters
+    ----------
+    models : list[dict]
+        Model configurations. No clients are needed, workers create their own.
+    prompt_filter, model_filter, temperature_override, max_tokens_override, repeat_override
+        See `run_prompts`.
+    queue : WorkQueue
+        The queue the workers lease jobs from.
+    resume : bool
+        Keep finished jobs of an earlier sweep and queue its failed ones again.
+    poll_interval : float
+        Seconds between progress reports.
+    """
+    jobs = build_jobs(
+        models,
+        prompt_filter=prompt_filter,
+        model_filter=model_filter,
+        temperature_override=temperature_override,
+        max_tokens_override=max_tokens_override,
+        repeat_override=repeat_override,
+    )
+    added = queue.publish(jobs, resume=resume)
+    print(f"[🛰️] Published {added} new jobs ({len(jobs)} in the sweep) to {queue.path}")
+
+    while True:
+        counts = queue.counts()
+        print(f"[🛰️] {counts['done']} done, {counts['failed']} failed, {counts['leased']} leased by {counts['workers']} workers "
+              f"({counts['expired']} expired), {counts['pending']} pending, ${counts['cost']:.2f} spent")
+        if counts["pending"] + counts["leased"] == 0:
+            return counts
+        time.sleep(poll_interval)
+
+
+def run_worker(models, queue: WorkQueue, concurrency=1, scheduler=None, cache=None, render_queue=None, stream=False, results_store=None, costs=None, poll_interval=DEFAULT_POLL_INTERVAL):
+    """Lease jobs of the configured models from the work queue and run them.
+
+    Results are written like local runs. `concurrency` threads lease and
+    run jobs independently, and a heartbeat thread renews the leases of
+    the jobs in progress. The worker exits once no job of its models is
+    pending or leased by another worker, or its budgets are reached.
+
+    Parameters
+    ----------
+    models : list[dict]
+        Models this worker runs, each with a client using the worker's own API keys.
+    queue : WorkQueue
+        The queue opened with this worker's id.
+    concurrency : int
+        Jobs run at the same time by this worker.
+    scheduler, cache, render_queue, stream, results_store
+        See `run_prompts`.
+    costs : CostTracker | None
+        Counts this worker's tokens and cost. Its budgets apply to this
+        worker only; jobs it may no longer afford are handed back.
+    poll_interval : float
+        Seconds to wait when all remaining jobs are leased by other workers.
+    """
+    clients = {model["name"]: model["client"] for model in models}
+    model_names = list(clients)
+    stopped = threading.Event()
+
+    def heartbeat():
+        while not stopped.wait(queue.lease_timeout / 3):
+            queue.renew()
+
+    def work():
+        while not stopped.is_set():
+            available = [name for name in model_names if not (costs and costs.is_exhausted(name))]
+            job = queue.lease(available) if available else None
+            if job is None:
+                # Commit buffered runs, their jobs stay leased until then
+                if results_store:
+                    results_store.flush()
+                if not available or not queue.has_open_jobs(available):
+                    return
+                time.sleep(poll_interval)
+                continue
+
+            if costs and not costs.admit(job):
+                queue.release(job)
+                continue
+
+            job["client"] = clients[job["model_name"]]
+            print(f"\n🔁 {job['prompt_name']} | {job['model_name']} | temp={job['temperature']} | run={job['repeat_index']} [{queue.worker_id}]")
+            try:
+                result = send_job(job, scheduler, cache, stream, render_queue)
+                if costs:
+                    result["cost"] = costs.record(job, result)
+                complete_job(job, result, queue, render_queue, results_store)
+            except Exception as e:
+                print(f"[❌] Job {get_job_key(job)} failed: {type(e).__name__}: {e}")
+                queue.mark(job, "failed", error=f"{type(e).__name__}: {e}")
+                if costs:
+                    costs.release(job)
+
+    print(f"[👷] Worker {queue.worker_id} serving {', '.join(model_names)} with concurrency={concurrency}")
+    heartbeat_thread = threading.Thread(target=heartbeat, name="lease-heartbeat", daemon=True)
+    heartbeat_thread.start()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="worker") as pool:
+            for future in [pool.submit(work) for _ in range(max(1, concurrency))]:
+                future.result()
+    finally:
+        stopped.set()
+        heartbeat_thread.join()
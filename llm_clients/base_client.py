@@ -1,4 +1,22 @@
+import asyncio
 from abc import ABC, abstractmethod
+from datetime import datetime
+from llm_clients.stream_metrics import StreamMetrics
+
+
+def build_response_metadata(model_version="N/A", timestamp="N/A", system_fingerprint="N/A", prompt_tokens=0, completion_tokens=0, total_tokens=None) -> dict:
+    """Return response metadata in the provider independent shape stored with every run."""
+    prompt_tokens = prompt_tokens or 0
+    completion_tokens = completion_tokens or 0
+    return {
+        "model_version": model_version,
+        "system_fingerprint": system_fingerprint,
+        "timestamp": timestamp,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": total_tokens or prompt_tokens + completion_tokens,
+    }
+
 
 # Base class for LLM clients
 # This class defines the interface for sending prompts to different LLMs.
@@ -6,8 +24,69 @@ from abc import ABC, abstractmethod
 # implement this interface to handle the specifics of their API.
 # The `send_prompt` method should be implemented to send a prompt to the LLM
 # and return the response in a structured format.
+# `send_prompt_async` is used by the concurrent runner. Clients backed by an
+# async SDK should override it; the default runs `send_prompt` in a thread.
+# `provider` names the API behind the client and is used to look up rate limits.
+# `stream_prompt` streams the response, calls `on_text` with every text delta
+# and adds time-to-first-token and throughput metrics as `stream_metrics`.
+# The default falls back to a blocking call delivered as a single chunk.
+# Clients of providers with an asynchronous batch API set `supports_batch`
+# and implement `submit_batch`, `poll_batch` and `fetch_batch`. The batch
+# engine submits at most `max_batch_size` requests per batch. Each request
+# is a dict with `custom_id`, `prompt` and `parameters`. `fetch_batch` maps
+# every custom_id to a result in the same format as `send_prompt`.
+# `extract_metadata` normalizes the model version, timestamp and token usage
+# of a raw response. `completion_tokens` counts every billed output token,
+# including reasoning tokens. The default reads OpenAI-style completions.
 class LLMClient(ABC):
+    provider = "default"
+    supports_batch = False
+    max_batch_size = 10000
 
     @abstractmethod
     def send_prompt(self, prompt: str, parameters: dict) -> dict:
         pass
+
+    async def send_prompt_async(self, prompt: str, parameters: dict) -> dict:
+        return await asyncio.to_thread(self.send_prompt, prompt, parameters)
+
+    def stream_prompt(self, prompt: str, parameters: dict, on_text=None) -> dict:
+        metrics = StreamMetrics()
+        result = self.send_prompt(prompt, parameters)
+        if result.get("status") != "error":
+            metrics.record()
+            if on_text:
+                on_text(result["text"])
+        result["stream_metrics"] = metrics.summary()
+        return result
+
+    async def stream_prompt_async(self, prompt: str, parameters: dict, on_text=None) -> dict:
+        return await asyncio.to_thread(self.stream_prompt, prompt, parameters, on_text)
+
+    def submit_batch(self, requests: list[dict]) -> str:
+        """Submit requests to the provider's batch API and return the batch id."""
+        raise NotImplementedError(f"{type(self).__name__} does not support batch requests")
+
+    def poll_batch(self, batch_id: str) -> bool:
+        """Return True once the batch has finished, successfully or not."""
+        raise NotImplementedError(f"{type(self).__name__} does not support batch requests")
+
+    def fetch_batch(self, batch_id: str) -> dict[str, dict]:
+        """Return the results of a finished batch keyed by custom_id."""
+        raise NotImplementedError(f"{type(self).__name__} does not support batch requests")
+
+    def extract_metadata(self, raw_response) -> dict:
+        """Return the model version, timestamp and token usage of a raw response."""
+        if not raw_response:
+            return build_response_metadata()
+
+        created = getattr(raw_response, "created", 0)
+        usage = getattr(raw_response, "usage", None)
+        return build_response_metadata(
+            model_version=getattr(raw_response, "model", "N/A"),
+            timestamp=datetime.fromtimestamp(created).strftime('%Y-%m-%d %H:%M:%S') if created else "N/A",
+            system_fingerprint=getattr(raw_response, "system_fingerprint", None) or "N/A",
+            prompt_tokens=getattr(usage, "prompt_tokens", 0),
+            completion_tokens=getattr(usage, "completion_tokens", 0),
+            total_tokens=getattr(usage, "total_tokens", 0),
+        )
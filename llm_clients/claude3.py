@@ -1,19 +1,24 @@
 import os
 import time
+from datetime import datetime
 from anthropic import Anthropic, AsyncAnthropic
-from llm_clients.base_client import LLMClient
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
+from llm_clients.base_client import LLMClient, build_response_metadata
+from llm_clients.stream_metrics import StreamMetrics
+from llm_clients.http_pool import HTTPPools, get_default_pools
 
 class ClaudeClient(LLMClient):
+    provider = "anthropic"
+    supports_batch = True
+    max_batch_size = 100000
 
-    def __init__(self):
+    def __init__(self, pools: HTTPPools | None = None):
         api_key = os.getenv("ANTHROPIC_API_KEY")
         if not api_key:
             raise ValueError("ANTHROPIC_API_KEY is not set in the .env file.")
-        self.client = Anthropic(api_key=api_key)
+        pools = pools or get_default_pools()
+        # Retries are left to the rate limit scheduler
+        self.client = Anthropic(api_key=api_key, http_client=pools.get_client(self.provider), timeout=pools.get_timeout(self.provider), max_retries=0)
+        self.async_client = AsyncAnthropic(api_key=api_key, http_client=pools.get_async_client(self.provider), timeout=pools.get_timeout(self.provider), max_retries=0)
 
     def send_prompt(self, prompt: str, parameters: dict) -> dict:
             start_time = time.time()
@@ -39,5 +44,158 @@ class ClaudeClient(LLMClient):
                     "text": f"ERROR: {str(e)}",
                     "latency": None,
                     "status": "error",
+                    "status_code": getattr(e, "status_code", None),
+                    "raw_response": None
+                }
+
+    async def send_prompt_async(self, prompt: str, parameters: dict) -> dict:
+            start_time = time.time()
+
+            try:
+                response = await self.async_client.messages.create(
+                    model=parameters["model"],
+                    max_tokens=parameters.get("max_tokens", 1000),
+                    temperature=parameters.get("temperature", 0.3),
+                    messages=[{"role": "user", "content": prompt}]
+                )
+
+                duration = time.time() - start_time
+
+                return {
+                    "text": response.content[0].text, # type: ignore
+                    "latency": duration,
+                    "raw_response": response
+                }
+
+            except Exception as e:
+                return {
+                    "text": f"ERROR: {str(e)}",
+                    "latency": None,
+                    "status": "error",
+                    "status_code": getattr(e, "status_code", None),
+                    "raw_response": None
+                }
+
+    def stream_prompt(self, prompt: str, parameters: dict, on_text=None) -> dict:
+            metrics = StreamMetrics()
+            generated_text = ""
+
+            try:
+                with self.client.messages.stream(
+                    model=parameters["model"],
+                    max_tokens=parameters.get("max_tokens", 1000),
+                    temperature=parameters.get("temperature", 0.3),
+                    messages=[{"role": "user", "content": prompt}]
+                ) as stream:
+                    for delta in stream.text_stream:
+                        metrics.record()
+                        generated_text += delta
+                        if on_text:
+                            on_text(delta)
+                    response = stream.get_final_message()
+
+                return {
+                    "text": generated_text,
+                    "latency": metrics.elapsed(),
+                    "raw_response": response,
+                    "stream_metrics": metrics.summary(response.usage.output_tokens)
+                }
+
+            except Exception as e:
+                return {
+                    "text": f"ERROR: {str(e)}",
+                    "latency": None,
+                    "status": "error",
+                    "status_code": getattr(e, "status_code", None),
+                    "raw_response": None
+                }
+
+    async def stream_prompt_async(self, prompt: str, parameters: dict, on_text=None) -> dict:
+            metrics = StreamMetrics()
+            generated_text = ""
+
+            try:
+                async with self.async_client.messages.stream(
+                    model=parameters["model"],
+                    max_tokens=parameters.get("max_tokens", 1000),
+                    temperature=parameters.get("temperature", 0.3),
+                    messages=[{"role": "user", "content": prompt}]
+                ) as stream:
+                    async for delta in stream.text_stream:
+                        metrics.record()
+                        generated_text += delta
+                        if on_text:
+                            on_text(delta)
+                    response = await stream.get_final_message()
+
+                return {
+                    "text": generated_text,
+                    "latency": metrics.elapsed(),
+                    "raw_response": response,
+                    "stream_metrics": metrics.summary(response.usage.output_tokens)
+                }
+
+            except Exception as e:
+                return {
+                    "text": f"ERROR: {str(e)}",
+                    "latency": None,
+                    "status": "error",
+                    "status_code": getattr(e, "status_code", None),
+                    "raw_response": None
+                }
+
+    def extract_metadata(self, raw_response) -> dict:
+        if not raw_response:
+            return build_response_metadata()
+
+        # Messages carry no creation time, and cached prompt tokens are reported apart from input_tokens
+        usage = getattr(raw_response, "usage", None)
+        prompt_tokens = sum(getattr(usage, field, None) or 0 for field in ("input_tokens", "cache_creation_input_tokens", "cache_read_input_tokens"))
+        return build_response_metadata(
+            model_version=getattr(raw_response, "model", "N/A"),
+            timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            prompt_tokens=prompt_tokens,
+            completion_tokens=getattr(usage, "output_tokens", 0),
+        )
+
+    def submit_batch(self, requests: list[dict]) -> str:
+        batch = self.client.messages.batches.create(
+            requests=[
+                {
+                    "custom_id": request["custom_id"],
+                    "params": {
+                        "model": request["parameters"]["model"],
+                        "max_tokens": request["parameters"].get("max_tokens", 1000),
+                        "temperature": request["parameters"].get("temperature", 0.3),
+                        "messages": [{"role": "user", "content": request["prompt"]}]
+                    }
+                }
+                for request in requests
+            ]
+        )
+        return batch.id
+
+    def poll_batch(self, batch_id: str) -> bool:
+        return self.client.messages.batches.retrieve(batch_id).processing_status == "ended"
+
+    def fetch_batch(self, batch_id: str) -> dict[str, dict]:
+        results = {}
+        for entry in self.client.messages.batches.results(batch_id):
+            if entry.result.type == "succeeded":
+                message = entry.result.message
+                results[entry.custom_id] = {
+                    "text": message.content[0].text, # type: ignore
+                    "latency": None,
+                    "raw_response": message
+                }
+            else:
+                # errored, canceled or expired
+                error = getattr(entry.result, "error", None)
+                results[entry.custom_id] = {
+                    "text": f"ERROR: Batch request {entry.result.type}: {getattr(error, 'error', error)}",
+                    "latency": None,
+                    "status": "error",
+                    "status_code": None,
                     "raw_response": None
                 }
+        return results
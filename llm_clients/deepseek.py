@@ -1,22 +1,34 @@
 # llm_clients/deepseek_client.py
 
 import os
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import time
 from llm_clients.base_client import LLMClient
-from dotenv import load_dotenv
-
-# Load API key from .env file
-load_dotenv()
+from llm_clients.stream_metrics import StreamMetrics
+from llm_clients.http_pool import HTTPPools, get_default_pools
 
 class DeepSeekClient(LLMClient):
-    def __init__(self):
+    provider = "deepseek"
+
+    def __init__(self, pools: HTTPPools | None = None):
+        pools = pools or get_default_pools()
+        # Retries are left to the rate limit scheduler
         self.client = OpenAI(
             api_key=os.getenv("DEEPSEEK_API_KEY"),
             base_url="https://api.deepseek.com",
+            http_client=pools.get_client(self.provider),
+            timeout=pools.get_timeout(self.provider),
+            max_retries=0,
         )
         if not self.client:
             raise ValueError("DEESEEK_API_KEY is not set in the .env file.") 
+        self.async_client = AsyncOpenAI(
+            api_key=os.getenv("DEEPSEEK_API_KEY"),
+            base_url="https://api.deepseek.com",
+            http_client=pools.get_async_client(self.provider),
+            timeout=pools.get_timeout(self.provider),
+            max_retries=0,
+        )
     
     def send_prompt(self, prompt: str, parameters: dict) -> dict:
         start_time = time.time()
@@ -42,5 +54,120 @@ class DeepSeekClient(LLMClient):
                 "text": f"ERROR: {str(e)}",
                 "latency": None,
                 "status": "error",
+                "status_code": getattr(e, "status_code", None),
+                "raw_response": None
+            }
+
+    async def send_prompt_async(self, prompt: str, parameters: dict) -> dict:
+        start_time = time.time()
+
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=parameters["model"],
+                messages=[{"role": "user", "content": prompt}],
+                temperature=parameters.get("temperature", 0.3),
+                max_tokens=parameters.get("max_tokens", 1000)
+            )
+
+            duration = time.time() - start_time
+
+            return {
+                "text": response.choices[0].message.content,
+                "latency": duration,
+                "raw_response": response
+            }
+
+        except Exception as e:
+            return {
+                "text": f"ERROR: {str(e)}",
+                "latency": None,
+                "status": "error",
+                "status_code": getattr(e, "status_code", None),
+                "raw_response": None
+            }
+
+    def stream_prompt(self, prompt: str, parameters: dict, on_text=None) -> dict:
+        metrics = StreamMetrics()
+        generated_text = ""
+        last_chunk = None
+
+        try:
+            stream = self.client.chat.completions.create(
+                model=parameters["model"],
+                messages=[{"role": "user", "content": prompt}],
+                temperature=parameters.get("temperature", 0.3),
+                max_tokens=parameters.get("max_tokens", 1000),
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+
+            for chunk in stream:
+                last_chunk = chunk
+                if chunk.choices and chunk.choices[0].delta.content:
+                    delta = chunk.choices[0].delta.content
+                    metrics.record()
+                    generated_text += delta
+                    if on_text:
+                        on_text(delta)
+
+            # The final chunk carries model, fingerprint and token usage
+            usage = getattr(last_chunk, "usage", None)
+
+            return {
+                "text": generated_text,
+                "latency": metrics.elapsed(),
+                "raw_response": last_chunk,
+                "stream_metrics": metrics.summary(getattr(usage, "completion_tokens", None))
+            }
+
+        except Exception as e:
+            return {
+                "text": f"ERROR: {str(e)}",
+                "latency": None,
+                "status": "error",
+                "status_code": getattr(e, "status_code", None),
+                "raw_response": None
+            }
+
+    async def stream_prompt_async(self, prompt: str, parameters: dict, on_text=None) -> dict:
+        metrics = StreamMetrics()
+        generated_text = ""
+        last_chunk = None
+
+        try:
+            stream = await self.async_client.chat.completions.create(
+                model=parameters["model"],
+                messages=[{"role": "user", "content": prompt}],
+                temperature=parameters.get("temperature", 0.3),
+                max_tokens=parameters.get("max_tokens", 1000),
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+
+            async for chunk in stream:
+                last_chunk = chunk
+                if chunk.choices and chunk.choices[0].delta.content:
+                    delta = chunk.choices[0].delta.content
+                    metrics.record()
+                    generated_text += delta
+                    if on_text:
+                        on_text(delta)
+
+            # The final chunk carries model, fingerprint and token usage
+            usage = getattr(last_chunk, "usage", None)
+
+            return {
+                "text": generated_text,
+                "latency": metrics.elapsed(),
+                "raw_response": last_chunk,
+                "stream_metrics": metrics.summary(getattr(usage, "completion_tokens", None))
+            }
+
+        except Exception as e:
+            return {
+                "text": f"ERROR: {str(e)}",
+                "latency": None,
+                "status": "error",
+                "status_code": getattr(e, "status_code", None),
                 "raw_response": None
             }
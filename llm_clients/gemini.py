@@ -1,51 +1,75 @@
 import os
 import time
+from datetime import datetime
 from google import genai
 from google.genai import types
-from dotenv import load_dotenv
-from llm_clients.base_client import LLMClient
-
-# Load API key from .env file
-load_dotenv()
+from llm_clients.base_client import LLMClient, build_response_metadata
+from llm_clients.http_pool import HTTPPools, get_default_pools
+from llm_clients.stream_metrics import StreamMetrics
 
 class GeminiClient(LLMClient):
+    provider = "google"
     
-    def __init__(self):
+    def __init__(self, pools: HTTPPools | None = None):
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
             raise ValueError("GEMINI_API_KEY is not set in the .env file.")
         
-        self.client = genai.Client(api_key=api_key)
+        # The SDK builds its own httpx clients, handing it the transports shares their pools
+        pools = pools or get_default_pools()
+        self.client = genai.Client(api_key=api_key, http_options=types.HttpOptions(
+            timeout=int(pools.get_timeout(self.provider).read * 1000),
+            client_args={"transport": pools.get_transport(self.provider)},
+            async_client_args={"transport": pools.get_transport(self.provider, is_async=True)},
+        ))
+
+    def _build_request(self, prompt: str, parameters: dict) -> dict:
+        generation_config = {
+            "temperature": parameters.get("temperature", 0.3),
+            "max_output_tokens": parameters.get("max_tokens", 1000),
+        }
+        return {
+            "model": parameters["model"],
+            "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+            "config": types.GenerateContentConfig(**generation_config),
+        }
+
+    def _collect_text(self, response) -> str:
+        generated_text = ""
+        if response.candidates:
+            candidate = response.candidates[0]
+            if candidate.content and candidate.content.parts:
+                for part in candidate.content.parts:
+                    # Check if 'text' attribute exists and is not None
+                    if hasattr(part, 'text') and part.text is not None:
+                        generated_text += part.text
+        return generated_text
+
+    def extract_metadata(self, raw_response) -> dict:
+        if not raw_response:
+            return build_response_metadata()
+
+        # Thinking tokens are billed as output but not included in candidates_token_count
+        usage_metadata = getattr(raw_response, "usage_metadata", None)
+        created = getattr(raw_response, "create_time", None) or datetime.now()
+        return build_response_metadata(
+            model_version=getattr(raw_response, "model_version", None) or "N/A",
+            timestamp=created.strftime('%Y-%m-%d %H:%M:%S'),
+            prompt_tokens=getattr(usage_metadata, "prompt_token_count", 0),
+            completion_tokens=(getattr(usage_metadata, "candidates_token_count", None) or 0) + (getattr(usage_metadata, "thoughts_token_count", None) or 0),
+            total_tokens=getattr(usage_metadata, "total_token_count", 0),
+        )
         
     def send_prompt(self, prompt: str, parameters: dict) -> dict:
         start_time = time.time()
-        
-        generated_text = ""
 
         try:
-            model_name = parameters["model"]
-            generation_config = {
-                "temperature": parameters.get("temperature", 0.3),
-                "max_output_tokens": parameters.get("max_tokens", 1000),
-            }
-            
-            response = self.client.models.generate_content(
-                model=model_name,
-                contents=[{"role": "user", "parts": [{"text": prompt}]}],
-                config=types.GenerateContentConfig(**generation_config)
-            )
+            response = self.client.models.generate_content(**self._build_request(prompt, parameters))
             
             duration = time.time() - start_time
             
-            if response.candidates:
-                candidate = response.candidates[0]
-                if candidate.content and candidate.content.parts:
-                    for part in candidate.content.parts:
-                        # Check if 'text' attribute exists and is not None
-                        if hasattr(part, 'text') and part.text is not None:
-                            generated_text += part.text
             return {
-                "text": generated_text,
+                "text": self._collect_text(response),
                 "latency": duration,
                 "raw_response": response
             }
@@ -55,5 +79,98 @@ class GeminiClient(LLMClient):
                 "text": f"ERROR: {str(e)}",
                 "latency": None,
                 "status": "error",
+                "status_code": getattr(e, "code", None),
                 "raw_response": None
-            }
\ No newline at end of file
+            }
+
+    async def send_prompt_async(self, prompt: str, parameters: dict) -> dict:
+        start_time = time.time()
+
+        try:
+            response = await self.client.aio.models.generate_content(**self._build_request(prompt, parameters))
+
+            duration = time.time() - start_time
+
+            return {
+                "text": self._collect_text(response),
+                "latency": duration,
+                "raw_response": response
+            }
+
+        except Exception as e:
+            return {
+                "text": f"ERROR: {str(e)}",
+                "latency": None,
+                "status": "error",
+                "status_code": getattr(e, "code", None),
+                "raw_response": None
+            }
+
+    def stream_prompt(self, prompt: str, parameters: dict, on_text=None) -> dict:
+        metrics = StreamMetrics()
+        generated_text = ""
+        last_chunk = None
+
+        try:
+            for chunk in self.client.models.generate_content_stream(**self._build_request(prompt, parameters)):
+                last_chunk = chunk
+                delta = self._collect_text(chunk)
+                if delta:
+                    metrics.record()
+                    generated_text += delta
+                    if on_text:
+                        on_text(delta)
+
+            # The final chunk carries the model version and token usage
+            usage_metadata = getattr(last_chunk, "usage_metadata", None)
+
+            return {
+                "text": generated_text,
+                "latency": metrics.elapsed(),
+                "raw_response": last_chunk,
+                "stream_metrics": metrics.summary(getattr(usage_metadata, "candidates_token_count", None))
+            }
+
+        except Exception as e:
+            return {
+                "text": f"ERROR: {str(e)}",
+                "latency": None,
+                "status": "error",
+                "status_code": getattr(e, "code", None),
+                "raw_response": None
+            }
+
+    async def stream_prompt_async(self, prompt: str, parameters: dict, on_text=None) -> dict:
+        metrics = StreamMetrics()
+        generated_text = ""
+        last_chunk = None
+
+        try:
+            stream = await self.client.aio.models.generate_content_stream(**self._build_request(prompt, parameters))
+            async for chunk in stream:
+                last_chunk = chunk
+                delta = self._collect_text(chunk)
+                if delta:
+                    metrics.record()
+                    generated_text += delta
+                    if on_text:
+                        on_text(delta)
+
+            # The final chunk carries the model version and token usage
+            usage_metadata = getattr(last_chunk, "usage_metadata", None)
+
+            return {
+                "text": generated_text,
+                "latency": metrics.elapsed(),
+                "raw_response": last_chunk,
+                "stream_metrics": metrics.summary(getattr(usage_metadata, "candidates_token_count", None))
+            }
+
+        except Exception as e:
+            return {
+                "text": f"ERROR: {str(e)}",
+                "latency": None,
+                "status": "error",
+                "status_code": getattr(e, "code", None),
+                "raw_response": None
+            }
@@ -1,18 +1,37 @@
+import json
 import os
 import time
 import openai
-from dotenv import load_dotenv
+from openai.types.chat import ChatCompletion
 from llm_clients.base_client import LLMClient
+from llm_clients.http_pool import HTTPPools, get_default_pools
+from llm_clients.stream_metrics import StreamMetrics
 
-# Load API key from .env file
-load_dotenv()
+# Batch states after which no more results will arrive
+BATCH_FINAL_STATES = ("completed", "failed", "expired", "cancelled")
 
 class GPT4Client(LLMClient):
+    provider = "openai"
+    supports_batch = True
+    max_batch_size = 50000
     
-    def __init__(self):
-        self.client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    def __init__(self, pools: HTTPPools | None = None):
+        pools = pools or get_default_pools()
+        # Retries are left to the rate limit scheduler
+        self.client = openai.OpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=pools.get_client(self.provider),
+            timeout=pools.get_timeout(self.provider),
+            max_retries=0,
+        )
         if not self.client:
             raise ValueError("OPENAI_API_KEY is not set in the .env file.") 
+        self.async_client = openai.AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=pools.get_async_client(self.provider),
+            timeout=pools.get_timeout(self.provider),
+            max_retries=0,
+        )
         
     def send_prompt(self, prompt: str, parameters: dict) -> dict:
         start_time = time.time()
@@ -38,5 +57,178 @@ class GPT4Client(LLMClient):
                 "text": f"ERROR: {str(e)}",
                 "latency": None,
                 "status": "error",
+                "status_code": getattr(e, "status_code", None),
                 "raw_response": None
             }
+
+    async def send_prompt_async(self, prompt: str, parameters: dict) -> dict:
+        start_time = time.time()
+
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=parameters["model"],
+                messages=[{"role": "user", "content": prompt}],
+                temperature=parameters.get("temperature", 0.3),
+                max_tokens=parameters.get("max_tokens", 1000)
+            )
+
+            duration = time.time() - start_time
+
+            return {
+                "text": response.choices[0].message.content,
+                "latency": duration,
+                "raw_response": response
+            }
+
+        except Exception as e:
+            return {
+                "text": f"ERROR: {str(e)}",
+                "latency": None,
+                "status": "error",
+                "status_code": getattr(e, "status_code", None),
+                "raw_response": None
+            }
+
+    def stream_prompt(self, prompt: str, parameters: dict, on_text=None) -> dict:
+        metrics = StreamMetrics()
+        generated_text = ""
+        last_chunk = None
+
+        try:
+            stream = self.client.chat.completions.create(
+                model=parameters["model"],
+                messages=[{"role": "user", "content": prompt}],
+                temperature=parameters.get("temperature", 0.3),
+                max_tokens=parameters.get("max_tokens", 1000),
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+
+            for chunk in stream:
+                last_chunk = chunk
+                if chunk.choices and chunk.choices[0].delta.content:
+                    delta = chunk.choices[0].delta.content
+                    metrics.record()
+                    generated_text += delta
+                    if on_text:
+                        on_text(delta)
+
+            # The final chunk carries model, fingerprint and token usage
+            usage = getattr(last_chunk, "usage", None)
+
+            return {
+                "text": generated_text,
+                "latency": metrics.elapsed(),
+                "raw_response": last_chunk,
+                "stream_metrics": metrics.summary(getattr(usage, "completion_tokens", None))
+            }
+
+        except Exception as e:
+            return {
+                "text": f"ERROR: {str(e)}",
+                "latency": None,
+                "status": "error",
+                "status_code": getattr(e, "status_code", None),
+                "raw_response": None
+            }
+
+    async def stream_prompt_async(self, prompt: str, parameters: dict, on_text=None) -> dict:
+        metrics = StreamMetrics()
+        generated_text = ""
+        last_chunk = None
+
+        try:
+            stream = await self.async_client.chat.completions.create(
+                model=parameters["model"],
+                messages=[{"role": "user", "content": prompt}],
+                temperature=parameters.get("temperature", 0.3),
+                max_tokens=parameters.get("max_tokens", 1000),
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+
+            async for chunk in stream:
+                last_chunk = chunk
+                if chunk.choices and chunk.choices[0].delta.content:
+                    delta = chunk.choices[0].delta.content
+                    metrics.record()
+                    generated_text += delta
+                    if on_text:
+                        on_text(delta)
+
+            # The final chunk carries model, fingerprint and token usage
+            usage = getattr(last_chunk, "usage", None)
+
+            return {
+                "text": generated_text,
+                "latency": metrics.elapsed(),
+                "raw_response": last_chunk,
+                "stream_metrics": metrics.summary(getattr(usage, "completion_tokens", None))
+            }
+
+        except Exception as e:
+            return {
+                "text": f"ERROR: {str(e)}",
+                "latency": None,
+                "status": "error",
+                "status_code": getattr(e, "status_code", None),
+                "raw_response": None
+            }
+
+    def submit_batch(self, requests: list[dict]) -> str:
+        lines = [
+            json.dumps({
+                "custom_id": request["custom_id"],
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": request["parameters"]["model"],
+                    "messages": [{"role": "user", "content": request["prompt"]}],
+                    "temperature": request["parameters"].get("temperature", 0.3),
+                    "max_tokens": request["parameters"].get("max_tokens", 1000)
+                }
+            }, ensure_ascii=False)
+            for request in requests
+        ]
+        batch_file = self.client.files.create(
+            file=("batch.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch"
+        )
+        batch = self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        return batch.id
+
+    def poll_batch(self, batch_id: str) -> bool:
+        return self.client.batches.retrieve(batch_id).status in BATCH_FINAL_STATES
+
+    def fetch_batch(self, batch_id: str) -> dict[str, dict]:
+        batch = self.client.batches.retrieve(batch_id)
+        results = {}
+
+        # Successful requests are in the output file, failed ones in the error file
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                record = json.loads(line)
+                response = record.get("response") or {}
+                if response.get("status_code") == 200:
+                    completion = ChatCompletion.model_validate(response["body"])
+                    results[record["custom_id"]] = {
+                        "text": completion.choices[0].message.content,
+                        "latency": None,
+                        "raw_response": completion
+                    }
+                else:
+                    error = record.get("error") or (response.get("body") or {}).get("error") or {}
+                    results[record["custom_id"]] = {
+                        "text": f"ERROR: {error.get('message', error)}",
+                        "latency": None,
+                        "status": "error",
+                        "status_code": response.get("status_code"),
+                        "raw_response": None
+                    }
+        return results
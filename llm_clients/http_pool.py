@@ -0,0 +1,237 @@
+import importlib.util
+import threading
+import httpx
+
+# API host of every provider; all models of a provider share its connection pool
+PROVIDER_HOSTS = {
+    "openai": "api.openai.com",
+    "deepseek": "api.deepseek.com",
+    "anthropic": "api.anthropic.com",
+    "google": "generativelanguage.googleapis.com",
+}
+
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+DEFAULT_CONNECT_TIMEOUT = 10.0
+# Long generations can take minutes before the first byte of a non-streamed response
+DEFAULT_READ_TIMEOUT = 600.0
+
+# HTTP/2 needs the optional `h2` package
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class PoolStats:
+    """Connection reuse and saturation counters of one host's pool.
+
+    New connections are counted from httpcore's `connect_tcp` trace event,
+    so every other request reused a kept-alive connection (or an HTTP/2
+    stream on one). A request is counted as saturated when it started while
+    `max_connections` requests were already waiting for their response.
+    """
+
+    def __init__(self, max_connections: int):
+        self.max_connections = max_connections
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.saturated = 0
+
+    def start(self):
+        with self.lock:
+            self.requests += 1
+            if self.in_flight >= self.max_connections:
+                self.saturated += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def finish(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def on_event(self, name: str, info: dict):
+        if name == "connection.connect_tcp.complete":
+            with self.lock:
+                self.connections += 1
+
+    async def on_event_async(self, name: str, info: dict):
+        self.on_event(name, info)
+
+    def summary(self) -> dict:
+        with self.lock:
+            reused = self.requests - self.connections
+            return {
+                "requests": self.requests,
+                "connections": self.connections,
+                "reuse_rate": reused / self.requests if self.requests else 0.0,
+                "peak_in_flight": self.peak_in_flight,
+                "max_connections": self.max_connections,
+                "saturated": self.saturated,
+            }
+
+
+class _CountingTransport(httpx.HTTPTransport):
+    def __init__(self, stats: PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.extensions.setdefault("trace", self.stats.on_event)
+        self.stats.start()
+        try:
+            return super().handle_request(request)
+        finally:
+            self.stats.finish()
+
+
+class _AsyncCountingTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, stats: PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.extensions.setdefault("trace", self.stats.on_event_async)
+        self.stats.start()
+        try:
+            return await super().handle_async_request(request)
+        finally:
+            self.stats.finish()
+
+
+class HTTPPools:
+    """One tuned, shared `httpx` connection pool per provider host.
+
+    The SDK clients of a provider (sync and async, across all of its
+    models) send their requests through the same keep-alive pool, instead
+    of each client opening its own connections and TLS sessions. Limits
+    and timeouts come from the `http` config section and can be overridden
+    per provider:
+
+        http:
+          http2: true           # default: on if `h2` is installed
+          max_connections: 100
+          max_keepalive_connections: 20
+          keepalive_expiry: 30
+          connect_timeout: 10
+          read_timeout: 600
+          providers:
+            openai:
+              max_connections: 200
+    """
+
+    def __init__(self, http2: bool = HTTP2_AVAILABLE, max_connections: int = DEFAULT_MAX_CONNECTIONS, max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS, keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT, read_timeout: float = DEFAULT_READ_TIMEOUT, providers: dict | None = None):
+        if http2 and not HTTP2_AVAILABLE:
+            print("[⚠️] HTTP/2 requested but the `h2` package is not installed, using HTTP/1.1")
+        self.defaults = {
+            "http2": http2 and HTTP2_AVAILABLE,
+            "max_connections": max_connections,
+            "max_keepalive_connections": max_keepalive_connections,
+            "keepalive_expiry": keepalive_expiry,
+            "connect_timeout": connect_timeout,
+            "read_timeout": read_timeout,
+        }
+        self.providers = providers or {}
+        self.lock = threading.Lock()
+        self.transports = {}
+        self.async_clients = []
+        self.stats = {}
+
+    @classmethod
+    def from_config(cls, config: dict) -> "HTTPPools":
+        """Create the pools from the `http` config section."""
+        http_config = config.get("http") or {}
+        return cls(
+            http2=http_config.get("http2", HTTP2_AVAILABLE),
+            max_connections=http_config.get("max_connections", DEFAULT_MAX_CONNECTIONS),
+            max_keepalive_connections=http_config.get("max_keepalive_connections", DEFAULT_MAX_KEEPALIVE_CONNECTIONS),
+            keepalive_expiry=http_config.get("keepalive_expiry", DEFAULT_KEEPALIVE_EXPIRY),
+            connect_timeout=http_config.get("connect_timeout", DEFAULT_CONNECT_TIMEOUT),
+            read_timeout=http_config.get("read_timeout", DEFAULT_READ_TIMEOUT),
+            providers=http_config.get("providers"),
+        )
+
+    def get_settings(self, provider: str) -> dict:
+        return {**self.defaults, **(self.providers.get(provider) or {})}
+
+    def get_timeout(self, provider: str) -> httpx.Timeout:
+        """Timeout to pass to the provider's SDK, which otherwise overrides the client's."""
+        settings = self.get_settings(provider)
+        return httpx.Timeout(settings["read_timeout"], connect=settings["connect_timeout"])
+
+    def _get_stats(self, provider: str) -> PoolStats:
+        host = PROVIDER_HOSTS.get(provider, provider)
+        if host not in self.stats:
+            self.stats[host] = PoolStats(self.get_settings(provider)["max_connections"])
+        return self.stats[host]
+
+    def get_transport(self, provider: str, is_async: bool = False) -> httpx.BaseTransport | httpx.AsyncBaseTransport:
+        """Return the shared transport (and with it the connection pool) of a provider's host."""
+        key = (PROVIDER_HOSTS.get(provider, provider), is_async)
+        with self.lock:
+            if key not in self.transports:
+                settings = self.get_settings(provider)
+                transport_class = _AsyncCountingTransport if is_async else _CountingTransport
+                self.transports[key] = transport_class(
+                    self._get_stats(provider),
+                    http2=settings["http2"],
+                    limits=httpx.Limits(
+                        max_connections=settings["max_connections"],
+                        max_keepalive_connections=settings["max_keepalive_connections"],
+                        keepalive_expiry=settings["keepalive_expiry"],
+                    ),
+                )
+            return self.transports[key]
+
+    def get_client(self, provider: str) -> httpx.Client:
+        """Return an `httpx.Client` on the provider's shared pool, for the OpenAI and Anthropic SDKs."""
+        return httpx.Client(transport=self.get_transport(provider), timeout=self.get_timeout(provider), follow_redirects=True)
+
+    def get_async_client(self, provider: str) -> httpx.AsyncClient:
+        client = httpx.AsyncClient(transport=self.get_transport(provider, is_async=True), timeout=self.get_timeout(provider), follow_redirects=True)
+        with self.lock:
+            self.async_clients.append(client)
+        return client
+
+    def summary(self) -> dict[str, dict]:
+        """Return the reuse and saturation stats of every host that was used."""
+        return {host: stats.summary() for host, stats in self.stats.items() if stats.requests}
+
+    def print_summary(self):
+        for host, stats in self.summary().items():
+            print(f"[🔌] {host}: {stats['requests']} requests over {stats['connections']} connections "
+                  f"({stats['reuse_rate']:.0%} reused), peak {stats['peak_in_flight']} concurrent requests for {stats['max_connections']} connections, "
+                  f"{stats['saturated']} requests waited for a free connection")
+
+    def close(self):
+        """Close the sync transports. Async ones are closed by `aclose`."""
+        with self.lock:
+            for key, transport in list(self.transports.items()):
+                if not key[1]:
+                    transport.close()
+                    del self.transports[key]
+
+    async def aclose(self):
+        """Close the async clients and transports, on the event loop their connections belong to."""
+        with self.lock:
+            clients, self.async_clients = self.async_clients, []
+            transports = [transport for key, transport in self.transports.items() if key[1]]
+            self.transports = {key: transport for key, transport in self.transports.items() if not key[1]}
+        for client in clients:
+            await client.aclose()
+        for transport in transports:
+            await transport.aclose()
+
+
+# Pools of clients created without explicit pools, e.g. outside of main.py
+_default_pools = None
+_default_pools_lock = threading.Lock()
+
+
+def get_default_pools() -> HTTPPools:
+    global _default_pools
+    with _default_pools_lock:
+        if _default_pools is None:
+            _default_pools = HTTPPools()
+        return _default_pools
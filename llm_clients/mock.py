@@ -0,0 +1,235 @@
+import asyncio
+import json
+import random
+import time
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+from llm_clients.base_client import LLMClient
+from llm_clients.stream_metrics import StreamMetrics
+
+# Characters per streamed chunk, roughly four tokens
+CHUNK_CHARS = 16
+
+# Where submitted mock batches are kept, so they survive a restart like real ones
+DEFAULT_BATCH_DIR = Path("test_runs/.mock_batches")
+
+
+class MockClient(LLMClient):
+    """Offline stand-in for a live provider, used for load tests and benchmarks.
+
+    Responses are replayed from recorded `*_RESPONSE.txt` files or
+    synthesized as small PlantUML class diagrams. Latency, time-to-first-
+    token, throughput, error rates and token counts come from the `mock`
+    section of the model's config entry:
+
+        mock:
+          replay_dir: test_runs        # replay recorded responses (optional)
+          time_to_first_token: 0.3     # seconds
+          tokens_per_second: 60        # output throughput
+          latency_jitter: 0.1          # relative standard deviation
+          prompt_tokens: 350           # defaults to len(prompt) / 4
+          completion_tokens: [300, 900]
+          error_rates: {429: 0.02, 500: 0.01}
+          seed: 42
+          batch_completion_time: 5     # seconds until a submitted batch is done
+          batch_dir: test_runs/.mock_batches
+
+    Batches are a local stand-in for a provider batch API: submitted
+    requests are written to `batch_dir` as JSONL and answered once
+    `batch_completion_time` has passed.
+    """
+    provider = "mock"
+    supports_batch = True
+
+    def __init__(self, settings: dict | None = None):
+        settings = settings or {}
+        self.time_to_first_token = settings.get("time_to_first_token", 0.0)
+        self.tokens_per_second = settings.get("tokens_per_second")
+        self.latency_jitter = settings.get("latency_jitter", 0.0)
+        self.prompt_tokens = settings.get("prompt_tokens")
+        self.completion_tokens = settings.get("completion_tokens")
+        self.error_rates = {int(code): rate for code, rate in (settings.get("error_rates") or {}).items()}
+        self.random = random.Random(settings.get("seed"))
+        self.responses = self._load_responses(settings.get("replay_dir"))
+        self.batch_completion_time = settings.get("batch_completion_time", 0.0)
+        self.batch_dir = Path(settings.get("batch_dir", DEFAULT_BATCH_DIR))
+
+    def _load_responses(self, replay_dir) -> list[str]:
+        if not replay_dir:
+            return []
+
+        responses = []
+        for path in sorted(Path(replay_dir).rglob("*_RESPONSE.txt")):
+            text = path.read_text(encoding="utf-8")
+            if not text.startswith("ERROR:"):
+                responses.append(text)
+        print(f"[🧪] Mock client loaded {len(responses)} recorded responses from {replay_dir}")
+        return responses
+
+    def _synthesize_response(self) -> str:
+        class_count = self.random.randint(2, 6)
+        names = [f"Class{i}" for i in range(1, class_count + 1)]
+        lines = []
+        for name in names:
+            lines.append(f"class {name} {{\n  -name: String\n  +get{name}(): {name}\n}}")
+        for left, right in zip(names, names[1:]):
+            lines.append(f'{left} "1" -- "*" {right}')
+        body = "\n".join(lines)
+        return f"Here is the class diagram:\n\n```plantuml\n@startuml\n{body}\n@enduml\n```\n"
+
+    def _plan(self, prompt: str, parameters: dict) -> dict:
+        """Decide the outcome and timing of one call."""
+        roll = self.random.random()
+        for status_code, rate in self.error_rates.items():
+            if roll < rate:
+                return {"status_code": status_code, "delay": self._jitter(self.time_to_first_token)}
+            roll -= rate
+
+        text = self.random.choice(self.responses) if self.responses else self._synthesize_response()
+
+        completion_tokens = self.completion_tokens
+        if isinstance(completion_tokens, list):
+            completion_tokens = self.random.randint(*completion_tokens)
+        completion_tokens = min(completion_tokens or len(text) // 4 + 1, parameters.get("max_tokens", 1000))
+        prompt_tokens = self.prompt_tokens or len(prompt) // 4 + 1
+
+        generation_time = completion_tokens / self.tokens_per_second if self.tokens_per_second else 0.0
+        return {
+            "text": text,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "time_to_first_token": self._jitter(self.time_to_first_token),
+            "generation_time": self._jitter(generation_time),
+        }
+
+    def _jitter(self, seconds: float) -> float:
+        if not seconds or not self.latency_jitter:
+            return seconds
+        return max(0.0, self.random.gauss(seconds, seconds * self.latency_jitter))
+
+    def _build_response(self, plan: dict, parameters: dict):
+        """Shape the response like an OpenAI completion so metadata extraction works."""
+        return SimpleNamespace(
+            id=f"mock-{uuid.uuid4().hex[:12]}",
+            model=parameters["model"],
+            created=int(time.time()),
+            system_fingerprint="mock",
+            usage=SimpleNamespace(
+                prompt_tokens=plan["prompt_tokens"],
+                completion_tokens=plan["completion_tokens"],
+                total_tokens=plan["prompt_tokens"] + plan["completion_tokens"],
+            ),
+        )
+
+    def _error_result(self, plan: dict) -> dict:
+        return {
+            "text": f"ERROR: Mock provider returned HTTP {plan['status_code']}",
+            "latency": None,
+            "status": "error",
+            "status_code": plan["status_code"],
+            "raw_response": None
+        }
+
+    def _chunks(self, text: str) -> list[str]:
+        return [text[i:i + CHUNK_CHARS] for i in range(0, len(text), CHUNK_CHARS)]
+
+    def send_prompt(self, prompt: str, parameters: dict) -> dict:
+        start_time = time.time()
+        plan = self._plan(prompt, parameters)
+        if "status_code" in plan:
+            time.sleep(plan["delay"])
+            return self._error_result(plan)
+
+        time.sleep(plan["time_to_first_token"] + plan["generation_time"])
+        return {
+            "text": plan["text"],
+            "latency": time.time() - start_time,
+            "raw_response": self._build_response(plan, parameters)
+        }
+
+    async def send_prompt_async(self, prompt: str, parameters: dict) -> dict:
+        start_time = time.time()
+        plan = self._plan(prompt, parameters)
+        if "status_code" in plan:
+            await asyncio.sleep(plan["delay"])
+            return self._error_result(plan)
+
+        await asyncio.sleep(plan["time_to_first_token"] + plan["generation_time"])
+        return {
+            "text": plan["text"],
+            "latency": time.time() - start_time,
+            "raw_response": self._build_response(plan, parameters)
+        }
+
+    def stream_prompt(self, prompt: str, parameters: dict, on_text=None) -> dict:
+        metrics = StreamMetrics()
+        plan = self._plan(prompt, parameters)
+        if "status_code" in plan:
+            time.sleep(plan["delay"])
+            return self._error_result(plan)
+
+        time.sleep(plan["time_to_first_token"])
+        chunks = self._chunks(plan["text"])
+        for i, delta in enumerate(chunks):
+            if i:
+                time.sleep(plan["generation_time"] / len(chunks))
+            metrics.record()
+            if on_text:
+                on_text(delta)
+
+        return {
+            "text": plan["text"],
+            "latency": metrics.elapsed(),
+            "raw_response": self._build_response(plan, parameters),
+            "stream_metrics": metrics.summary(plan["completion_tokens"])
+        }
+
+    async def stream_prompt_async(self, prompt: str, parameters: dict, on_text=None) -> dict:
+        metrics = StreamMetrics()
+        plan = self._plan(prompt, parameters)
+        if "status_code" in plan:
+            await asyncio.sleep(plan["delay"])
+            return self._error_result(plan)
+
+        await asyncio.sleep(plan["time_to_first_token"])
+        chunks = self._chunks(plan["text"])
+        for i, delta in enumerate(chunks):
+            if i:
+                await asyncio.sleep(plan["generation_time"] / len(chunks))
+            metrics.record()
+            if on_text:
+                on_text(delta)
+
+        return {
+            "text": plan["text"],
+            "latency": metrics.elapsed(),
+            "raw_response": self._build_response(plan, parameters),
+            "stream_metrics": metrics.summary(plan["completion_tokens"])
+        }
+
+    def submit_batch(self, requests: list[dict]) -> str:
+        self.batch_dir.mkdir(parents=True, exist_ok=True)
+        batch_id = f"mockbatch-{uuid.uuid4().hex[:12]}"
+        lines = [json.dumps(request, ensure_ascii=False) for request in requests]
+        (self.batch_dir / f"{batch_id}.jsonl").write_text("\n".join(lines), encoding="utf-8")
+        return batch_id
+
+    def poll_batch(self, batch_id: str) -> bool:
+        submitted = (self.batch_dir / f"{batch_id}.jsonl").stat().st_mtime
+        return time.time() - submitted >= self.batch_completion_time
+
+    def fetch_batch(self, batch_id: str) -> dict[str, dict]:
+        results = {}
+        for line in (self.batch_dir / f"{batch_id}.jsonl").read_text(encoding="utf-8").splitlines():
+            request = json.loads(line)
+            plan = self._plan(request["prompt"], request["parameters"])
+            if "status_code" in plan:
+                results[request["custom_id"]] = self._error_result(plan)
+            else:
+                results[request["custom_id"]] = {
+                    "text": plan["text"],
+                    "latency": None,
+                    "raw_response": self._build_response(plan, request["parameters"])
+                }
+        return results
@@ -0,0 +1,44 @@
+import importlib
+from llm_clients.http_pool import get_default_pools
+
+# Model name prefix → module and class of its client. Modules are only
+# imported once a configured model needs them, so a run with one provider
+# does not pay for importing every SDK.
+CLIENTS = {
+    "gpt": ("llm_clients.gpt4", "GPT4Client"),
+    "claude": ("llm_clients.claude3", "ClaudeClient"),
+    "gemini": ("llm_clients.gemini", "GeminiClient"),
+    "deepseek": ("llm_clients.deepseek", "DeepSeekClient"),
+    "mock": ("llm_clients.mock", "MockClient"),
+}
+
+# Clients configured per model (from the model's `mock` key) instead of shared by a provider
+PER_MODEL_CLIENTS = {"mock"}
+
+# One client per provider, shared by all of its models
+_clients = {}
+
+
+def get_prefix(model_name: str) -> str:
+    """Return the registered prefix of a model name, preferring the longest match."""
+    for prefix in sorted(CLIENTS, key=len, reverse=True):
+        if model_name.startswith(prefix):
+            return prefix
+    raise ValueError(f"No client implemented for model: {model_name}")
+
+
+def get_client_class(model_name: str) -> type:
+    module_name, class_name = CLIENTS[get_prefix(model_name)]
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def get_client(model_name: str, model_cfg: dict | None = None, pools=None):
+    """Return the client of a model, importing its provider module on first use."""
+    prefix = get_prefix(model_name)
+    client_class = get_client_class(model_name)
+    if prefix in PER_MODEL_CLIENTS:
+        return client_class((model_cfg or {}).get(prefix))
+
+    if prefix not in _clients:
+        _clients[prefix] = client_class(pools or get_default_pools())
+    return _clients[prefix]
@@ -0,0 +1,45 @@
+import time
+
+
+class StreamMetrics:
+    """Collect the timing of a streamed response.
+
+    `record` is called once per received text chunk. The summary reports
+    time-to-first-token, the mean latency between output tokens and the
+    output throughput after the first token arrived.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token = None
+        self.last_token = None
+        self.chunks = 0
+
+    def record(self):
+        now = time.perf_counter()
+        if self.first_token is None:
+            self.first_token = now
+        self.last_token = now
+        self.chunks += 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def summary(self, completion_tokens: int | None = None) -> dict:
+        """Return the metrics, using the provider's token count when known."""
+        if self.first_token is None:
+            return {
+                "time_to_first_token": None,
+                "inter_token_latency": None,
+                "tokens_per_second": None,
+                "stream_chunks": 0,
+            }
+
+        generation_time = self.last_token - self.first_token
+        tokens = completion_tokens or self.chunks
+        return {
+            "time_to_first_token": self.first_token - self.start,
+            "inter_token_latency": generation_time / (tokens - 1) if tokens > 1 else None,
+            "tokens_per_second": tokens / generation_time if generation_time > 0 else None,
+            "stream_chunks": self.chunks,
+        }
@@ -1,70 +1,206 @@
 # main.py
 
 import argparse
+import sys
 from pathlib import Path
 import yaml
-from core.prompt_runner import run_prompts
-from llm_clients.gpt4 import GPT4Client
-from llm_clients.gemini import GeminiClient
-from llm_clients.deepseek import DeepSeekClient
-from llm_clients.claude3 import ClaudeClient
+from dotenv import load_dotenv
+from core.prompt_runner import run_prompts, OUTPUT_BASE, PROMPT_DIR
+from core.async_runner import run_prompts_async, DEFAULT_CONCURRENCY
+from core.batch_runner import run_prompts_batch, DEFAULT_POLL_INTERVAL
+from core.rate_limiter import RateLimitScheduler
+from core.response_cache import ResponseCache, CACHE_MODES
+from core.job_ledger import JobLedger
+from core.results_store import ResultsStore, RESULTS_BACKENDS
+from core.convergence import ConvergenceTracker
+from core.cost_tracker import CostTracker
+from core.plantUML_renderer import RenderQueue
+from core.tracing import Tracer, DEFAULT_TRACE_PATH, enable_tracing
+from core.work_queue import WorkQueue, run_coordinator, run_worker, DEFAULT_POLL_INTERVAL as DEFAULT_QUEUE_POLL_INTERVAL
+from llm_clients.http_pool import HTTPPools
+from llm_clients.registry import get_client
+
+# Load API keys from the .env file once for all clients
+load_dotenv()
 
 # Default config path
 CONFIG_PATH = Path("config/test_config.yaml")
     
-def get_client(model_name):
-    if model_name.startswith("gpt"):
-        return GPT4Client()
-    elif model_name.startswith("claude"):
-        return ClaudeClient()
-    elif model_name.startswith("gemini"):
-         return GeminiClient()
-    elif model_name.startswith("deepseek"):
-        return DeepSeekClient()
-    else:
-        raise ValueError(f"No client implemented for model: {model_name}")
-    
-def load_config():
-    if CONFIG_PATH.exists():
-        with open(CONFIG_PATH, "r") as f:
+def load_config(config_path=CONFIG_PATH):
+    if config_path.exists():
+        with open(config_path, "r") as f:
             return yaml.safe_load(f)
     return {}
     
 def parse_args():
     parser = argparse.ArgumentParser(description="Run LLM prompt tests.")
+    parser.add_argument("command", nargs="?", choices=["run", "reprocess", "coordinate", "work"], default="run", help="run the prompts (default), re-extract and re-score stored responses offline, publish a sweep to the work queue, or run jobs from it")
+    parser.add_argument("--config", type=Path, default=CONFIG_PATH, help="Path to the YAML config (default: config/test_config.yaml)")
     parser.add_argument("--prompt_name", type=str, help="Prompt name to test (e.g. SOMO_B4_A2)")
     parser.add_argument("--model", type=str, help="LLM model name (e.g. gpt-4o)")
     parser.add_argument("--temperature", type=float, help="Sampling temperature")
     parser.add_argument("--max_tokens", type=int, help="Override max tokens")
     parser.add_argument("--repeat", type=int, help="How often to run each test")
+    parser.add_argument("--engine", choices=["sequential", "async", "batch"], help="Execution engine (default: sequential)")
+    parser.add_argument("--concurrency", type=int, help="Maximum number of requests in flight for the async engine")
+    parser.add_argument("--cache", choices=CACHE_MODES, help="Response cache mode: read-through, refresh or bypass")
+    parser.add_argument("--resume", action="store_true", help="Only run jobs that are missing or failed in the job ledger")
+    parser.add_argument("--stream", action="store_true", help="Stream responses and record time-to-first-token and throughput")
+    parser.add_argument("--results_backend", choices=RESULTS_BACKENDS, help="Write runs as folders, into the results database, or both")
+    parser.add_argument("--adaptive", action="store_true", help="Stop repeating a cell once its diagrams have converged; repeat becomes the maximum")
+    parser.add_argument("--max_cost", type=float, help="Stop dispatching jobs once the sweep has cost this many USD")
+    parser.add_argument("--trace", type=Path, nargs="?", const=DEFAULT_TRACE_PATH, help=f"Record per-stage timing spans to a JSON-lines file (default: {DEFAULT_TRACE_PATH})")
+    parser.add_argument("--workers", type=int, help="Worker processes for reprocess (default: all cores)")
+    parser.add_argument("--chunk_size", type=int, help="Responses per reprocess work item (default: 500)")
+    parser.add_argument("--force", action="store_true", help="Reprocess responses even if they are unchanged")
+    parser.add_argument("--render", action="store_true", help="Re-render diagrams whose code changed during reprocess")
+    parser.add_argument("--worker_id", type=str, help="Name of this worker in the work queue (default: host-pid)")
     return parser.parse_args()
     
 if __name__ == "__main__":
     args = parse_args()
-    config = load_config()
+    config = load_config(args.config)
+
+    if args.command == "reprocess":
+        # Imported here so runs do not load the scoring code and numpy
+        from core.reprocess import reprocess_archive, DEFAULT_CHUNK_SIZE
+        render_queue = RenderQueue.from_config(config) if args.render else None
+        try:
+            reprocess_archive(OUTPUT_BASE, PROMPT_DIR, workers=args.workers, chunk_size=args.chunk_size or DEFAULT_CHUNK_SIZE, force=args.force, render_queue=render_queue)
+        finally:
+            if render_queue:
+                render_queue.close()
+        sys.exit(0)
+
+    if args.command == "coordinate":
+        queue = WorkQueue.from_config(config)
+        try:
+            run_coordinator(
+                config.get("models", []),
+                queue,
+                prompt_filter=args.prompt_name or config.get("prompt_name"),
+                model_filter=args.model,
+                temperature_override=args.temperature,
+                max_tokens_override=args.max_tokens,
+                repeat_override=args.repeat,
+                resume=args.resume,
+                poll_interval=(config.get("distributed") or {}).get("poll_interval", DEFAULT_QUEUE_POLL_INTERVAL),
+            )
+        finally:
+            queue.close()
+        sys.exit(0)
+
+    tracer = Tracer.from_config(config, path=args.trace)
+    enable_tracing(tracer)
+    http_pools = HTTPPools.from_config(config)
 
     # Build the list of models from config
     model_configs = []
     for model_cfg in config.get("models", []):
         model_name = model_cfg["name"]
-        model_cfg["client"] = get_client(model_name)
+        model_cfg["client"] = get_client(model_name, model_cfg, http_pools)
         model_configs.append(model_cfg)
 
     # If no models defined in config, fallback to GPT4 with default settings
     if not model_configs:
         model_configs = [{
             "name": "gpt-4o",
-            "client": GPT4Client(),
+            "client": get_client("gpt-4o", pools=http_pools),
             "temperature": 0.3,
             "max_tokens": 2000,
             "repeat": 1
         }]
 
-    run_prompts(
+    cache = ResponseCache.from_config(config, mode=args.cache)
+    # Workers record job outcomes in the shared work queue instead of a local ledger
+    queue = WorkQueue.from_config(config, worker_id=args.worker_id) if args.command == "work" else None
+    ledger = JobLedger.from_config(config) if queue is None else None
+    render_queue = RenderQueue.from_config(config)
+    results_store = ResultsStore.from_config(config, backend=args.results_backend)
+    convergence = ConvergenceTracker.from_config(config, enabled=args.adaptive, prompt_dir=PROMPT_DIR)
+    costs = CostTracker.from_config(config, max_cost=args.max_cost)
+
+    run_options = dict(
         models=model_configs,
         prompt_filter=args.prompt_name or config.get("prompt_name"),
         model_filter=args.model,
         temperature_override=args.temperature,
         max_tokens_override=args.max_tokens,
-        repeat_override=args.repeat
+        repeat_override=args.repeat,
+        scheduler=RateLimitScheduler.from_config(config),
+        cache=cache,
+        ledger=ledger,
+        resume=args.resume,
+        render_queue=render_queue,
+        stream=args.stream or config.get("stream", False),
+        results_store=results_store,
+        convergence=convergence,
+        costs=costs
     )
+
+    engine = args.engine or config.get("engine", "sequential")
+    try:
+        if queue:
+            if convergence or engine != "sequential":
+                print("[⚠️] Workers run jobs as they are leased, --adaptive and --engine are ignored")
+            run_worker(
+                [model for model in model_configs if not args.model or model["name"] == args.model],
+                queue,
+                concurrency=args.concurrency or config.get("concurrency", 1),
+                scheduler=run_options["scheduler"],
+                cache=cache,
+                render_queue=render_queue,
+                stream=run_options["stream"],
+                results_store=results_store,
+                costs=costs,
+                poll_interval=(config.get("distributed") or {}).get("poll_interval", DEFAULT_QUEUE_POLL_INTERVAL),
+            )
+        elif engine == "async":
+            run_prompts_async(
+                **run_options,
+                concurrency=args.concurrency or config.get("concurrency", DEFAULT_CONCURRENCY),
+                http_pools=http_pools,
+            )
+        elif engine == "batch":
+            run_prompts_batch(
+                **run_options,
+                poll_interval=config.get("batch_poll_interval", DEFAULT_POLL_INTERVAL)
+            )
+        else:
+            run_prompts(**run_options)
+    finally:
+        render_queue.close()
+
+        if results_store:
+            # Commits the last batch, which also marks its jobs in the ledger
+            results_store.close()
+            print(f"[🗄️] Results database: {results_store.path}")
+
+        if ledger:
+            summary = ledger.summary()
+            print(f"[📒] Job ledger: {summary['done']} done, {summary['failed']} failed, {summary['skipped']} skipped, {summary['pending'] + summary['in_flight']} not finished")
+            ledger.close()
+
+        if queue:
+            counts = queue.counts()
+            print(f"[🛰️] Work queue: {counts['done']} done, {counts['failed']} failed, {counts['pending'] + counts['leased']} not finished")
+            queue.close()
+
+        if convergence:
+            stats = convergence.summary()
+            print(f"[🛑] Adaptive repeats: {stats['converged']} of {stats['cells']} cells converged early, {stats['skipped']} runs saved")
+
+        if costs:
+            costs.print_summary()
+
+        if cache:
+            print(f"[💾] Response cache: {cache.hits} hits, {cache.misses} misses")
+            cache.close()
+
+        if tracer:
+            enable_tracing(None)
+            tracer.close()
+            tracer.print_summary()
+
+        http_pools.print_summary()
+        http_pools.close()
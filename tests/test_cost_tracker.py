@@ -0,0 +1,25 @@
+from core.cost_tracker import CostTracker
+
+PRICES = {"gpt-4o": {"input": 2.5, "output": 10.0}}
+
+
+def test_disabled_without_budgets():
+    assert CostTracker.from_config({"costs": {"prices": PRICES}}) is None
+
+
+def test_config_sweep_budget_enables_tracker():
+    costs = CostTracker.from_config({"costs": {"max_cost": 5.0, "prices": PRICES}})
+    assert costs is not None
+    assert costs.max_cost == 5.0
+
+
+def test_cli_budget_overrides_config():
+    costs = CostTracker.from_config({"costs": {"max_cost": 5.0, "prices": PRICES}}, max_cost=2.0)
+    assert costs.max_cost == 2.0
+
+
+def test_model_budget_enables_tracker():
+    config = {"models": [{"name": "gpt-4o", "max_cost": 1.0}], "costs": {"prices": PRICES}}
+    costs = CostTracker.from_config(config)
+    assert costs is not None
+    assert costs.budgets == {"gpt-4o": 1.0}
@@ -0,0 +1,18 @@
+import asyncio
+from llm_clients.http_pool import HTTPPools
+
+
+def test_aclose_closes_async_clients_and_transports():
+    async def run():
+        pools = HTTPPools(http2=False)
+        client = pools.get_async_client("openai")
+        pools.get_transport("anthropic", is_async=True)
+        pools.get_transport("openai")
+        await pools.aclose()
+        return pools, client
+
+    pools, client = asyncio.run(run())
+    assert client.is_closed
+    assert list(pools.transports) == [("api.openai.com", False)]
+    pools.close()
+    assert pools.transports == {}
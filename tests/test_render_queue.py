@@ -0,0 +1,74 @@
+import threading
+import time
+from core.plantUML_renderer import RenderQueue
+from core.render_cache import RenderCache, get_render_hash
+
+
+class StubRenderer:
+    """Renders a diagram to its own source, so images of different diagrams differ."""
+
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def render(self, plantuml_code: str) -> bytes | None:
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return None if self.fail else plantuml_code.encode("utf-8")
+
+    def close(self):
+        pass
+
+
+def test_rerender_onto_cache_linked_path_keeps_cache_intact(tmp_path):
+    cache = RenderCache(tmp_path / "cache")
+    queue = RenderQueue(StubRenderer(), workers=1, cache=cache)
+    run1 = tmp_path / "run1" / "DIAGRAM.png"
+    run2 = tmp_path / "run2" / "DIAGRAM.png"
+
+    assert queue.submit("A -> B", run1).result()
+    # Cache hit, run2 is hardlinked to the cached image of "A -> B"
+    assert queue.submit("A -> B", run2).result()
+    # Render a different diagram onto the linked path, as reprocess --render does
+    assert queue.submit("X -> Y", run2).result()
+    queue.close()
+
+    assert (tmp_path / "cache" / f"{get_render_hash('A -> B')}.png").read_bytes() == b"A -> B"
+    assert run1.read_bytes() == b"A -> B"
+    assert run2.read_bytes() == b"X -> Y"
+
+
+def test_identical_diagrams_in_flight_render_once_without_cache(tmp_path):
+    renderer = StubRenderer(delay=0.2)
+    queue = RenderQueue(renderer, workers=4)
+    futures = [queue.submit("A -> B", tmp_path / f"run{i}" / "DIAGRAM.png") for i in range(4)]
+    assert all(future.result() for future in futures)
+    queue.close()
+
+    assert renderer.calls == 1
+    assert queue.rendered == 4
+    assert all((tmp_path / f"run{i}" / "DIAGRAM.png").read_bytes() == b"A -> B" for i in range(4))
+
+
+def test_prefetched_diagram_counts_as_one_miss(tmp_path):
+    cache = RenderCache(tmp_path / "cache")
+    queue = RenderQueue(StubRenderer(), workers=1, cache=cache)
+    queue.prefetch("A -> B").result()
+    assert queue.submit("A -> B", tmp_path / "run1" / "DIAGRAM.png").result()
+    assert queue.submit("A -> B", tmp_path / "run2" / "DIAGRAM.png").result()
+    queue.close()
+
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert (queue.rendered, queue.failed) == (2, 0)
+
+
+def test_failed_prefetch_counts_once(tmp_path):
+    queue = RenderQueue(StubRenderer(fail=True), workers=1)
+    queue.prefetch("A -> B").result()
+    assert not queue.submit("A -> B", tmp_path / "run1" / "DIAGRAM.png").result()
+    queue.close()
+
+    assert (queue.rendered, queue.failed) == (0, 1)
@@ -0,0 +1,61 @@
+import asyncio
+from core.prompt_runner import send_job
+from core.rate_limiter import RateLimitScheduler
+
+
+class RecordingRenderQueue:
+    def __init__(self):
+        self.prefetched = []
+
+    def prefetch(self, plantuml_code: str):
+        self.prefetched.append(plantuml_code)
+
+
+class FlakyStreamingClient:
+    """Streams part of a diagram and fails with a 503, then streams a complete one."""
+
+    provider = "flaky"
+
+    def __init__(self):
+        self.attempts = 0
+
+    def stream_prompt(self, prompt: str, parameters: dict, on_text=None) -> dict:
+        self.attempts += 1
+        if self.attempts == 1:
+            on_text("@startuml\nclass Failed\n")
+            return {"text": "ERROR: overloaded", "status": "error", "status_code": 503, "raw_response": None}
+        text = "@startuml\nclass Retried\n@enduml\n"
+        on_text(text)
+        return {"text": text, "status": "ok", "raw_response": None}
+
+    async def stream_prompt_async(self, prompt: str, parameters: dict, on_text=None) -> dict:
+        return self.stream_prompt(prompt, parameters, on_text)
+
+    def extract_metadata(self, raw_response) -> dict:
+        return {}
+
+
+def build_job(client) -> dict:
+    return {
+        "prompt_name": "P", "prompt_text": "prompt", "prompt_hash": "abc", "model_name": "flaky-model",
+        "client": client, "temperature": 0.1, "max_tokens": 100, "repeat_index": 1,
+    }
+
+
+def test_retried_stream_prefetches_only_the_retry():
+    render_queue = RecordingRenderQueue()
+    scheduler = RateLimitScheduler(base_delay=0.0, max_delay=0.0)
+    result = send_job(build_job(FlakyStreamingClient()), scheduler=scheduler, stream=True, render_queue=render_queue)
+
+    assert result["attempts"] == 2
+    assert render_queue.prefetched == ["class Retried"]
+
+
+def test_retried_async_stream_prefetches_only_the_retry():
+    from core.async_runner import send_job_async
+
+    render_queue = RecordingRenderQueue()
+    scheduler = RateLimitScheduler(base_delay=0.0, max_delay=0.0)
+    asyncio.run(send_job_async(build_job(FlakyStreamingClient()), scheduler=scheduler, stream=True, render_queue=render_queue))
+
+    assert render_queue.prefetched == ["class Retried"]